@@ -4,245 +4,42 @@
 import pandas as pd
 import streamlit as st
 from datetime import date, timedelta, datetime, timezone
-from supabase_io import fetch_articles, supabase  # 复用你的封装与客户端
-from io import BytesIO
-import os, requests, re  # ✅ changed: add re
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from supabase_io import (sync_articles, load_mirror_articles, mirror_version, mirror_partition_versions,
+                         review_week_versions, upsert_reviews, ReviewWriteBehind)  # 复用你的封装与客户端
+import os
 from html import escape
-from PIL import Image
-import streamlit.components.v1 as components
-
-
-# ===== Weekly DOCX helpers =====
-
-OUTPUT_DIR = r"D:\Python Project\weekly outcome"  # 目标保存目录（可在UI里改）
-
-def start_of_week(d: date) -> date:
-    return d - timedelta(days=d.weekday())  # 周一
-
-def end_of_week(start: date) -> date:
-    return start + timedelta(days=6)
-
-def _add_label_value(doc: Document, label: str, value: str, bold_label=True):
-    p = doc.add_paragraph()
-    r1 = p.add_run(f"{label} ")
-    r1.bold = bold_label
-    r1.font.size = Pt(11)
-    r2 = p.add_run(value or "")
-    r2.font.size = Pt(11)
-    return p
-
-def _add_hyperlink(paragraph, url, text):
-    part = paragraph.part
-    r_id = part.relate_to(url,
-                          reltype="http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink",
-                          is_external=True)
-    hyperlink = OxmlElement('w:hyperlink')
-    hyperlink.set(qn('r:id'), r_id)
-    new_run = OxmlElement('w:r')
-    rPr = OxmlElement('w:rPr')
-    u = OxmlElement('w:u'); u.set(qn('w:val'), 'single'); rPr.append(u)
-    color = OxmlElement('w:color'); color.set(qn('w:val'), '0563C1'); rPr.append(color)
-    new_run.append(rPr)
-    t = OxmlElement('w:t'); t.text = text
-    new_run.append(t)
-    hyperlink.append(new_run)
-    paragraph._p.append(hyperlink)
-
-# =========================
-# Image fetching utilities
-# =========================
-
-# 统一的远程图片下载（requests + PIL 验证）
-def fetch_remote_img(url: str) -> bytes | None:
-    """
-    下载远程图片并返回二进制；若不是图片或失败则返回 None。
-    """
-    if not url:
-        return None
-    headers = {"User-Agent": "Mozilla/5.0"}
-    try:
-        resp = requests.get(url, headers=headers, timeout=10)
-        resp.raise_for_status()
-        # 用 PIL 验证是否为图片
-        img = Image.open(BytesIO(resp.content))
-        img.verify()
-        return resp.content
-    except Exception:
-        return None
-
-# ✅ changed: 你提供的 curl 头和 cookie（可按需更新）
-NYT_HEADERS = {
-    
-def fetch_og_image_url_with_curl(page_url: str) -> str | None:
-    """
-    用 curl 等价的 headers + cookie 抓页面，解析 og:image。
-    """
-    if not page_url:
-        return None
-    try:
-        headers = NYT_HEADERS.copy()
-        headers["Cookie"] = NYT_COOKIE
-        resp = requests.get(page_url, headers=headers, timeout=12, allow_redirects=True)
-        resp.raise_for_status()
-        html = resp.text
-        m = re.search(
-            r'<meta[^>]+property=["\']og:image["\'][^>]*content=["\']([^"\']+)["\']',
-            html, flags=re.I
-        )
-        if not m:
-            return None
-        og = m.group(1).strip()
-        if og.startswith("//"):
-            og = "https:" + og
-        return og
-    except Exception:
-        return None
-
+from image_utils import (fetch_image_variant, fetch_og_image_url_with_curl, prefetch_row_images,
+                         LookaheadPrefetcher, LOOKAHEAD_ITEMS)  # 带两级缓存
+import uuid
+from search_index import SearchIndex
+from news_data import ArticleStore, articles_frame, concat_article_frames, split_categories
+from facets import FilterCache, filter_key
+from pillar_classifier import MODEL_PATH as PILLAR_MODEL_PATH, PillarClassifier
+from dedup import NearDupIndex
+from vector_index import SEARCH_TOP_K, VectorIndex, hit_text
+from weekly_report import OUTPUT_DIR, fetch_reviews_week, build_weekly_docx
+from cache_versions import ARTICLES_WEEK, PartitionCache, week_key
+from http_client import shared_client
+from perf import begin_trace, span, tracer
+import time
+
+# 每次 rerun 一个 trace，侧边栏 Performance 面板按它汇总各阶段耗时
+rerun_t0 = time.perf_counter()
+trace_id = begin_trace("rerun")
+
+
+# ===== Weekly DOCX helpers（实现见 weekly_report.py）=====
+
+# 缓存 key 带上所跨两周的版本号（记在本地镜像里，经 upsert_reviews 的写入都会让对应的周失效）；
+# 绕过本仓库代码直接改表、或别的机器写入的审核看不到版本变化，TTL 兜底一小时
 @st.cache_data(show_spinner=False, ttl=3600)
-def _fetch_reviews_week(monday: date):
-    """从审核表读取本周 [Mon..Sun] 的记录；表名优先 news_reviews，回退 '\"News_reviews\"'。"""
-    start_s, end_s = monday.isoformat(), end_of_week(monday).isoformat()
-    table_candidates = ["news_reviews", '"News_reviews"']
-    last_err = None
-    for tbl in table_candidates:
-        try:
-            res = (
-                supabase.table(tbl)
-                .select("*")
-                .gte("publish_date", start_s)
-                .lte("publish_date", end_s)
-                .order("publish_date", desc=False)
-                .execute()
-            )
-            data = res.data or []
-            if data is not None:
-                return data
-        except Exception as e:
-            last_err = e
-            continue
-    raise RuntimeError(f"Read reviews failed: {last_err}")
-
-def build_weekly_docx(rows: list[dict], monday: date, author: str) -> BytesIO:
-    """按模板生成 DOCX 并返回字节缓冲（供下载/另存）。"""
-    week_text = monday.strftime("%B %d, %Y")  # e.g., October 27, 2025
-    doc = Document()
-
-    for i, r in enumerate(rows):
-        if i > 0:
-            doc.add_page_break()
-
-        # Week of
-        p_week = doc.add_paragraph()
-        run = p_week.add_run(f"Week of {week_text}")
-        run.bold = True; run.font.size = Pt(12)
-
-        # Title
-        _add_label_value(doc, "Title:", r.get("title",""))
-
-        # Source / Date Published / Link / Author
-        _add_label_value(doc, "Source:", r.get("publisher",""))
-        pubdate = r.get("publish_date")
-        pubdate_str = ""
-        try:
-            if pubdate:
-                pubdate_str = pd.to_datetime(pubdate).strftime("%m.%d.%Y")
-        except Exception:
-            pass
-        _add_label_value(doc, "Date Published:", pubdate_str)
-
-        p_link = doc.add_paragraph()
-        r_label = p_link.add_run("Link: "); r_label.bold = True; r_label.font.size = Pt(11)
-        link = r.get("link") or r.get("url") or ""
-        if link:
-            _add_hyperlink(p_link, link, link)
-
-        _add_label_value(doc, "Urban Lab Author:", author)
-
-        # ✅ changed: Article Photograph，优先 image_url，再尝试用 curl 头从文章页抓 og:image
-        image_url = (r.get("image_url") or "").strip()
-        img_bytes = None
-        if image_url:
-            img_bytes = fetch_remote_img(image_url)
-        if (not img_bytes) and link:
-            og_url = fetch_og_image_url_with_curl(link)
-            if og_url:
-                img_bytes = fetch_remote_img(og_url)
-
-        if img_bytes:
-            doc.add_paragraph("Article Photograph:")
-            try:
-                doc.add_picture(BytesIO(img_bytes), width=Inches(6.5))
-            except Exception:
-                doc.add_paragraph("")
-        else:
-            _add_label_value(doc, "Article Photograph:", "")
-
-        # Summary
-        p_sum = doc.add_paragraph()
-        r1 = p_sum.add_run("Article Summary: "); r1.bold = True; r1.font.size = Pt(11)
-        p_sum.add_run(r.get("summary","")).font.size = Pt(11)
-
-        # Initiatives（红色/加粗）
-        p_init = doc.add_paragraph()
-        r2 = p_init.add_run("Initiative: "); r2.bold = True; r2.font.size = Pt(11)
-        r3 = p_init.add_run(r.get("categories","")); r3.bold = True; r3.font.size = Pt(11)
-
-    bio = BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    return bio
-
-def build_weekly_block_text(row: dict, categories: str, author: str) -> str:
-    """
-    生成一个纯文本版的 Weekly Report 块，用于在页面上直接复制到 Google Docs。
-    """
-    pubdate = row.get("publish_date")
-    # 计算 Week of
-    monday_text = ""
-    try:
-        if isinstance(pubdate, date):
-            d = pubdate
-        else:
-            d = pd.to_datetime(pubdate).date()
-        monday_text = start_of_week(d).strftime("%B %d, %Y")
-    except Exception:
-        pass
-
-    # 格式尽量和 DOCX 保持一致
-    lines = []
-    if monday_text:
-        lines.append(f"Week of {monday_text}")
-        lines.append("")
-
-    lines.append(f"Title: {row.get('title', '')}")
-    lines.append(f"Source: {row.get('publisher', '')}")
-
-    # Date Published 格式  MM.DD.YYYY
-    pub_str = ""
-    try:
-        if isinstance(pubdate, date):
-            pub_str = pubdate.strftime("%m.%d.%Y")
-        elif pubdate:
-            pub_str = pd.to_datetime(pubdate).strftime("%m.%d.%Y")
-    except Exception:
-        pub_str = str(pubdate or "")
-    lines.append(f"Date Published: {pub_str}")
+def _fetch_reviews_week(monday: date, version: tuple):
+    return fetch_reviews_week(monday)
 
-    link = row.get("url") or row.get("link") or ""
-    lines.append(f"Link: {link}")
-
-    lines.append(f"Urban Lab Author: {author}")
-    lines.append("")
-    lines.append("Article Summary:")
-    lines.append(row.get("summary", "") or "")
-    lines.append("")
-    lines.append(f"Initiative: {categories or ''}")
-
-    return "\n".join(lines)
+def _reviews_week_version(monday: date) -> tuple:
+    # 选的不一定是周一，[monday, monday+6] 可能跨两周
+    vers = review_week_versions()
+    return tuple(vers.get(week_key(d), 0) for d in (monday, monday + timedelta(days=6)))
 
 
 st.set_page_config(page_title="Urban Lab · News Categorizer", page_icon="📰", layout="wide")
@@ -274,73 +71,159 @@ st.markdown("""
 """, unsafe_allow_html=True)
 st.title("📰 Urban Lab — News Article Categorization")
 
-CATEGORIES = [
-    "Housing Affordability",
-    "Culture Led Development",
-    "Net Zero Cities",
-    "Public/Private Development",
-]
-
 # ---------------------------
-# 数据加载（从 News_storage）
+# 数据加载（News_storage → 本地镜像 → DataFrame）
 # ---------------------------
 @st.cache_data(show_spinner=False, ttl=300)
-def load_articles(limit: int = 1000) -> pd.DataFrame:
-    rows = fetch_articles(limit=limit)
-    recs = []
-    for r in rows:
-        recs.append({
-            "id":           r.get("id"),
-            "title":        r.get("title", ""),
-            "publisher":    r.get("Publisher") or r.get("creator",""),
-            "publish_date": r.get("pubdate",""),
-            "url":          r.get("link",""),
-            "summary":      r.get("summary",""),
-            "category":     r.get("Category") or "",
-            "image_url":    r.get("image_url",""),
-        })
-    df = pd.DataFrame(recs)
-    if not df.empty:
-        df["publish_date"] = pd.to_datetime(df["publish_date"], errors="coerce").dt.date
-    return df
-
-df_all = load_articles()
-if df_all.empty:
+def sync_mirror() -> tuple[str, str | None]:
+    """每 5 分钟增量同步一次本地镜像；返回 (镜像版本, 同步错误)。离线时直接用已有镜像。"""
+    err = None
+    try:
+        sync_articles()
+    except Exception as e:
+        err = str(e)
+    return mirror_version(), err
+
+@st.cache_resource(show_spinner=False)
+def get_dedup_index() -> NearDupIndex:
+    """全进程共享的近似重复索引（MinHash/LSH），随镜像增量更新。"""
+    return NearDupIndex()
+
+@st.cache_resource(show_spinner=False)
+def get_pillar_model(mtime: float):
+    """本地类别预选模型（python pillar_classifier.py train 生成）；没有模型文件时为 None。mtime 变了就重新加载。"""
+    return PillarClassifier.load(PILLAR_MODEL_PATH)
+
+def _pillar_model():
+    try:
+        return get_pillar_model(os.path.getmtime(PILLAR_MODEL_PATH))
+    except OSError:
+        return None
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_articles(version: str) -> ArticleStore:
+    """
+    version 来自 mirror_version()：每个镜像版本只构建一次只读 ArticleStore（含近似重复簇号），
+    所有会话共享同一个对象，rerun 时不再反序列化 / 复制整张表。
+    """
+    # 按发布周分区构建，只有镜像里版本号变了的周才重新转换（镜像同步只会改动少数几周）。
+    # 先读版本号再读行：中间有写入时最多多重建一次，不会把新版本号配上旧数据
+    part_versions = mirror_partition_versions()
+    by_week: dict = {}
+    for r in load_mirror_articles():
+        by_week.setdefault(week_key(r.get("pubdate")), []).append(r)
+    frames = get_partition_frames()
+    df = concat_article_frames([
+        frames.get_or_compute(ARTICLES_WEEK, wk, part_versions.get(wk, 0), lambda rows=rows: articles_frame(rows))
+        for wk, rows in by_week.items()])
+    dedup_index = get_dedup_index()
+    if len(df):
+        dedup_index.update_from_records(df[["id", "title", "summary", "maintext"]].to_dict("records"),
+                                        version=version)
+    return ArticleStore(df, dedup_index, version=version)
+
+@st.cache_resource(show_spinner=False)
+def get_review_queue() -> ReviewWriteBehind:
+    """全进程共享的审核写后队列（启动时会补发 journal 里上次没写完的记录）。"""
+    return ReviewWriteBehind().start()
+
+@st.cache_resource(show_spinner=False)
+def get_partition_frames() -> PartitionCache:
+    """镜像按周分区的 articles_frame，key 带分区版本号。"""
+    return PartitionCache()
+
+@st.cache_resource(show_spinner=False)
+def get_search_index() -> SearchIndex:
+    """全进程共享一份倒排索引；镜像版本变化时只对新增/变更的文章重新分词。"""
+    return SearchIndex()
+
+@st.cache_resource(show_spinner=False)
+def get_lookahead_prefetcher() -> LookaheadPrefetcher:
+    """全进程共享的图片预热线程池（按会话区分、筛选变化时取消旧任务）。"""
+    return LookaheadPrefetcher()
+
+@st.cache_resource(show_spinner=False)
+def get_vector_index() -> VectorIndex:
+    """语义搜索用的本地向量索引（memmap 存在 .cache/vectors，重启后复用），镜像版本变化时只重新编码变动的文章。"""
+    return VectorIndex()
+
+@st.cache_resource(show_spinner=False)
+def get_filter_cache() -> FilterCache:
+    """筛选条件 → (行号, 统计) 的 LRU，所有会话共享。"""
+    return FilterCache()
+
+with span("app.sync_mirror"):
+    mirror_ver, sync_err = sync_mirror()
+with span("app.load_articles"):
+    store = load_articles(mirror_ver)
+df_all = store.frame  # 只读，所有会话共享
+if sync_err:
+    st.sidebar.warning(f"同步 News_storage 失败，显示本地镜像数据：{sync_err}")
+if store.empty:
     st.info("Supabase 表 `News_storage` 暂无数据或读取失败。请检查环境变量和 RLS。")
     st.stop()
 
+search_index = get_search_index()
+if search_index.version != mirror_ver:
+    with span("app.search_index_update"):
+        search_index.update_from_records(df_all[["id", "title", "summary", "maintext"]].to_dict("records"),
+                                         version=mirror_ver)
+
+vector_index = get_vector_index()
+if vector_index.version != mirror_ver:
+    with span("app.vector_index_update"), st.spinner("Updating semantic index..."):
+        vector_index.update_from_records(df_all[["id", "title", "summary", "maintext"]].to_dict("records"),
+                                         version=mirror_ver)
+
 # ---------------------------
 # 侧边栏筛选
 # ---------------------------
 with st.sidebar:
     st.subheader("Filters")
 
-    min_d = df_all["publish_date"].min()
-    max_d = df_all["publish_date"].max()
-    if pd.isna(min_d) or pd.isna(max_d):
+    min_d, max_d = store.date_bounds()
+    if min_d is None or max_d is None:
         from_d, to_d = None, None
     else:
         from_d = st.date_input("Start date", value=min_d, min_value=min_d, max_value=max_d)
         to_d   = st.date_input("End date",   value=max_d, min_value=min_d, max_value=max_d)
 
-    all_pubs = sorted([p for p in df_all["publisher"].dropna().unique() if str(p).strip()])
+    all_pubs = store.publishers()
     sel_pubs = st.multiselect("News Publisher", all_pubs, default=all_pubs)
 
-    q = st.text_input("Search title/summary", value="", placeholder="type keywords").strip()
+    q = st.text_input("Search title/summary", value="", placeholder='type keywords or "exact phrase"',
+                      help="多个词需同时命中；用双引号搜索短语；结果按相关度排序").strip()
+    semantic_q = st.text_input("Semantic search", value="", placeholder="describe the topic in your own words",
+                               help=f"按摘要/正文片段的向量相似度找文章（最多 {SEARCH_TOP_K} 篇，按相似度排序），可与上面的筛选叠加").strip()
     only_unreviewed = st.toggle("Show only unreviewed (Category is NULL/empty)", value=False)
 
-# 应用筛选
-df = df_all.copy()
-if from_d and to_d:
-    df = df[(df["publish_date"].notna()) & (df["publish_date"] >= from_d) & (df["publish_date"] <= to_d)]
-if sel_pubs:
-    df = df[df["publisher"].isin(sel_pubs)]
-if q:
-    ql = q.lower()
-    df = df[df.apply(lambda r: ql in (r["title"] or "").lower()
-                              or ql in (r["summary"] or "").lower(), axis=1)]
-if only_unreviewed:
-    df = df[(df["category"].isna()) | (df["category"] == "")]
+    st.subheader("Review queue")
+    write_behind = st.toggle("Save reviews in background (write-behind)", value=True,
+                             help="点击保存后立即返回，后台按批写入 news_reviews；未发送的记录保存在本地 journal")
+    rq_status = get_review_queue().status()
+    if rq_status["pending"]:
+        st.caption(f"⏳ {rq_status['pending']} review(s) waiting to be written")
+    elif rq_status["last_flush"]:
+        st.caption(f"✅ All reviews written (last flush {rq_status['last_flush'][11:19]} UTC)")
+    if rq_status["last_error"]:
+        st.warning(f"Write to `news_reviews` failed, will retry: {rq_status['last_error']}")
+    if rq_status["pending"] and st.button("Flush now", use_container_width=True):
+        if get_review_queue().flush():
+            st.rerun()
+
+    if st.button("Full resync", use_container_width=True,
+                 help="按 id 核对整张 News_storage：补上已有文章的修改（类别、正文）和已删除的文章"):
+        try:
+            with st.spinner("Reconciling local mirror..."):
+                sync_articles(full=True)
+        except Exception as e:
+            st.error(f"同步 News_storage 失败：{e}")
+        else:
+            sync_mirror.clear()
+            st.rerun()
+
+    show_perf = st.toggle("Performance panel", value=False,
+                          help="显示本次 rerun 各阶段耗时、HTTP 各 host 延迟，并可导出 trace")
 
 # ---------------------------
 # 三列布局
@@ -351,8 +234,34 @@ left, mid, right = st.columns([3.2, 6, 3.2], gap="large")
 with left:
     st.subheader("Select Article")
 
+    collapse_dups = st.toggle("Collapse near-duplicates", value=True,
+                              help="转载/改标题的同一篇稿子只显示一条（MinHash 近似重复检测）")
+
+    # 应用筛选
+    # 同样的筛选条件（例如只勾了审核面板的复选框）直接复用上次的行号和统计
+    def _run_filters():
+        with span("app.filters.compute") as sp:
+            hits = vector_index.search_docs(semantic_q, SEARCH_TOP_K) if semantic_q else None
+            p = store.select(from_d, to_d, sel_pubs, q, only_unreviewed, search_index, collapse_dups,
+                             semantic_ids=[h["doc_id"] for h in hits] if hits is not None else None)
+            sp.set(rows=len(p))
+            stats = store.aggregate(p)
+            stats["semantic_hits"] = {h["doc_id"]: h for h in hits or ()}
+            return p, stats
+
+    view_key = filter_key(mirror_ver, from_d, to_d, sel_pubs, q, only_unreviewed, collapse_dups, semantic_q)
+    with span("app.filters"):
+        pos, view_stats = get_filter_cache().get_or_compute(view_key, _run_filters)
+
     # ✅ 不再显示表格，只构建下拉选项（显示标题）
-    options = [(int(r["id"]), r["title"]) for _, r in df[["id", "title"]].iterrows()]
+    def _option_label(title: str, cluster_size: int) -> str:
+        if collapse_dups and cluster_size > 1:
+            return f"{title}  (+{cluster_size - 1} similar)"
+        return title
+
+    sizes = df_all["cluster_size"].to_numpy()[pos].tolist()
+    options = [(doc_id, _option_label(title, size))
+               for doc_id, title, size in zip(store.ids[pos].tolist(), store.titles[pos], sizes)]
     if not options:
         st.warning("当前筛选结果为空，请调整 Filters。")
         st.stop()
@@ -365,8 +274,111 @@ with left:
     )
     current_id = current[0]
 
-# 当前文章（保持原写法）
-row = df.set_index("id").loc[current_id].to_dict()
+    # 后台预热下拉列表里接下来几篇的图片；筛选条件变了（view_key 不同）会取消上一批
+    cur_i = options.index(current)
+    ahead = pos[cur_i + 1: cur_i + 1 + LOOKAHEAD_ITEMS]
+    get_lookahead_prefetcher().schedule(
+        st.session_state.setdefault("prefetch_owner", uuid.uuid4().hex), view_key,
+        list(zip(df_all["image_url"].iloc[ahead].tolist(), df_all["url"].iloc[ahead].tolist())))
+
+    sem_hit = view_stats["semantic_hits"].get(current_id)
+    if sem_hit:
+        st.caption(f"Best matching passage ({sem_hit['field']}, similarity {sem_hit['score']:.2f}): "
+                   f"…{hit_text(sem_hit, store.row(current_id))[:300]}…")
+
+    dup_rows = store.cluster_members(current_id)
+    if not dup_rows.empty:
+        st.caption("Near-duplicates: " + "; ".join(
+            f"{r['publisher'] or '—'} · {'—' if pd.isna(r['publish_date']) else r['publish_date'].date()} · {r['title']}" for _, r in dup_rows.iterrows()))
+
+# 当前文章
+row = store.row(current_id)
+
+# 审核面板单独作为 fragment：勾选类别、切换 Decision、输入 Notes 只重跑这一段，
+# 不再重新执行数据加载、筛选、图片和右侧统计
+@st.fragment
+def review_panel(row: dict, write_behind: bool):
+    # 整页 rerun 之前留下的保存结果
+    flash = st.session_state.pop("review_flash", None)
+    if flash:
+        st.success(flash)
+
+    # --- AI 预选 = Category，规范化并勾选 ---
+    st.markdown("#### Recommended Categories (AI Pre-selection)")
+
+    preselected = split_categories(row.get("category"))
+    # Category 为空或不是有效类别（LLM 返回了无关文字）时，用本地模型预选
+    pillar_model = _pillar_model()
+    if not preselected and pillar_model is not None:
+        pred = pillar_model.predict([(row.get("title") or "", row.get("summary") or "")])[0]
+        preselected = split_categories(pred["category"])
+        st.caption(f"Pre-selected by local model (confidence {pred['confidence']:.2f})")
+        if pred["low_confidence"]:
+            st.warning("Low-confidence pre-selection — please check the categories carefully.")
+    sel = set(preselected)
+
+    cols = st.columns(2)
+    with cols[0]:
+        c1 = st.checkbox("Housing Affordability", value=("Housing Affordability" in sel))
+        c2 = st.checkbox("Net Zero Cities", value=("Net Zero Cities" in sel))
+    with cols[1]:
+        c3 = st.checkbox("Public/Private Development", value=("Public/Private Development" in sel))
+        c4 = st.checkbox("Culture Led Development", value=("Culture Led Development" in sel))
+
+    selected_categories = [
+        name for name, flag in [
+            ("Housing Affordability", c1),
+            ("Net Zero Cities", c2),
+            ("Public/Private Development", c3),
+            ("Culture Led Development", c4),
+        ] if flag
+    ]
+    categories_str = "; ".join(selected_categories)
+
+    st.divider()
+
+    # --- 人工审核，仅写入 news_reviews ---
+    st.markdown("#### Manual Review")
+    decision = st.radio("Decision", ["Confirm", "Reject"], horizontal=True, index=0)
+    note = st.text_area("Notes (optional)", value="", placeholder="Add reviewer notes...")
+
+    col_save, col_sp = st.columns([1, 3])
+    # 保存审核（Save Review）这段：仅替换 reviewed_at 这一行
+    with col_save:
+        if st.button("💾 Save Review", use_container_width=True):
+            try:
+                review = {
+                    "title": row.get("title", ""),
+                    "publisher": row.get("publisher", ""),
+                    "publish_date": str(row.get("publish_date") or ""),
+                    "link": row.get("url", ""),
+                    "decision": decision.lower(),          # confirm / reject
+                    "categories": categories_str,          # '; ' 分隔
+                    "note": note,
+                    "summary": row.get("summary", ""),
+                    "reviewed_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                }
+                if write_behind:
+                    get_review_queue().enqueue(review)   # 先落本地 journal，后台批量写入
+                    msg = "Review queued for `news_reviews`."
+                else:
+                    upsert_reviews([review])
+                    msg = "Review saved to table `news_reviews`."
+
+                # ✅ 如果是 Confirm，把当前这条文章的信息存到 session_state，用于下面显示模板
+                if decision.lower() == "confirm":
+                    st.session_state["last_confirmed"] = {
+                        "row": row,
+                        "categories": categories_str,
+                    }
+                    # 下方的 Summary 模板和侧边栏队列状态在 fragment 之外，整页重跑一次
+                    st.session_state["review_flash"] = msg
+                    st.rerun(scope="app")
+                st.success(msg)
+
+            except Exception as e:
+                st.error(f"Insert to `news_reviews` failed: {e}")
+
 
 # ---------------------------
 # 中列：审核面板（AI Pre-selection = Category）
@@ -385,7 +397,7 @@ with mid:
     # 1) 优先使用存储字段 image_url（直接当图片 URL 下载）
     img_url = (row.get("image_url") or "").strip()
     if img_url:
-        img_bytes = fetch_remote_img(img_url)
+        img_bytes = fetch_image_variant(img_url, "ui")  # 缩到显示尺寸的 WebP，不把原图发给浏览器
         if img_bytes:
             st.image(img_bytes, caption="Article image", use_container_width=True)
             shown_image = True
@@ -394,7 +406,7 @@ with mid:
     if not shown_image and row.get("url"):
         og_url = fetch_og_image_url_with_curl(row["url"])
         if og_url:
-            img_bytes2 = fetch_remote_img(og_url)
+            img_bytes2 = fetch_image_variant(og_url, "ui")
             if img_bytes2:
                 st.image(img_bytes2, caption="Article image", use_container_width=True)
                 shown_image = True
@@ -433,83 +445,7 @@ with mid:
     if row.get("url"):
         st.link_button("Open article ↗", row["url"], use_container_width=True)
 
-    # --- AI 预选 = Category，规范化并勾选 ---
-    st.markdown("#### Recommended Categories (AI Pre-selection)")
-
-    def normalize_cat(s: str) -> str:
-        s = (s or "").strip()
-        canon = {
-            "housing affordability": "Housing Affordability",
-            "culture led development": "Culture Led Development",
-            "culture-led development": "Culture Led Development",
-            "net zero cities": "Net Zero Cities",
-            "public/private development": "Public/Private Development",
-            "public / private development": "Public/Private Development",
-        }
-        return canon.get(s.lower(), s)
-
-    preselected = []
-    if row.get("category"):
-        preselected = [
-            normalize_cat(x)
-            for x in str(row["category"]).split(";")
-            if normalize_cat(x) in CATEGORIES
-        ]
-    sel = set(preselected)
-
-    cols = st.columns(2)
-    with cols[0]:
-        c1 = st.checkbox("Housing Affordability", value=("Housing Affordability" in sel))
-        c2 = st.checkbox("Net Zero Cities", value=("Net Zero Cities" in sel))
-    with cols[1]:
-        c3 = st.checkbox("Public/Private Development", value=("Public/Private Development" in sel))
-        c4 = st.checkbox("Culture Led Development", value=("Culture Led Development" in sel))
-
-    selected_categories = [
-        name for name, flag in [
-            ("Housing Affordability", c1),
-            ("Net Zero Cities", c2),
-            ("Public/Private Development", c3),
-            ("Culture Led Development", c4),
-        ] if flag
-    ]
-    categories_str = "; ".join(selected_categories)
-
-    st.divider()
-
-    # --- 人工审核，仅写入 news_reviews ---
-    st.markdown("#### Manual Review")
-    decision = st.radio("Decision", ["Confirm", "Reject"], horizontal=True, index=0)
-    note = st.text_area("Notes (optional)", value="", placeholder="Add reviewer notes...")
-
-    col_save, col_sp = st.columns([1, 3])
-    # 保存审核（Save Review）这段：仅替换 reviewed_at 这一行
-    with col_save:
-        if st.button("💾 Save Review", use_container_width=True):
-            try:
-                supabase.table("news_reviews").insert({
-                    "title": row.get("title", ""),
-                    "publisher": row.get("publisher", ""),
-                    "publish_date": str(row.get("publish_date") or ""),
-                    "link": row.get("url", ""),
-                    "decision": decision.lower(),          # confirm / reject
-                    "categories": categories_str,          # '; ' 分隔
-                    "note": note,
-                    "summary": row.get("summary", ""),
-                    "reviewed_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
-                }).execute()
-                st.success("Review saved to table `news_reviews`.")
-
-                # ✅ 如果是 Confirm，把当前这条文章的信息存到 session_state，用于下面显示模板
-                if decision.lower() == "confirm":
-                    st.session_state["last_confirmed"] = {
-                        "row": row,
-                        "categories": categories_str,
-                    }
-
-            except Exception as e:
-                st.error(f"Insert to `news_reviews` failed: {e}")
-
+    review_panel(row, write_behind)
 
 
 # ---------------------------
@@ -517,46 +453,62 @@ with mid:
 # ---------------------------
 with right:
     st.subheader("Weekly Articles")
-    st.metric("Count in view", len(df))
-    cnt = df.groupby("publisher", dropna=True).size().reset_index(name="count").sort_values("count", ascending=False)
-    st.dataframe(cnt.rename(columns={"publisher":"source"}), use_container_width=True, height=360)
-
-with st.expander("📝 Generate Weekly DOCX Report", expanded=False):
-    # 周一选择（默认当前周周一）
-    today = date.today()
-    default_monday = today - timedelta(days=today.weekday())
-    monday = st.date_input("Week (pick the Monday)", value=default_monday)
+    st.metric("Count in view", view_stats["count"])
+    st.dataframe(view_stats["publisher_counts"], use_container_width=True, height=360)
+    st.dataframe(pd.DataFrame({"pillar": list(view_stats["category_counts"]),
+                               "count": list(view_stats["category_counts"].values())}),
+                 use_container_width=True, hide_index=True)
+    if view_stats["week_counts"]:
+        st.caption("Articles per week (Monday)")
+        st.bar_chart(pd.Series(view_stats["week_counts"], name="articles"), height=160)
+
+# Weekly DOCX 面板：选周、改作者、生成和下载都只重跑这一段
+@st.fragment
+def weekly_docx_panel():
+    with st.expander("📝 Generate Weekly DOCX Report", expanded=False):
+        # 周一选择（默认当前周周一）
+        today = date.today()
+        default_monday = today - timedelta(days=today.weekday())
+        monday = st.date_input("Week (pick the Monday)", value=default_monday)
+
+        author = st.text_input("Urban Lab Author", value="Your Name", key="report_author")
+        outdir = st.text_input("Save to directory", value=OUTPUT_DIR,
+                               help="本地保存路径；同时会提供在线下载")
+
+        gen_col1, gen_col2 = st.columns([1,2])
+        with gen_col1:
+            gen_btn = st.button("Generate DOCX", type="primary", use_container_width=True)
+
+        if gen_btn:
+            try:
+                rows = _fetch_reviews_week(monday, _reviews_week_version(monday))
+                if not rows:
+                    st.warning("本周暂无审核记录。")
+                else:
+                    with st.spinner(f"Fetching {len(rows)} article images..."):
+                        images, timed_out = prefetch_row_images(rows)
+                    docx_bytes = build_weekly_docx(rows, monday, author, images=images)
+                    if timed_out:
+                        st.warning("以下文章的图片下载超时，报告中留空：\n" +
+                                   "\n".join(f"- {rows[i].get('title', '')}" for i in timed_out))
+                    # 1) 在线下载
+                    fname = f"UrbanLab_Weekly_{monday.isoformat()}.docx"
+                    st.download_button("Download DOCX", data=docx_bytes, file_name=fname, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+
+                    # 2) 本机保存
+                    try:
+                        os.makedirs(outdir, exist_ok=True)
+                        save_path = os.path.join(outdir, fname)
+                        with open(save_path, "wb") as f:
+                            f.write(docx_bytes.getvalue())
+                        st.success(f"已保存到：{save_path}")
+                    except Exception as e:
+                        st.warning(f"保存到本地失败：{e}")
+            except Exception as e:
+                st.error(f"生成失败：{e}")
 
-    author = st.text_input("Urban Lab Author", value="Your Name", key="report_author")
-    outdir = st.text_input("Save to directory", value=OUTPUT_DIR,
-                           help="本地保存路径；同时会提供在线下载")
 
-    gen_col1, gen_col2 = st.columns([1,2])
-    with gen_col1:
-        gen_btn = st.button("Generate DOCX", type="primary", use_container_width=True)
-
-    if gen_btn:
-        try:
-            rows = _fetch_reviews_week(monday)
-            if not rows:
-                st.warning("本周暂无审核记录。")
-            else:
-                docx_bytes = build_weekly_docx(rows, monday, author)
-                # 1) 在线下载
-                fname = f"UrbanLab_Weekly_{monday.isoformat()}.docx"
-                st.download_button("Download DOCX", data=docx_bytes, file_name=fname, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-
-                # 2) 本机保存
-                try:
-                    os.makedirs(outdir, exist_ok=True)
-                    save_path = os.path.join(outdir, fname)
-                    with open(save_path, "wb") as f:
-                        f.write(docx_bytes.getvalue())
-                    st.success(f"已保存到：{save_path}")
-                except Exception as e:
-                    st.warning(f"保存到本地失败：{e}")
-        except Exception as e:
-            st.error(f"生成失败：{e}")
+weekly_docx_panel()
 
 # ----------------------------------------
 # 单一文章的 Summary 模板展示（格式对齐截图）
@@ -564,112 +516,144 @@ with st.expander("📝 Generate Weekly DOCX Report", expanded=False):
 st.markdown("---")
 st.subheader("📄 Format to use for Summary (copy & paste)")
 
-data = st.session_state.get("last_confirmed")
+@st.fragment
+def summary_block():
+    """只在整页 rerun（换文章、保存 Confirm）时更新；审核面板里的操作不会重跑这里的图片和剪贴板组件。"""
+    data = st.session_state.get("last_confirmed")
 
-if not data:
-    st.info("Once you complete the Confirm action with Save above, a copy-ready Weekly Report summary will appear here.")
-else:
-    r = data["row"]
-    cats = data["categories"]
-    author_for_block = st.session_state.get("report_author")
+    if not data:
+        st.info("Once you complete the Confirm action with Save above, a copy-ready Weekly Report summary will appear here.")
+    else:
+        r = data["row"]
+        cats = data["categories"]
+        author_for_block = st.session_state.get("report_author")
 
-    # 处理日期
-    pubdate = r.get("publish_date")
-    pub_str = ""
-    try:
-        if isinstance(pubdate, date):
-            pub_str = pubdate.strftime("%m.%d.%Y")
-        elif pubdate:
-            pub_str = pd.to_datetime(pubdate).strftime("%m.%d.%Y")
-    except Exception:
-        pub_str = str(pubdate or "")
-
-    link = r.get("url") or r.get("link") or ""
-
-    from html import escape as _esc
-
-    # 顶部文字 + 字段（Title / Source / Date / Link / Author / Article Photograph）
-    top_html = f"""
-
-    <p><b>Title:</b> {_esc(r.get('title', '') or '')}</p>
-    <p><b>Source:</b> {_esc(r.get('publisher', '') or '')}</p>
-    <p><b>Date Published:</b> {_esc(pub_str)}</p>
-    <p><b>Link:</b> <a href="{_esc(link)}">{_esc(link)}</a></p>
-    <p><b>Urban Lab Author:</b> {_esc(author_for_block)}</p>
-    <p><b>Article Photograph:</b></p>
-    """
-    st.markdown(top_html, unsafe_allow_html=True)
+        # 处理日期
+        pubdate = r.get("publish_date")
+        pub_str = ""
+        try:
+            if isinstance(pubdate, date):
+                pub_str = pubdate.strftime("%m.%d.%Y")
+            elif pubdate:
+                pub_str = pd.to_datetime(pubdate).strftime("%m.%d.%Y")
+        except Exception:
+            pub_str = str(pubdate or "")
 
-    # 图片（优先 image_url，再回退 og:image）
-    img_bytes = None
-    img_url = (r.get("image_url") or "").strip()
-    if img_url:
-        img_bytes = fetch_remote_img(img_url)
-    if (not img_bytes) and link:
-        og_url = fetch_og_image_url_with_curl(link)
-        if og_url:
-            img_bytes = fetch_remote_img(og_url)
+        link = r.get("url") or r.get("link") or ""
 
-    if img_bytes:
-        st.image(img_bytes, width=400)
-    else:
-        st.write("(No image available)")
-
-    # Summary + Initiative（红色加粗）
-    summary_text = r.get("summary", "") or ""
-    bottom_html = f"""
-    <p><b>Article Summary:</b> {_esc(summary_text)}</p>
-    <p><span style="color: red; font-weight: bold;">
-        Initiative: {_esc(cats or '')}
-    </span></p>
-    """
-    st.markdown(bottom_html, unsafe_allow_html=True)
-
-        # ---------- Copy to clipboard button (HTML, 保留格式) ----------
-    # 这段 HTML 会被复制到剪贴板，Google Docs 会按富文本粘贴
-    clipboard_html = f"""
-    <p><b>Title:</b> {_esc(r.get('title', '') or '')}<br>
-    <b>Source:</b> {_esc(r.get('publisher', '') or '')}<br>
-    <b>Date Published:</b> {_esc(pub_str)}<br>
-    <b>Link:</b> <a href="{_esc(link)}">{_esc(link)}</a><br>
-    <b>Urban Lab Author:</b> {_esc(author_for_block)}<br>
-    <b>Article Photograph:</b> [insert image here]</p>
-
-    <p><b>Article Summary:</b> {_esc(summary_text)}</p>
-
-    <p><b>Initiative:</b> <span style="color: red; font-weight: bold;">
-        {_esc(cats or '')}
-    </span></p>
-    """
+        from html import escape as _esc
 
-    # 避免在 JS 模板字符串里把 ` 和 </script> 搞坏
-    js_safe_html = (
-        clipboard_html
-        .replace("\\", "\\\\")
-        .replace("`", "\\`")
-        .replace("</script>", "<\\/script>")
-    )
+        # 顶部文字 + 字段（Title / Source / Date / Link / Author / Article Photograph）
+        top_html = f"""
+
+        <p><b>Title:</b> {_esc(r.get('title', '') or '')}</p>
+        <p><b>Source:</b> {_esc(r.get('publisher', '') or '')}</p>
+        <p><b>Date Published:</b> {_esc(pub_str)}</p>
+        <p><b>Link:</b> <a href="{_esc(link)}">{_esc(link)}</a></p>
+        <p><b>Urban Lab Author:</b> {_esc(author_for_block)}</p>
+        <p><b>Article Photograph:</b></p>
+        """
+        st.markdown(top_html, unsafe_allow_html=True)
 
-    components.html(
-        f"""
-        <button onclick="copySummaryHtml()"
-                style="margin-top:8px;padding:6px 12px;font-size:14px;">
-            Copy summary
-        </button>
-        <script>
-        async function copySummaryHtml() {{
-            const html = `{js_safe_html}`;
-            const type = "text/html";
-            const blob = new Blob([html], {{ type }});
-            const data = [new ClipboardItem({{ [type]: blob }})];
-            try {{
-                await navigator.clipboard.write(data);
-                alert("Summary copied to clipboard with formatting.");
-            }} catch (e) {{
-                alert("Copy failed: " + e);
+        # 图片（优先 image_url，再回退 og:image）
+        img_bytes = None
+        img_url = (r.get("image_url") or "").strip()
+        if img_url:
+            img_bytes = fetch_image_variant(img_url, "ui")
+        if (not img_bytes) and link:
+            og_url = fetch_og_image_url_with_curl(link)
+            if og_url:
+                img_bytes = fetch_image_variant(og_url, "ui")
+
+        if img_bytes:
+            st.image(img_bytes, width=400)
+        else:
+            st.write("(No image available)")
+
+        # Summary + Initiative（红色加粗）
+        summary_text = r.get("summary", "") or ""
+        bottom_html = f"""
+        <p><b>Article Summary:</b> {_esc(summary_text)}</p>
+        <p><span style="color: red; font-weight: bold;">
+            Initiative: {_esc(cats or '')}
+        </span></p>
+        """
+        st.markdown(bottom_html, unsafe_allow_html=True)
+
+            # ---------- Copy to clipboard button (HTML, 保留格式) ----------
+        # 这段 HTML 会被复制到剪贴板，Google Docs 会按富文本粘贴
+        clipboard_html = f"""
+        <p><b>Title:</b> {_esc(r.get('title', '') or '')}<br>
+        <b>Source:</b> {_esc(r.get('publisher', '') or '')}<br>
+        <b>Date Published:</b> {_esc(pub_str)}<br>
+        <b>Link:</b> <a href="{_esc(link)}">{_esc(link)}</a><br>
+        <b>Urban Lab Author:</b> {_esc(author_for_block)}<br>
+        <b>Article Photograph:</b> [insert image here]</p>
+
+        <p><b>Article Summary:</b> {_esc(summary_text)}</p>
+
+        <p><b>Initiative:</b> <span style="color: red; font-weight: bold;">
+            {_esc(cats or '')}
+        </span></p>
+        """
+
+        # 避免在 JS 模板字符串里把 ` 和 </script> 搞坏
+        js_safe_html = (
+            clipboard_html
+            .replace("\\", "\\\\")
+            .replace("`", "\\`")
+            .replace("</script>", "<\\/script>")
+        )
+
+        import streamlit.components.v1 as components  # 只有这块用到，不拖慢冷启动
+        components.html(
+            f"""
+            <button onclick="copySummaryHtml()"
+                    style="margin-top:8px;padding:6px 12px;font-size:14px;">
+                Copy summary
+            </button>
+            <script>
+            async function copySummaryHtml() {{
+                const html = `{js_safe_html}`;
+                const type = "text/html";
+                const blob = new Blob([html], {{ type }});
+                const data = [new ClipboardItem({{ [type]: blob }})];
+                try {{
+                    await navigator.clipboard.write(data);
+                    alert("Summary copied to clipboard with formatting.");
+                }} catch (e) {{
+                    alert("Copy failed: " + e);
+                }}
             }}
-        }}
-        </script>
-        """,
-        height=60,
-    )
+            </script>
+            """,
+            height=60,
+        )
+
+
+summary_block()
+
+# ---------------------------
+# 侧边栏：性能面板（本次 rerun 的分阶段耗时 + HTTP / 筛选缓存统计 + trace 导出）
+# ---------------------------
+if show_perf:
+    with st.sidebar.expander("⏱ Performance", expanded=True):
+        st.caption(f"This rerun: {(time.perf_counter() - rerun_t0) * 1000:.0f} ms")
+        rerun_spans = tracer.summary(trace_id)
+        if rerun_spans:
+            st.dataframe(pd.DataFrame(rerun_spans), use_container_width=True, hide_index=True)
+        fc = get_filter_cache()
+        st.caption(f"Filter cache: {fc.hits} hits / {fc.misses} misses")
+        http_stats = shared_client.stats()
+        if http_stats:
+            st.caption("HTTP by host")
+            st.dataframe(pd.DataFrame([{"host": h, **{k: v for k, v in s.items() if k != "statuses"}}
+                                       for h, s in http_stats.items()]),
+                         use_container_width=True, hide_index=True)
+        st.download_button("Export trace (Chrome)", data=tracer.to_chrome_trace(),
+                           file_name="urbanlab_trace.json", mime="application/json",
+                           help="最近的 span（所有会话和后台线程），可在 chrome://tracing 或 Perfetto 打开",
+                           use_container_width=True)
+        st.download_button("Export spans (JSON)", data=tracer.to_json(),
+                           file_name="urbanlab_spans.json", mime="application/json",
+                           use_container_width=True)
@@ -0,0 +1,387 @@
+# bench/fake_postgrest.py — 本地内存版 PostgREST，供离线运行 supabase_io / 看板逻辑和基准测试
+# 只实现本仓库用到的子集：select / eq,neq,gt,gte,lt,lte,is,in / not. / or=(...and(...)) / order / limit / offset，
+# 以及 POST（insert、on_conflict upsert）和 PATCH。
+
+import csv
+import json
+import re
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+REST_PREFIX = "/rest/v1/"
+# create_client 会校验 key 的格式（JWT 样式），随便给一个三段式字符串即可
+FAKE_KEY = "bench.fake.key"
+
+_RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _key(v: Any) -> Tuple[int, Any]:
+    """比较用的排序键：数字按数值比，其它按字符串比。"""
+    if isinstance(v, bool):
+        return (0, int(v))
+    if isinstance(v, (int, float)):
+        return (0, v)
+    s = str(v)
+    try:
+        return (0, float(s))
+    except ValueError:
+        return (1, s)
+
+
+def _unquote_value(v: str) -> str:
+    v = v.strip()
+    if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+        return v[1:-1]
+    return v
+
+
+def _split_top(s: str) -> List[str]:
+    """按顶层逗号切分（忽略括号和引号里的逗号）。"""
+    out, depth, quoted, cur = [], 0, False, []
+    for ch in s:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            out.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+    if cur:
+        out.append("".join(cur))
+    return out
+
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def _op_predicate(col: str, expr: str) -> Predicate:
+    """expr 形如 'gte.2025-10-20'、'not.is.null'、'in.(1,2)'。"""
+    negate = False
+    if expr.startswith("not."):
+        negate, expr = True, expr[4:]
+    op, _, raw = expr.partition(".")
+    if op == "is":
+        want = raw.lower()
+        def pred(r):
+            v = r.get(col)
+            if want == "null":
+                return v is None or v == ""
+            if want in ("true", "false"):
+                return v is (want == "true")
+            return False
+    elif op == "in":
+        values = {_key(_unquote_value(x)) for x in _split_top(raw.strip("()"))}
+        def pred(r):
+            v = r.get(col)
+            return v is not None and _key(v) in values
+    else:
+        val = _key(_unquote_value(raw))
+        cmp = {
+            "eq": lambda a: a == val, "neq": lambda a: a != val,
+            "gt": lambda a: a > val, "gte": lambda a: a >= val,
+            "lt": lambda a: a < val, "lte": lambda a: a <= val,
+        }.get(op)
+        if cmp is None:
+            raise ValueError(f"unsupported operator: {op}")
+        def pred(r):
+            v = r.get(col)
+            if v is None or v == "":
+                return False
+            a = _key(v)
+            if a[0] != val[0]:
+                return False
+            return cmp(a)
+    return (lambda r: not pred(r)) if negate else pred
+
+
+def _logic_predicate(expr: str) -> Predicate:
+    """解析 or=(...) / and(...) 里的一个条件。"""
+    expr = expr.strip()
+    negate = False
+    if expr.startswith("not."):
+        negate, expr = True, expr[4:]
+    m = re.match(r"^(and|or)\((.*)\)$", expr, flags=re.S)
+    if m:
+        parts = [_logic_predicate(p) for p in _split_top(m.group(2))]
+        if m.group(1) == "and":
+            pred = lambda r: all(p(r) for p in parts)
+        else:
+            pred = lambda r: any(p(r) for p in parts)
+    else:
+        col, _, rest = expr.partition(".")
+        pred = _op_predicate(col, rest)
+    return (lambda r: not pred(r)) if negate else pred
+
+
+def _parse_filters(params: List[Tuple[str, str]]) -> List[Predicate]:
+    preds = []
+    for k, v in params:
+        if k in _RESERVED:
+            continue
+        if k in ("or", "and"):
+            preds.append(_logic_predicate(f"{k}{v}"))
+        else:
+            preds.append(_op_predicate(k, v))
+    return preds
+
+
+def _order_rows(rows: List[Dict[str, Any]], order: str) -> List[Dict[str, Any]]:
+    # 从最后一个排序键开始做稳定排序
+    for term in reversed([t for t in order.split(",") if t]):
+        parts = term.split(".")
+        col = parts[0]
+        desc = "desc" in parts[1:]
+        nullsfirst = "nullsfirst" in parts[1:]
+        present = [r for r in rows if r.get(col) not in (None, "")]
+        missing = [r for r in rows if r.get(col) in (None, "")]
+        present.sort(key=lambda r: _key(r[col]), reverse=desc)
+        rows = missing + present if nullsfirst else present + missing
+    return rows
+
+
+class FakeStore:
+    """表名 → 行列表；所有读写都在一把锁里。id 为空时自动分配。"""
+
+    def __init__(self, max_rows: Optional[int] = None):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._next_id: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.max_rows = max_rows  # 对应 PostgREST 的 db-max-rows：单次读取最多返回多少行
+
+    def create(self, table: str, rows: Optional[List[Dict[str, Any]]] = None) -> None:
+        with self._lock:
+            self.tables[table] = []
+            self._next_id[table] = 1
+        if rows:
+            self.insert(table, rows)
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            data = self.tables[table]
+            out = []
+            index = {}
+            if on_conflict:
+                index = {r.get(on_conflict): i for i, r in enumerate(data)}
+            for r in rows:
+                r = dict(r)
+                if on_conflict and r.get(on_conflict) is not None and r[on_conflict] in index:
+                    data[index[r[on_conflict]]].update(r)
+                    out.append(dict(data[index[r[on_conflict]]]))
+                    continue
+                if r.get("id") is None:
+                    r["id"] = self._next_id[table]
+                self._next_id[table] = max(self._next_id[table], int(r["id"]) + 1)
+                data.append(r)
+                if on_conflict:
+                    index[r.get(on_conflict)] = len(data) - 1
+                out.append(dict(r))
+            return out
+
+    def select(self, table: str, params: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        q = dict(params)
+        preds = _parse_filters(params)
+        with self._lock:
+            rows = [r for r in self.tables[table] if all(p(r) for p in preds)]
+        if q.get("order"):
+            rows = _order_rows(rows, q["order"])
+        offset = int(q.get("offset", 0) or 0)
+        limit = q.get("limit")
+        rows = rows[offset: offset + int(limit) if limit else None]
+        if self.max_rows is not None:
+            rows = rows[:self.max_rows]
+        cols = q.get("select", "*")
+        if cols and cols != "*":
+            names = [c.strip() for c in cols.split(",")]
+            rows = [{c: r.get(c) for c in names} for r in rows]
+        return [dict(r) for r in rows]
+
+    def update(self, table: str, params: List[Tuple[str, str]], patch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        preds = _parse_filters(params)
+        with self._lock:
+            out = []
+            for r in self.tables[table]:
+                if all(p(r) for p in preds):
+                    r.update(patch)
+                    out.append(dict(r))
+            return out
+
+    def next_id(self, table: str) -> int:
+        return self._next_id[table]
+
+    def rpc(self, name: str, args: Dict[str, Any]) -> Any:
+        """只实现 supabase_io 用到的函数。"""
+        if name == "reset_news_storage_id_seq":
+            with self._lock:
+                self._next_id["News_storage"] = max((int(r["id"]) for r in self.tables["News_storage"]), default=0) + 1
+                return self._next_id["News_storage"]
+        raise KeyError(name)
+
+
+def _make_handler(store: FakeStore, latency: float):
+    import time
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _table(self) -> Optional[str]:
+            path = urlsplit(self.path).path
+            if not path.startswith(REST_PREFIX):
+                return None
+            name = unquote(path[len(REST_PREFIX):]).strip("/")
+            return name if name in store.tables or name.startswith("rpc/") else None
+
+        def _params(self) -> List[Tuple[str, str]]:
+            return parse_qsl(urlsplit(self.path).query, keep_blank_values=True)
+
+        def _send(self, status: int, body: Any) -> None:
+            data = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> Any:
+            return json.loads(self._raw or b"null")
+
+        def _dispatch(self, fn):
+            # 连接是 keep-alive 的，GET 也可能带 body（postgrest-py 会发 "{}"），必须读掉
+            n = int(self.headers.get("Content-Length") or 0)
+            self._raw = self.rfile.read(n) if n else b""
+            if latency:
+                time.sleep(latency)
+            table = self._table()
+            if table is None:
+                self._send(404, {"code": "42P01", "message": "relation does not exist", "details": None, "hint": None})
+                return
+            try:
+                fn(table)
+            except Exception as e:
+                self._send(400, {"code": "PGRST100", "message": str(e), "details": None, "hint": None})
+
+        def do_GET(self):
+            self._dispatch(lambda t: self._send(200, store.select(t, self._params())))
+
+        def do_HEAD(self):
+            self._dispatch(lambda t: self._send(200, []))
+
+        def do_POST(self):
+            def run(t):
+                if t.startswith("rpc/"):
+                    self._send(200, store.rpc(t[4:], self._body() or {}))
+                    return
+                body = self._body()
+                rows = body if isinstance(body, list) else [body]
+                q = dict(self._params())
+                upsert = "merge-duplicates" in (self.headers.get("Prefer") or "")
+                out = store.insert(t, rows, on_conflict=(q.get("on_conflict") or "id") if upsert else None)
+                self._send(201, out)
+            self._dispatch(run)
+
+        def do_PATCH(self):
+            self._dispatch(lambda t: self._send(200, store.update(t, self._params(), self._body() or {})))
+
+    return Handler
+
+
+class FakePostgrest:
+    """在后台线程启动假 PostgREST；url 可直接作为 SUPABASE_URL 使用。"""
+
+    def __init__(self, store: FakeStore, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.store = store
+        self.server = ThreadingHTTPServer((host, port), _make_handler(store, latency_ms / 1000.0))
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakePostgrest":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# =========================
+# 数据种子
+# =========================
+
+def read_csv_rows(path: str) -> List[Dict[str, Any]]:
+    """读取 News_storage 导出的 CSV，并把 id / row_no 转成整数、空串转成 None。"""
+    out = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for r in csv.DictReader(f):
+            row = {k: (v if v != "" else None) for k, v in r.items()}
+            for k in ("id", "row_no"):
+                if row.get(k) is not None:
+                    try:
+                        row[k] = int(row[k])
+                    except ValueError:
+                        row[k] = None
+            out.append(row)
+    return out
+
+
+def scale_rows(rows: List[Dict[str, Any]], scale: int) -> List[Dict[str, Any]]:
+    """把语料复制 scale 份：每份换新 id 和 link，pubdate 往前平移 7*k 天。"""
+    if scale <= 1:
+        return [dict(r) for r in rows]
+    base = max((r["id"] or 0) for r in rows) + 1
+    out = []
+    for k in range(scale):
+        for r in rows:
+            c = dict(r)
+            if k:
+                c["id"] = r["id"] + k * base
+                c["link"] = f"{r.get('link') or ''}#copy{k}"
+                if r.get("pubdate"):
+                    try:
+                        c["pubdate"] = (date.fromisoformat(r["pubdate"][:10]) - timedelta(days=7 * k)).isoformat()
+                    except ValueError:
+                        pass
+            out.append(c)
+    return out
+
+
+def reviews_from_articles(rows: List[Dict[str, Any]], fixture_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    为每篇文章生成一条 news_reviews 记录。给了 fixture_url 时图片指向本地夹具服务器：
+    2/3 的行带 image_url，其余只有文章页 link（走 og:image 回退）。
+    """
+    out = []
+    for i, r in enumerate(rows):
+        rv = {
+            "title": r.get("title") or "",
+            "publisher": r.get("Publisher") or r.get("creator") or "",
+            "publish_date": r.get("pubdate") or "",
+            "link": r.get("link") or "",
+            "decision": "confirm",
+            "categories": r.get("Category") or "",
+            "note": "",
+            "summary": r.get("summary") or "",
+            "image_url": r.get("image_url") or "",
+            "reviewed_at": "2025-11-20T00:00:00Z",
+        }
+        if fixture_url:
+            if i % 3 == 2:
+                rv["image_url"] = ""
+                rv["link"] = f"{fixture_url}/article/{r['id']}.html"
+            else:
+                rv["image_url"] = f"{fixture_url}/img/{r['id']}.jpg"
+        out.append(rv)
+    return out
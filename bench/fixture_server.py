@@ -0,0 +1,153 @@
+# bench/fixture_server.py — 本地 HTTP 夹具：文章图片 + 带 og:image 的文章页 + RSS
+#   /img/<n>.jpg           一张 JPEG（默认 1600x1067，模拟 NYT 头图）
+#   /article/<n>.html      约 300KB 的文章页，<head> 里有 og:image 指向 /img/<n>.jpg
+#   /feed.xml              RSS 2.0，带 ETag / Last-Modified，条件头匹配时返回 304
+
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+
+def make_jpeg(width: int = 1600, height: int = 1067, quality: int = 90) -> bytes:
+    """生成一张带渐变的 JPEG（纯色图压缩后太小，不像真实照片）。"""
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    bio = BytesIO()
+    img.save(bio, format="JPEG", quality=quality)
+    return bio.getvalue()
+
+
+def make_article_html(base_url: str, n: str, body_kb: int = 300) -> bytes:
+    head = (
+        "<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<title>Fixture article {n}</title>"
+        f"<meta property=\"og:image\" content=\"{base_url}/img/{n}.jpg\">"
+        "</head><body><article><section name=\"articleBody\">"
+    )
+    para = "<p>" + ("Urban development fixture paragraph. " * 20) + "</p>"
+    body = para * max(1, (body_kb * 1024) // len(para))
+    return (head + body + "</section></article></body></html>").encode("utf-8")
+
+
+def default_feed_items(base_url: str, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """两条近期文章 + 一条 10 天前的旧文章（给 max_age_days 过滤用）。"""
+    now = now or datetime.now(timezone.utc)
+    return [
+        {"title": " Fixture story one ", "link": f"{base_url}/article/1.html", "author": "Jane Doe",
+         "published": now - timedelta(hours=2), "summary": "<p>Zoning <b>board</b> approves&nbsp;plan.</p>"},
+        {"title": "Fixture story two", "link": f"{base_url}/article/2.html", "author": "",
+         "published": now - timedelta(days=1), "summary": "Second summary."},
+        {"title": "Old fixture story", "link": f"{base_url}/article/3.html", "author": "",
+         "published": now - timedelta(days=10), "summary": "Too old."},
+    ]
+
+
+def make_rss(items: List[Dict[str, Any]], title: str = "Fixture feed") -> bytes:
+    parts = ['<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" '
+             'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>',
+             f"<title>{escape(title)}</title><link>http://fixture.invalid/</link><description>fixture</description>"]
+    for it in items:
+        parts.append(
+            f"<item><title>{escape(it['title'])}</title><link>{escape(it['link'])}</link>"
+            f"<guid>{escape(it['link'])}</guid>"
+            + (f"<dc:creator>{escape(it['author'])}</dc:creator>" if it.get("author") else "")
+            + f"<pubDate>{format_datetime(it['published'])}</pubDate>"
+            f"<description>{escape(it.get('summary') or '')}</description></item>"
+        )
+    parts.append("</channel></rss>")
+    return "".join(parts).encode("utf-8")
+
+
+class FixtureServer:
+    """后台线程里的夹具服务器；latency_ms 模拟网络延迟。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 image_size: tuple = (1600, 1067), body_kb: int = 300):
+        self.latency = latency_ms / 1000.0
+        self.jpeg = make_jpeg(*image_size)
+        self.body_kb = body_kb
+        self.hits = {"img": 0, "article": 0, "feed": 0, "feed_304": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        # /feed.xml 的内容和校验头，测试里可以直接改
+        self.feed_items = default_feed_items(self.url)
+        self.feed_etag = '"fixture-v1"'
+        self.feed_last_modified = "Mon, 06 Oct 2025 08:00:00 GMT"
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.hits[kind] += 1
+
+    def _handler(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端读完 <head> 就关连接（流式 og:image 解析）
+
+            def _send(self, status: int, body: bytes, ctype: str, headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端读到需要的部分后提前断开
+
+            def do_GET(self):
+                import time
+                if fixture.latency:
+                    time.sleep(fixture.latency)
+                path = self.path.split("?", 1)[0]
+                if path.startswith("/img/"):
+                    fixture._count("img")
+                    self._send(200, fixture.jpeg, "image/jpeg")
+                elif path.startswith("/article/"):
+                    fixture._count("article")
+                    n = path.rsplit("/", 1)[-1].split(".", 1)[0]
+                    self._send(200, make_article_html(fixture.url, n, fixture.body_kb), "text/html; charset=utf-8")
+                elif path == "/feed.xml":
+                    fixture._count("feed")
+                    validators = {"ETag": fixture.feed_etag, "Last-Modified": fixture.feed_last_modified}
+                    inm = self.headers.get("If-None-Match")
+                    if (inm == fixture.feed_etag if inm is not None
+                            else self.headers.get("If-Modified-Since") == fixture.feed_last_modified):
+                        fixture._count("feed_304")
+                        self._send(304, b"", "application/rss+xml", validators)
+                    else:
+                        self._send(200, make_rss(fixture.feed_items), "application/rss+xml; charset=utf-8", validators)
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+        return Handler
+
+    def start(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
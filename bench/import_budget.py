@@ -0,0 +1,98 @@
+# bench/import_budget.py — 冷启动导入预算：看板依赖的模块在全新解释器里导入要多久、有没有提前加载重依赖
+#
+#   python -m bench.import_budget                    # 超预算或提前加载了 DEFERRED 里的包时退出码为 1
+#   python -m bench.import_budget --budget-ms 1000 --repeat 7
+#
+# 每次都在去掉 SUPABASE_* 环境变量的子进程里导入，顺带确认离线时导入不会失败。
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def app_modules(path: str = os.path.join(ROOT, "app.py")) -> List[str]:
+    """app.py 顶层导入的本仓库模块（按导入顺序），直接从源码里读，app.py 加了导入这里自动跟上。"""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    out: List[str] = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            top = name.split(".")[0]
+            if top not in out and os.path.exists(os.path.join(ROOT, top + ".py")):
+                out.append(top)
+    return out
+
+
+# app.py 在 streamlit 之外导入的本仓库模块
+DASHBOARD_MODULES = app_modules()
+# 这些包只应在对应功能第一次运行时才导入
+DEFERRED = ["docx", "PIL", "supabase", "streamlit.components.v1"]
+DEFAULT_BUDGET_MS = 1000.0
+
+_PROBE = r"""
+import importlib, json, sys, time
+t0 = time.perf_counter()
+for m in sys.argv[1].split(","):
+    importlib.import_module(m)
+ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({"ms": ms, "loaded": [m for m in sys.argv[2].split(",") if m in sys.modules]}))
+"""
+
+
+def probe(modules: List[str]) -> Dict[str, Any]:
+    """在全新解释器里导入 modules，返回 {"ms", "loaded"}；导入失败时抛 RuntimeError。"""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    proc = subprocess.run([sys.executable, "-c", _PROBE, ",".join(modules), ",".join(DEFERRED)],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {','.join(modules)} failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Check cold-start import time of the dashboard modules.")
+    ap.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                    help="全部看板模块导入耗时（中位数）上限")
+    ap.add_argument("--repeat", type=int, default=5, help="每项测几次取中位数")
+    args = ap.parse_args(argv)
+
+    failed = False
+    print(f"{'module':<20} {'median ms':>10}  eagerly loaded")
+    for m in DASHBOARD_MODULES:
+        runs = [probe([m]) for _ in range(args.repeat)]
+        loaded = sorted({x for r in runs for x in r["loaded"]})
+        print(f"{m:<20} {statistics.median(r['ms'] for r in runs):>10.1f}  {', '.join(loaded) or '-'}")
+
+    runs = [probe(DASHBOARD_MODULES) for _ in range(args.repeat)]
+    total = statistics.median(r["ms"] for r in runs)
+    loaded = sorted({x for r in runs for x in r["loaded"]})
+    print(f"{'(all)':<20} {total:>10.1f}  {', '.join(loaded) or '-'}")
+
+    if loaded:
+        print(f"FAIL: imported at startup: {', '.join(loaded)}")
+        failed = True
+    if total > args.budget_ms:
+        print(f"FAIL: {total:.0f} ms > budget {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"OK: {total:.0f} ms <= budget {args.budget_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
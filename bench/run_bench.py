@@ -0,0 +1,225 @@
+# bench/run_bench.py — 离线端到端基准：假 PostgREST + 本地图片/文章夹具，不需要 Supabase / NYT / Notion
+#
+#   python -m bench.run_bench                       # 1x / 10x / 100x 语料
+#   python -m bench.run_bench --scales 1,10 --repeat 10 --json bench.json
+#
+# 场景：load_articles（首次全量同步 / 增量同步）、侧边栏筛选、向量索引构建与语义搜索、_fetch_reviews_week、
+# build_weekly_docx（冷/热图片缓存）。
+# 每个场景输出 p50 / p90 / p99 延迟和峰值内存（tracemalloc，单独跑一次测得）。
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.fake_postgrest import (FAKE_KEY, FakePostgrest, FakeStore, read_csv_rows,
+                                  reviews_from_articles, scale_rows)
+from bench.fixture_server import FixtureServer
+
+DEFAULT_CSV = os.path.join(ROOT, "News_storage_rows.csv")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    s = sorted(values)
+    if not s:
+        return 0.0
+    k = (len(s) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def measure(fn: Callable[[], Any], repeat: int, setup: Callable[[], Any] = None) -> Dict[str, float]:
+    """先跑 repeat 次计时，再开 tracemalloc 单独跑一次测峰值内存。setup 不计入时间。"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "n": repeat,
+        "p50_ms": _percentile(times, 50),
+        "p90_ms": _percentile(times, 90),
+        "p99_ms": _percentile(times, 99),
+        "mean_ms": sum(times) / len(times) if times else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def _busiest_monday(rows: List[Dict[str, Any]]) -> date:
+    weeks = Counter()
+    for r in rows:
+        try:
+            d = date.fromisoformat(str(r.get("pubdate"))[:10])
+        except ValueError:
+            continue
+        weeks[d - timedelta(days=d.weekday())] += 1
+    return weeks.most_common(1)[0][0]
+
+
+def run_scale(scale: int, base_rows: List[Dict[str, Any]], repeat: int, workdir: str,
+              pg: FakePostgrest, fixture: FixtureServer, max_docx_rows: int) -> List[Dict[str, Any]]:
+    # 这些模块在 run() 里设置好环境变量之后才导入
+    import image_cache
+    import supabase_io
+    from facets import FilterCache, filter_key
+    from news_data import ArticleStore, articles_frame
+    from search_index import SearchIndex
+    from vector_index import VectorIndex
+    from weekly_report import build_weekly_docx, fetch_reviews_week
+
+    rows = scale_rows(base_rows, scale)
+    pg.store.create(supabase_io.ARTICLES_TABLE, rows)
+    pg.store.create(supabase_io.REVIEWS_TABLE, reviews_from_articles(rows, fixture.url))
+    mirror = os.path.join(workdir, f"mirror_{scale}x.sqlite3")
+    results = []
+
+    def record(name: str, stats: Dict[str, float], **extra):
+        stats = {"scale": f"{scale}x", "scenario": name, "rows": len(rows), **stats, **extra}
+        results.append(stats)
+        print(f"  {name:<34} p50={stats['p50_ms']:9.2f}ms  p90={stats['p90_ms']:9.2f}ms  "
+              f"p99={stats['p99_ms']:9.2f}ms  peak={stats['peak_kb']:10.0f}KB")
+
+    # --- load_articles：首次全量同步 + 建 DataFrame ---
+    def reset_mirror():
+        if os.path.exists(mirror):
+            os.remove(mirror)
+
+    def load_cold():
+        supabase_io.sync_articles(mirror)
+        return ArticleStore(articles_frame(supabase_io.load_mirror_articles(mirror)))
+
+    record("load_articles (cold sync)", measure(load_cold, max(1, repeat // 4), setup=reset_mirror))
+
+    # --- load_articles：镜像已是最新，只做增量检查 + 读镜像 ---
+    supabase_io.sync_articles(mirror)
+    record("load_articles (incremental)", measure(load_cold, repeat))
+
+    # --- 侧边栏筛选 ---
+    store = load_cold()
+    df_all = store.frame
+    index = SearchIndex()
+    record("search index build", measure(
+        lambda: SearchIndex().update_from_records(df_all[["id", "title", "summary", "maintext"]].to_dict("records")),
+        max(1, repeat // 4)))
+    index.update_from_records(df_all[["id", "title", "summary", "maintext"]].to_dict("records"))
+    min_d, max_d = store.date_bounds()
+    pubs = store.publishers()
+    filter_states = [
+        dict(from_d=min_d, to_d=max_d, sel_pubs=pubs, q="", only_unreviewed=False),
+        dict(from_d=max_d - timedelta(days=14), to_d=max_d, sel_pubs=pubs[:2], q="", only_unreviewed=False),
+        dict(from_d=min_d, to_d=max_d, sel_pubs=pubs, q="housing", only_unreviewed=False),
+        dict(from_d=min_d, to_d=max_d, sel_pubs=pubs, q='"affordable housing"', only_unreviewed=True),
+    ]
+    for i, fs in enumerate(filter_states):
+        record(f"filters[{i}] q={fs['q'] or '-'}",
+               measure(lambda fs=fs: store.aggregate(store.select(search_index=index, **fs)), repeat),
+               matched=len(store.select(search_index=index, **fs)))
+    # 同一筛选条件再次 rerun（只改了审核面板）：FilterCache 命中
+    cache = FilterCache()
+    fs = filter_states[2]
+    key = filter_key("bench", collapse_dups=False, **fs)
+    cache.get_or_compute(key, lambda: store.aggregate(store.select(search_index=index, **fs)))
+    record("filters (memoized rerun)", measure(lambda: cache.get_or_compute(
+        filter_key("bench", collapse_dups=False, **fs), lambda: None), repeat))
+
+    # --- 语义搜索：建向量索引（memmap 落盘）+ 精确 / IVF 查询 ---
+    vec_records = df_all[["id", "title", "summary", "maintext"]].to_dict("records")
+    vec_dir = os.path.join(workdir, f"vectors_{scale}x")
+
+    def reset_vectors():
+        shutil.rmtree(vec_dir, ignore_errors=True)
+
+    record("vector index build", measure(lambda: VectorIndex(vec_dir).update_from_records(vec_records),
+                                         max(1, repeat // 4), setup=reset_vectors))
+    vindex = VectorIndex(vec_dir)
+    vq = ["affordable housing lottery", "rezoning public land", "museum cultural district", "building emissions"]
+    record("semantic search (exact)", measure(lambda: [vindex.search(t, 10, exact=True) for t in vq], repeat),
+           queries=len(vq), chunks=vindex.stats()["chunks"])
+    if vindex.stats()["ivf_lists"]:
+        record("semantic search (ivf)", measure(lambda: [vindex.search(t, 10) for t in vq], repeat),
+               queries=len(vq), ivf_lists=vindex.stats()["ivf_lists"])
+
+    # --- _fetch_reviews_week ---
+    monday = _busiest_monday(rows)
+    week_rows = fetch_reviews_week(monday)
+    record("_fetch_reviews_week", measure(lambda: fetch_reviews_week(monday), repeat),
+           week=monday.isoformat(), week_rows=len(week_rows))
+
+    # --- build_weekly_docx：冷缓存（每次清空图片缓存）/ 热缓存 ---
+    docx_rows = week_rows[:max_docx_rows]
+    size = {}
+
+    def build():
+        bio = build_weekly_docx(docx_rows, monday, "Benchmark")
+        size["bytes"] = len(bio.getvalue())
+
+    record("build_weekly_docx (cold images)",
+           measure(build, max(1, repeat // 4), setup=image_cache.image_cache.clear),
+           docx_rows=len(docx_rows))
+    record("build_weekly_docx (warm images)", measure(build, max(1, repeat // 4)),
+           docx_rows=len(docx_rows), docx_kb=size.get("bytes", 0) // 1024)
+    return results
+
+
+def run(argv=None) -> List[Dict[str, Any]]:
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmarks for the Urban Lab dashboard code paths.")
+    ap.add_argument("--scales", default="1,10,100", help="语料倍数，逗号分隔")
+    ap.add_argument("--repeat", type=int, default=20, help="每个场景重复次数（冷启动类场景为 1/4）")
+    ap.add_argument("--csv", default=DEFAULT_CSV, help="种子数据（News_storage 导出）")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="给假服务器加的每请求延迟")
+    ap.add_argument("--max-docx-rows", type=int, default=40, help="build_weekly_docx 最多取多少条")
+    ap.add_argument("--json", help="把结果写成 JSON 文件")
+    args = ap.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="urbanlab-bench-")
+    pg = FakePostgrest(FakeStore(), latency_ms=args.latency_ms).start()
+    fixture = FixtureServer(latency_ms=args.latency_ms).start()
+    # Supabase 客户端第一次使用时按环境变量创建，先把它们指向本地服务
+    os.environ["SUPABASE_URL"] = pg.url
+    os.environ["SUPABASE_SERVICE_ROLE"] = FAKE_KEY
+    os.environ["URBANLAB_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["URBANLAB_MIRROR_PATH"] = os.path.join(workdir, "mirror.sqlite3")
+
+    base_rows = read_csv_rows(args.csv)
+    results: List[Dict[str, Any]] = []
+    try:
+        for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+            print(f"== corpus {scale}x ({len(base_rows) * scale} rows) ==")
+            results.extend(run_scale(scale, base_rows, args.repeat, workdir, pg, fixture, args.max_docx_rows))
+    finally:
+        pg.stop()
+        fixture.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+    return results
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,60 @@
+# cache_versions.py — 按分区打版本号的缓存失效
+# 缓存 key 里带上分区（例如某一周）的版本号；数据变了只把受影响分区的版本号加一，
+# 旧 key 自然不再命中，其它分区的缓存照常使用，因此缓存本身可以设很长的 TTL。
+#   REVIEWS_WEEK   news_reviews 按 start_of_week(publish_date) 分区（supabase_io.upsert_reviews 写入后加一）
+#   ARTICLES_WEEK  本地镜像按文章发布周分区（supabase_io 写镜像时加一）
+# 两种版本号都记在本地镜像的 meta 表里，同一台机器上的进程之间共享。
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Hashable, Tuple
+
+REVIEWS_WEEK = "reviews_week"
+ARTICLES_WEEK = "articles_week"
+UNDATED = "undated"
+PARTITION_CACHE_ENTRIES = 512
+
+
+def week_key(value: Any) -> str:
+    """日期 / 'YYYY-MM-DD…' 字符串 → 所在周周一的 ISO 字符串；没有或解析不了为 UNDATED。"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        try:
+            value = date.fromisoformat(str(value or "")[:10])
+        except ValueError:
+            return UNDATED
+    return (value - timedelta(days=value.weekday())).isoformat()
+
+
+class PartitionCache:
+    """
+    线程安全的 LRU：key 为 (命名空间, 分区, 版本)。
+    同一分区写入新版本时顺带删掉旧版本，内存里每个分区只留最新的一份。
+    """
+
+    def __init__(self, max_entries: int = PARTITION_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, Hashable], Tuple[Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, namespace: str, partition: Hashable, version: Any,
+                       compute: Callable[[], Any]) -> Any:
+        key = (namespace, partition)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] == version:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
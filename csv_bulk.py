@@ -0,0 +1,422 @@
+# csv_bulk.py — News_storage 与 CSV 导出文件（如 News_storage_rows.csv）之间的批量导入 / 导出
+#   python csv_bulk.py import News_storage_rows.csv              # 回填 / 恢复
+#   python csv_bulk.py import rows.csv --dry-run --rejects bad.csv
+#   python csv_bulk.py export backup.csv
+# 导入：csv 模块流式读取（maintext 里带换行的引号字段也能正确解析），逐行按 SYNC_FIELDS 校验和转换类型，
+# 按 link 去重（文件内先出现的为准；已在表里的 link 改写成表里那一行的 id，更新而不是新增），
+# 攒满一批（行数或字节数）交给线程池写入，最多 inflight 批同时在途，内存占用与文件大小无关。
+# 导出：按 id 做 keyset 分页，读下一页的同时写当前页。
+# 两个方向都按阶段（解析 / 查重 / 写入、读取 / 写文件）统计行数、字节数和吞吐。
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from perf import span
+from supabase_io import (ID_SEQUENCE_SQL, SYNC_FIELDS, fetch_article_ids_by_link, fetch_articles_by_id_page,
+                         reset_article_id_sequence, sync_articles, upsert_articles)
+
+CHUNK_ROWS     = 500               # 每批最多多少行
+CHUNK_BYTES    = 1024 * 1024       # 每批 JSON 大约不超过 1MB（maintext 长的行会先触发这一条）
+INFLIGHT       = 4                 # 同时在途的写入批数
+CHUNK_RETRIES  = 2                 # 单批写入失败后重试几次
+EXPORT_PAGE    = 1000
+CSV_FIELD_LIMIT = 16 * 1024 * 1024  # csv 默认单字段上限 128KB，长正文会超
+
+INT_FIELDS = ("id", "row_no")
+
+
+class RowError(ValueError):
+    """单行校验失败（写进 rejects 文件，不中断导入）。"""
+
+
+# =========================
+# 阶段统计
+# =========================
+
+class PhaseStats:
+    """按阶段累计行数、字节数和耗时（秒；多线程阶段为各线程耗时之和），线程安全。"""
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def add(self, phase: str, rows: int = 0, nbytes: int = 0, seconds: float = 0.0) -> None:
+        with self._lock:
+            p = self.phases.setdefault(phase, {"rows": 0, "bytes": 0, "seconds": 0.0})
+            p["rows"] += rows
+            p["bytes"] += nbytes
+            p["seconds"] += seconds
+
+    def report(self) -> List[Dict[str, Any]]:
+        wall = time.perf_counter() - self._t0
+        out = []
+        with self._lock:
+            for name, p in self.phases.items():
+                s = p["seconds"]
+                out.append({"phase": name, "rows": int(p["rows"]), "mb": round(p["bytes"] / 1e6, 2),
+                            "seconds": round(s, 3), "rows_per_s": round(p["rows"] / s, 1) if s else None,
+                            "mb_per_s": round(p["bytes"] / 1e6 / s, 2) if s else None})
+        out.append({"phase": "(wall)", "rows": None, "mb": None, "seconds": round(wall, 3),
+                    "rows_per_s": None, "mb_per_s": None})
+        return out
+
+
+def print_report(report: List[Dict[str, Any]]) -> None:
+    print(f"{'phase':<10} {'rows':>8} {'MB':>8} {'seconds':>9} {'rows/s':>10} {'MB/s':>8}")
+    for r in report:
+        cells = [("" if r[k] is None else r[k]) for k in ("rows", "mb", "seconds", "rows_per_s", "mb_per_s")]
+        print(f"{r['phase']:<10} {cells[0]:>8} {cells[1]:>8} {cells[2]:>9} {cells[3]:>10} {cells[4]:>8}")
+
+
+# =========================
+# 校验 / 类型转换
+# =========================
+
+def _coerce_int(name: str, v: str) -> int:
+    try:
+        return int(float(v)) if "." in v else int(v)
+    except ValueError:
+        raise RowError(f"{name}: not an integer: {v[:40]!r}")
+
+
+def _coerce_date(v: str) -> str:
+    """'2025-10-21' / '2025-10-21T08:00:00Z' / '2025-10-21 08:00:00+00' → '2025-10-21'。"""
+    try:
+        return date.fromisoformat(v[:10]).isoformat()
+    except ValueError:
+        pass
+    for fmt in ("%m/%d/%Y", "%a, %d %b %Y %H:%M:%S %z", "%a, %d %b %Y %H:%M:%S %Z"):
+        try:
+            return datetime.strptime(v, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise RowError(f"pubdate: unrecognized date: {v[:40]!r}")
+
+
+def coerce_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    CSV 的一行 → 与 SYNC_FIELDS 对应的 dict：空串变 None，id / row_no 转整数，pubdate 规范成 YYYY-MM-DD，
+    多余的列丢掉。CSV 表头里没有的列不出现在结果里（upsert 时不动表里这些列）。没有 link 的行抛 RowError。
+    """
+    row: Dict[str, Any] = {}
+    for name in SYNC_FIELDS:
+        if name not in raw:  # DictReader 给每行都填上表头的全部列，不在 raw 里就是表头没有
+            continue
+        v = raw[name]
+        v = v.strip() if isinstance(v, str) and name not in ("maintext", "summary") else v
+        if v is None or v == "":
+            row[name] = None
+        elif name in INT_FIELDS:
+            row[name] = _coerce_int(name, v)
+        elif name == "pubdate":
+            row[name] = _coerce_date(v)
+        else:
+            row[name] = v
+    if not row.get("link"):
+        raise RowError("link: missing")
+    return row
+
+
+def _link_key(link: str) -> bytes:
+    # 去重集合里只存 16 字节摘要，几十万行也只占几 MB
+    return hashlib.blake2b(link.encode("utf-8"), digest_size=16).digest()
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    return len(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+# =========================
+# 导入
+# =========================
+
+class _CountingReader(io.RawIOBase):
+    """包一层原始文件，记录已读字节数（文本模式的 csv 迭代时 tell() 不可用）。"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self.raw.readinto(b) or 0
+        self.bytes += n
+        return n
+
+
+def iter_csv_rows(path: str, stats: Optional[PhaseStats] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """流式读取 CSV，产出 (记录号, 原始 dict)；记录号从 1 开始，多行的引号字段算一条。"""
+    csv.field_size_limit(max(csv.field_size_limit(), CSV_FIELD_LIMIT))
+    with open(path, "rb") as raw:
+        counter = _CountingReader(raw)
+        f = io.TextIOWrapper(io.BufferedReader(counter), encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+        if "link" not in columns:
+            raise ValueError(f"{path}: no 'link' column (columns: {columns})")
+        unknown = [c for c in columns if c not in SYNC_FIELDS]
+        if unknown:
+            print(f"ignoring unknown columns: {', '.join(unknown)}", file=sys.stderr)
+        # 解析耗时只算读和解析，不算调用方处理每一行的时间
+        pos, rows, busy = 0, 0, 0.0
+        t = time.perf_counter()
+        for n, rec in enumerate(reader, start=1):
+            busy += time.perf_counter() - t
+            rows += 1
+            if stats is not None and rows == 500:
+                stats.add("parse", rows=rows, nbytes=counter.bytes - pos, seconds=busy)
+                pos, rows, busy = counter.bytes, 0, 0.0
+            yield n, rec
+            t = time.perf_counter()
+        busy += time.perf_counter() - t
+        if stats is not None:
+            stats.add("parse", rows=rows, nbytes=counter.bytes - pos, seconds=busy)
+
+
+class _Uploader:
+    """把批次交给线程池写入；在途批数达到 inflight 时阻塞，等最早完成的一批。"""
+
+    def __init__(self, inflight: int, stats: PhaseStats, dry_run: bool, lookup: bool, keep_ids: bool = False):
+        self.inflight = inflight
+        self.stats = stats
+        self.dry_run = dry_run
+        self.lookup = lookup
+        self.keep_ids = keep_ids
+        self.pool = ThreadPoolExecutor(max_workers=inflight, thread_name_prefix="csv-bulk")
+        self.futures: Set[Future] = set()
+        self.written = 0
+        self.failed: List[Tuple[Dict[str, Any], str]] = []
+        self._lock = threading.Lock()
+
+    def _lookup(self, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        t = time.perf_counter()
+        existing = fetch_article_ids_by_link([r["link"] for r in rows])
+        self.stats.add("lookup", rows=len(rows), seconds=time.perf_counter() - t)
+        return existing
+
+    def _send(self, rows: List[Dict[str, Any]], nbytes: int) -> None:
+        """
+        写一批：带 id 的行按 id upsert（重发是幂等的），新行 insert。
+        insert 超时后可能已经提交，所以重试前重新按 link 查一遍还没有 id 的行，已经进表的改成按 id 更新，
+        只 insert 仍然缺的。查询失败和写入失败一样计入重试；用完重试仍没写成的行记为失败。
+        """
+        t = time.perf_counter()
+        pending = rows
+        written = 0
+        err: Optional[str] = None
+        for attempt in range(CHUNK_RETRIES + 1):
+            try:
+                if attempt == 0:
+                    existing = self._lookup(rows) if self.lookup else {}
+                    for r in rows:
+                        if r["link"] in existing:
+                            r["id"] = existing[r["link"]]  # 表里已有同一 link：更新那一行
+                        elif not self.keep_ids:
+                            # 新文章：CSV 里的 id 可能是别的库的，按它 upsert 会覆盖无关的行，交给数据库分配
+                            r.pop("id", None)
+                else:
+                    new = [r for r in pending if r.get("id") is None]
+                    existing = self._lookup(new) if new else {}
+                    for r in new:
+                        if r["link"] in existing:
+                            r["id"] = existing[r["link"]]
+                keyed = [r for r in pending if r.get("id") is not None]
+                new = [r for r in pending if r.get("id") is None]
+                if keyed:
+                    upsert_articles(keyed, chunk_size=len(keyed))
+                    written += len(keyed)
+                    pending = new
+                if new:
+                    upsert_articles(new, chunk_size=len(new))
+                    written += len(new)
+                    pending = []
+                err = None
+                break
+            except Exception as e:
+                err = f"{type(e).__name__}: {e}"[:300]
+                if attempt < CHUNK_RETRIES:
+                    time.sleep(0.5 * 2 ** attempt)
+        self.stats.add("upsert", rows=written, nbytes=nbytes, seconds=time.perf_counter() - t)
+        with self._lock:
+            self.written += written
+            if err is not None:
+                self.failed.extend((r, err) for r in pending)
+
+    def submit(self, rows: List[Dict[str, Any]], nbytes: int) -> None:
+        if self.dry_run:
+            self.written += len(rows)
+            return
+        while len(self.futures) >= self.inflight:
+            done, self.futures = wait(self.futures, return_when=FIRST_COMPLETED)
+            for fut in done:
+                fut.result()
+        self.futures.add(self.pool.submit(self._send, rows, nbytes))
+
+    def close(self) -> None:
+        for fut in self.futures:
+            fut.result()
+        self.futures.clear()
+        self.pool.shutdown(wait=True)
+
+
+def import_csv(path: str, chunk_rows: int = CHUNK_ROWS, chunk_bytes: int = CHUNK_BYTES,
+               inflight: int = INFLIGHT, lookup: bool = True, dry_run: bool = False,
+               rejects_path: Optional[str] = None, keep_ids: bool = False) -> Dict[str, Any]:
+    """
+    把 CSV 导入 News_storage，返回 {read, written, duplicates, rejected, failed, next_id, phases}。
+    lookup=False 时不查表里已有的 link（导入空表时省掉这些请求）；dry_run=True 时只解析、校验、去重。
+    表里找不到 link 的行丢掉 CSV 的 id 由数据库分配；keep_ids=True（从备份恢复）时保留，写完把 id 序列推到 max(id) 之后。
+    rejects_path 给出时，校验失败和写入失败的行连同原因写进这个 CSV。
+    """
+    stats = PhaseStats()
+    uploader = _Uploader(inflight, stats, dry_run, lookup, keep_ids)
+    seen: Set[bytes] = set()
+    counts = {"read": 0, "duplicates": 0, "rejected": 0}
+    rejects_f = open(rejects_path, "w", encoding="utf-8", newline="") if rejects_path else None
+    rejects = csv.writer(rejects_f) if rejects_f else None
+    if rejects:
+        rejects.writerow(["record", "error"] + SYNC_FIELDS)
+
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    try:
+        with span("csv_bulk.import", path=path) as sp:
+            for n, raw in iter_csv_rows(path, stats):
+                counts["read"] += 1
+                try:
+                    row = coerce_row(raw)
+                except RowError as e:
+                    counts["rejected"] += 1
+                    if rejects:
+                        rejects.writerow([n, str(e)] + [raw.get(c) for c in SYNC_FIELDS])
+                    continue
+                key = _link_key(row["link"])
+                if key in seen:
+                    counts["duplicates"] += 1
+                    continue
+                seen.add(key)
+                size = _row_bytes(row)
+                if batch and (len(batch) >= chunk_rows or batch_bytes + size > chunk_bytes):
+                    uploader.submit(batch, batch_bytes)
+                    batch, batch_bytes = [], 0
+                batch.append(row)
+                batch_bytes += size
+            if batch:
+                uploader.submit(batch, batch_bytes)
+            uploader.close()
+            sp.set(rows=counts["read"], written=uploader.written)
+        for row, err in uploader.failed:
+            if rejects:
+                rejects.writerow(["", err] + [row.get(c) for c in SYNC_FIELDS])
+    finally:
+        if rejects_f:
+            rejects_f.close()
+    next_id, seq_error = None, None
+    if keep_ids and uploader.written and not dry_run:
+        try:
+            next_id = reset_article_id_sequence()
+        except Exception as e:
+            seq_error = f"{type(e).__name__}: {e}"[:300]
+    return {**counts, "written": uploader.written, "failed": len(uploader.failed),
+            "next_id": next_id, "sequence_error": seq_error,
+            "last_error": uploader.failed[-1][1] if uploader.failed else None, "phases": stats.report()}
+
+
+# =========================
+# 导出
+# =========================
+
+def export_csv(path: str, page_size: int = EXPORT_PAGE) -> Dict[str, Any]:
+    """
+    按 id 顺序把 News_storage 全表导出成与 News_storage_rows.csv 相同列序的 CSV，返回 {rows, phases}。
+    下一页在后台线程里读，与写当前页重叠。
+    """
+    stats = PhaseStats()
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="csv-export")
+
+    def fetch(after: Optional[int]) -> List[Dict[str, Any]]:
+        t = time.perf_counter()
+        rows = fetch_articles_by_id_page(after, page_size)
+        stats.add("fetch", rows=len(rows), seconds=time.perf_counter() - t)
+        return rows
+
+    n = 0
+    try:
+        with span("csv_bulk.export", path=path) as sp, open(path, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(SYNC_FIELDS)
+            fut = pool.submit(fetch, None)
+            while True:
+                rows = fut.result()
+                if not rows:
+                    break
+                # 不能以“不满一页”判断结束：PostgREST 的 max-rows 可能比 page_size 小
+                fut = pool.submit(fetch, rows[-1]["id"])
+                t, pos = time.perf_counter(), f.tell()
+                w.writerows([["" if r.get(c) is None else r.get(c) for c in SYNC_FIELDS] for r in rows])
+                stats.add("write", rows=len(rows), nbytes=f.tell() - pos, seconds=time.perf_counter() - t)
+                n += len(rows)
+            sp.set(rows=n)
+    finally:
+        pool.shutdown(wait=True)
+    return {"rows": n, "phases": stats.report()}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Bulk import / export News_storage as CSV.")
+    ap.add_argument("command", choices=["import", "export"])
+    ap.add_argument("path", help="CSV 文件")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="import：每批最多多少行")
+    ap.add_argument("--chunk-kb", type=int, default=CHUNK_BYTES // 1024, help="import：每批大约多少 KB")
+    ap.add_argument("--inflight", type=int, default=INFLIGHT, help="import：同时在途的批数")
+    ap.add_argument("--no-lookup", action="store_true", help="import：不查表里已有的 link（导入空表时用）")
+    ap.add_argument("--dry-run", action="store_true", help="import：只解析、校验、去重，不写入")
+    ap.add_argument("--rejects", help="import：把被拒绝 / 写入失败的行写到这个 CSV")
+    ap.add_argument("--no-resync", action="store_true", help="import：写完不核对本地镜像")
+    ap.add_argument("--keep-ids", action="store_true",
+                    help="import：从备份恢复，表里没有的 link 也按 CSV 的 id 写入，写完重置 id 序列")
+    ap.add_argument("--page-size", type=int, default=EXPORT_PAGE, help="export：每页行数")
+    args = ap.parse_args(argv)
+
+    if args.command == "export":
+        res = export_csv(args.path, args.page_size)
+        print(f"exported {res['rows']} rows -> {args.path}")
+        print_report(res["phases"])
+        return 0
+
+    res = import_csv(args.path, chunk_rows=args.chunk_rows, chunk_bytes=args.chunk_kb * 1024,
+                     inflight=args.inflight, lookup=not args.no_lookup, dry_run=args.dry_run,
+                     rejects_path=args.rejects, keep_ids=args.keep_ids)
+    print(f"read {res['read']} rows: written {res['written']}{' (dry run)' if args.dry_run else ''}, "
+          f"duplicate links {res['duplicates']}, rejected {res['rejected']}, failed {res['failed']}")
+    if res["last_error"]:
+        print(f"last error: {res['last_error']}")
+    if res["next_id"] is not None:
+        print(f"id sequence reset, next id {res['next_id']}")
+    if res["sequence_error"]:
+        print(f"id sequence reset failed ({res['sequence_error']}); create the function once and rerun, "
+              f"or run setval by hand:\n{ID_SEQUENCE_SQL}")
+    if res["written"] and not args.dry_run and not args.no_resync:
+        # 导入会改已有行，增量同步看不到；按 id 核对一遍镜像，看板刷新后即可看到
+        try:
+            print(f"mirror resynced: {sync_articles(full=True)} rows changed")
+        except Exception as e:
+            print(f"mirror resync failed (run `python supabase_io.py sync --full`): {e}")
+    print_report(res["phases"])
+    return 1 if res["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# dedup.py — 近似重复文章检测（MinHash + LSH）
+# 同一篇稿子经常以转载/改标题的形式出现在多个 feed 里：按 标题+摘要+正文开头 的词 3-gram 做 MinHash 签名，
+# LSH 分桶找候选（不用两两比较），再用签名估计的 Jaccard 相似度确认；相似的文章连成一个簇。
+
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from search_index import tokenize
+
+SHINGLE_SIZE = 3          # 词 3-gram
+MAX_TOKENS = 100          # 正文只取开头一段：转载稿差异多在结尾；抓错正文时也不至于压过标题/摘要
+NUM_PERM = 128            # 签名长度
+LSH_BANDS = 32            # 32 段 × 4 行：相似度约 0.42 以上的成对文章大概率落进同一个桶
+SIMILARITY_THRESHOLD = 0.6
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+
+def _permutations(num_perm: int, seed: int = 1) -> tuple:
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def doc_text(title: str = "", summary: str = "", maintext: str = "") -> List[str]:
+    """参与比较的 token 序列：标题 + 摘要 + 正文前 MAX_TOKENS 个词。"""
+    toks = tokenize(title) + tokenize(summary)
+    toks += tokenize(maintext)[:MAX_TOKENS]
+    return toks
+
+
+class NearDupIndex:
+    """
+    可增量维护的近似重复索引：
+      _sigs[doc_id]        MinHash 签名（uint32 × NUM_PERM）
+      _buckets[band]       band 哈希 → doc_id 集合
+      _neighbors[doc_id]   已确认相似的文章
+    簇 = _neighbors 图的连通分量，簇号取分量里最小的 doc_id（通常是最早入库的那篇），结果缓存到下次改动。
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = LSH_BANDS,
+                 threshold: float = SIMILARITY_THRESHOLD):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._a, self._b = _permutations(num_perm)
+        self._sigs: Dict[Any, np.ndarray] = {}
+        self._fingerprint: Dict[Any, int] = {}
+        self._buckets: List[Dict[bytes, Set[Any]]] = [dict() for _ in range(bands)]
+        self._neighbors: Dict[Any, Set[Any]] = {}
+        self._clusters: Optional[Dict[Any, Any]] = None
+        self._lock = threading.RLock()
+        self.version: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._sigs)
+
+    # ---------- 签名 ----------
+
+    def signature(self, tokens: List[str]) -> Optional[np.ndarray]:
+        """token 序列 → MinHash 签名；太短（凑不出一个 shingle）返回 None，不参与去重。"""
+        if len(tokens) < SHINGLE_SIZE:
+            return None
+        h = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens))
+        sh = np.zeros(len(tokens) - SHINGLE_SIZE + 1, dtype=np.uint64)
+        for k in range(SHINGLE_SIZE):
+            sh = (sh * np.uint64(1000003)) ^ h[k:len(h) - SHINGLE_SIZE + 1 + k]
+        sh = np.unique(sh & _MASK32)
+        # (a·x + b) mod p，溢出按 uint64 回绕，取低 32 位
+        hv = (np.outer(self._a, sh) + self._b[:, None]) % _MERSENNE
+        return (hv & _MASK32).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        r = self.rows
+        return [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def similarity(self, sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """签名估计的 Jaccard 相似度。"""
+        return float(np.count_nonzero(sig_a == sig_b)) / self.num_perm
+
+    # ---------- 写入 ----------
+
+    def add(self, doc_id: Any, title: str = "", summary: str = "", maintext: str = "") -> bool:
+        """加入/更新一篇文章；内容没变时跳过，返回是否改动了索引。"""
+        fp = hash((title or "", summary or "", maintext or ""))
+        with self._lock:
+            if self._fingerprint.get(doc_id) == fp:
+                return False
+            if doc_id in self._fingerprint:
+                self._remove(doc_id)
+            self._fingerprint[doc_id] = fp
+            self._neighbors[doc_id] = set()
+            self._clusters = None
+            sig = self.signature(doc_text(title, summary, maintext))
+            if sig is None:
+                return True
+            for other in self._candidates(sig):
+                if self.similarity(sig, self._sigs[other]) >= self.threshold:
+                    self._neighbors[doc_id].add(other)
+                    self._neighbors[other].add(doc_id)
+            self._sigs[doc_id] = sig
+            for band, key in zip(self._buckets, self._band_keys(sig)):
+                band.setdefault(key, set()).add(doc_id)
+            return True
+
+    def remove(self, doc_id: Any) -> None:
+        with self._lock:
+            if doc_id in self._fingerprint:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id: Any) -> None:
+        self._fingerprint.pop(doc_id, None)
+        sig = self._sigs.pop(doc_id, None)
+        if sig is not None:
+            for band, key in zip(self._buckets, self._band_keys(sig)):
+                members = band.get(key)
+                if members is not None:
+                    members.discard(doc_id)
+                    if not members:
+                        del band[key]
+        for other in self._neighbors.pop(doc_id, ()):
+            self._neighbors[other].discard(doc_id)
+        self._clusters = None
+
+    def update_from_records(self, records: Iterable[Dict[str, Any]], version: Optional[str] = None,
+                            id_field: str = "id") -> int:
+        """与 SearchIndex.update_from_records 相同：只处理新增/变更的记录，同一 version 整批跳过。"""
+        with self._lock:
+            if version is not None and version == self.version:
+                return 0
+            changed = 0
+            seen = set()
+            for r in records:
+                doc_id = r.get(id_field)
+                seen.add(doc_id)
+                if self.add(doc_id, r.get("title"), r.get("summary"), r.get("maintext")):
+                    changed += 1
+            for doc_id in [d for d in self._fingerprint if d not in seen]:
+                self._remove(doc_id)
+                changed += 1
+            self.version = version
+            return changed
+
+    # ---------- 查询 ----------
+
+    def _candidates(self, sig: np.ndarray) -> Set[Any]:
+        out: Set[Any] = set()
+        for band, key in zip(self._buckets, self._band_keys(sig)):
+            members = band.get(key)
+            if members:
+                out |= members
+        return out
+
+    def query(self, title: str = "", summary: str = "", maintext: str = "") -> List[Any]:
+        """返回与给定内容近似重复的已有文章（不写入索引），按相似度从高到低。"""
+        sig = self.signature(doc_text(title, summary, maintext))
+        if sig is None:
+            return []
+        with self._lock:
+            scored = [(self.similarity(sig, self._sigs[d]), d) for d in self._candidates(sig)]
+        return [d for s, d in sorted(scored, key=lambda x: -x[0]) if s >= self.threshold]
+
+    def clusters(self) -> Dict[Any, Any]:
+        """doc_id → 簇号（簇内最小的 doc_id）；没有重复的文章簇号就是自己。"""
+        with self._lock:
+            if self._clusters is None:
+                out: Dict[Any, Any] = {}
+                for start in self._fingerprint:
+                    if start in out:
+                        continue
+                    comp, stack = [start], [start]
+                    out[start] = None
+                    while stack:
+                        for nb in self._neighbors.get(stack.pop(), ()):
+                            if nb not in out:
+                                out[nb] = None
+                                comp.append(nb)
+                                stack.append(nb)
+                    root = min(comp)
+                    for d in comp:
+                        out[d] = root
+                self._clusters = out
+            return self._clusters
+
+    def cluster_of(self, doc_id: Any) -> Any:
+        return self.clusters().get(doc_id, doc_id)
@@ -0,0 +1,48 @@
+# facets.py — 侧边栏与 “Weekly Articles” 面板用的筛选结果缓存
+# FilterCache：按筛选条件记住筛选出的行号和对应的统计结果（LRU 淘汰），只改了勾选框之类的 rerun 直接命中。
+# 全量的日期范围 / 出版方列表直接用 news_data.ArticleStore（随镜像版本一起缓存）。
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+FILTER_CACHE_ENTRIES = 64
+
+
+class FilterCache:
+    """线程安全的 LRU：key 为筛选条件（含镜像版本），value 为筛选结果；最多保留 max_entries 条。"""
+
+    def __init__(self, max_entries: int = FILTER_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+        value = compute()  # 计算不持锁，并发的相同请求最多算两次
+        with self._lock:
+            self.misses += 1
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def filter_key(version: Optional[str], from_d: Optional[date], to_d: Optional[date],
+               sel_pubs: Optional[Iterable[str]], q: str, only_unreviewed: bool,
+               collapse_dups: bool, semantic: str = "") -> Tuple:
+    """把侧边栏状态规范成可哈希的 key（出版方顺序无关）。"""
+    return (version, from_d, to_d, tuple(sorted(sel_pubs or ())), (q or "").strip(),
+            bool(only_unreviewed), bool(collapse_dups), (semantic or "").strip())
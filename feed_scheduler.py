@@ -0,0 +1,466 @@
+# feed_scheduler.py — 按 feed 自适应轮询的抓取守护进程（取代 n8n 固定周期的 Schedule Trigger）
+#   python feed_scheduler.py --sink supabase                     # 常驻运行，新文章写入 News_storage
+#   python feed_scheduler.py --sink notion --metrics-port 9108   # 推到 Notion，并在 :9108/metrics 暴露指标
+#   python feed_scheduler.py --once                              # 只把到期的 feed 抓一轮（给 cron 用）
+# 每个 feed 从条目的发布时间学习更新间隔（EWMA），按“每个预期间隔轮询 POLLS_PER_GAP 次”安排下次抓取；
+# 没有新文章就按 QUIET_BACKOFF 逐步拉长间隔，出错按指数退避。抓取本身复用 rss_ingest.fetch_feed
+# （ETag / Last-Modified 条件请求），总并发由一个信号量限制。
+# 调度状态（间隔、速率、已见链接）存成 JSON，重启后接着用；队列深度和延迟指标随状态一起写盘。
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from dedup import NearDupIndex
+from perf import span
+from rss_ingest import FEED_STATE_PATH, FEEDS, FeedState, fetch_feed
+
+SCHEDULER_STATE_PATH = os.environ.get("URBANLAB_SCHEDULER_STATE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "feed_scheduler.json"
+)
+MAX_CONCURRENCY  = 4
+MIN_INTERVAL     = 5 * 60         # 再忙的 feed 也不会比这更频繁
+MAX_INTERVAL     = 6 * 3600       # 再安静的 feed 也至少这么久看一次
+DEFAULT_INTERVAL = 30 * 60        # 还没学到速率时
+EWMA_ALPHA       = 0.3            # 新间隔样本的权重
+POLLS_PER_GAP    = 2              # 每个预期发文间隔里轮询几次
+QUIET_BACKOFF    = 1.5            # 一次没有新文章，间隔乘以这个数
+ERROR_BACKOFF    = 2.0            # 连续出错时的退避倍数（从 MIN_INTERVAL 起算）
+JITTER           = 0.1            # 下次时间随机 ±10%，避免多个 feed 总挤在同一时刻
+SEEN_PER_FEED    = 500            # 每个 feed 记住最近多少条链接（去重用）
+LAG_SAMPLES      = 256
+TICK             = 1.0            # 主循环最长睡多久（秒）
+
+
+def _link_key(link: str) -> str:
+    return hashlib.blake2b(link.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _pct(values, p: float) -> float:
+    v = sorted(values)
+    return round(v[min(len(v) - 1, int(len(v) * p))], 3) if v else 0.0
+
+
+# =========================
+# 单个 feed 的调度状态
+# =========================
+
+class FeedSchedule:
+    """一个 feed 的学习结果和计数；to_dict / load 用于持久化。"""
+
+    def __init__(self, feed: Dict[str, Any]):
+        self.feed = feed
+        self.interval = float(DEFAULT_INTERVAL)
+        self.gap_ewma: Optional[float] = None    # 估计的相邻两篇文章发布间隔（秒）
+        self.last_entry_ts: Optional[float] = None
+        self.next_due = 0.0                      # 0 表示立即抓
+        self.last_poll: Optional[float] = None
+        self.last_status: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.error_streak = 0
+        self.polls = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.new_entries = 0
+        self.seen: deque = deque(maxlen=SEEN_PER_FEED)
+        self._seen_set: set = set()
+        self.running = False
+
+    @property
+    def url(self) -> str:
+        return self.feed["url"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"interval": self.interval, "gap_ewma": self.gap_ewma, "last_entry_ts": self.last_entry_ts,
+                "next_due": self.next_due, "last_poll": self.last_poll, "last_status": self.last_status,
+                "last_error": self.last_error, "error_streak": self.error_streak, "polls": self.polls,
+                "not_modified": self.not_modified, "errors": self.errors, "new_entries": self.new_entries,
+                "seen": list(self.seen)}
+
+    def load(self, d: Dict[str, Any]) -> None:
+        for k in ("interval", "gap_ewma", "last_entry_ts", "next_due", "last_poll", "last_status",
+                  "last_error", "error_streak", "polls", "not_modified", "errors", "new_entries"):
+            if k in d:
+                setattr(self, k, d[k])
+        self.seen.extend(d.get("seen") or [])
+        self._seen_set = set(self.seen)
+
+    # ---------- 去重 ----------
+
+    def is_new(self, link: str) -> bool:
+        return _link_key(link) not in self._seen_set
+
+    def mark_seen(self, link: str) -> None:
+        key = _link_key(link)
+        if key in self._seen_set:
+            return
+        if len(self.seen) == self.seen.maxlen:
+            self._seen_set.discard(self.seen[0])
+        self.seen.append(key)
+        self._seen_set.add(key)
+
+    # ---------- 学习 ----------
+
+    def fresh_since(self, published: List[float]) -> List[float]:
+        """本次看到的发布时间里比上次记下的更新的那些（升序），不改任何状态。首次抓取返回 feed 里的全部历史。"""
+        now = time.time()
+        stamps = sorted(t for t in published if t <= now + 60)
+        return [t for t in stamps if self.last_entry_ts is None or t > self.last_entry_ts]
+
+    def learn(self, fresh: List[float]) -> None:
+        """用 fresh_since 的结果更新间隔估计；只在这些条目已经交给 sink 之后调用。"""
+        prev = self.last_entry_ts
+        for t in fresh:
+            if prev is not None and t > prev:
+                gap = t - prev
+                self.gap_ewma = gap if self.gap_ewma is None else EWMA_ALPHA * gap + (1 - EWMA_ALPHA) * self.gap_ewma
+            prev = t
+        if fresh:
+            self.last_entry_ts = fresh[-1]
+
+    def reschedule(self, now: float, fresh: int, ok: bool) -> None:
+        if not ok:
+            self.error_streak += 1
+            self.interval = min(MAX_INTERVAL, MIN_INTERVAL * ERROR_BACKOFF ** self.error_streak)
+        else:
+            self.error_streak = 0
+            if fresh and self.gap_ewma:
+                self.interval = self.gap_ewma / POLLS_PER_GAP
+            elif not fresh:
+                self.interval *= QUIET_BACKOFF
+            self.interval = max(MIN_INTERVAL, min(MAX_INTERVAL, self.interval))
+        self.next_due = now + self.interval * (1 + random.uniform(-JITTER, JITTER))
+
+
+# =========================
+# 调度器
+# =========================
+
+Sink = Callable[[List[Dict[str, Any]]], Any]
+
+
+class FeedScheduler:
+    """
+    asyncio 调度循环：到期的 feed 排队等并发名额（MAX_CONCURRENCY），抓完把新文章交给 sink(rows)（在线程里执行），
+    然后按学到的速率安排下次。sink 抛异常时不记已见链接、不记 ETag、不更新学到的速率，下次重新拿全量再交一次。
+    """
+
+    def __init__(self, feeds: Optional[List[Dict[str, Any]]] = None, sink: Optional[Sink] = None,
+                 state_path: str = SCHEDULER_STATE_PATH, feed_state_path: str = FEED_STATE_PATH,
+                 concurrency: int = MAX_CONCURRENCY):
+        self.state_path = state_path
+        self.sink = sink
+        self.concurrency = concurrency
+        self.feed_state = FeedState(feed_state_path)
+        self.schedules: Dict[str, FeedSchedule] = {f["url"]: FeedSchedule(f) for f in (FEEDS if feeds is None else feeds)}
+        self.dedup = NearDupIndex()
+        self.waiting = 0          # 已到期、在等并发名额的 feed 数
+        self.in_flight = 0
+        self.totals = {"polls": 0, "not_modified": 0, "errors": 0, "entries": 0, "sink_errors": 0}
+        self.schedule_lag: deque = deque(maxlen=LAG_SAMPLES)   # 开始抓取 - 到期时间
+        self.freshness_lag: deque = deque(maxlen=LAG_SAMPLES)  # 发现新文章 - 文章发布时间
+        self.started = time.time()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._metrics: Dict[str, Any] = {}
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self) -> None:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for url, d in (data.get("feeds") or {}).items():
+            if url in self.schedules:
+                self.schedules[url].load(d)
+        for k, v in (data.get("totals") or {}).items():
+            if k in self.totals:
+                self.totals[k] = v
+
+    def save(self) -> None:
+        data = {"feeds": {u: s.to_dict() for u, s in self.schedules.items()}, "totals": self.totals,
+                "metrics": self.metrics(refresh=True)}
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_path)
+        try:
+            self.feed_state.save()
+        except OSError:
+            pass
+
+    # ---------- 指标 ----------
+
+    def metrics(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        {queue_depth, in_flight, due, totals, schedule_lag_s{p50,p95,max}, freshness_lag_s{...}, feeds{name: ...}}。
+        只在事件循环线程里 refresh；其它线程（指标 HTTP 服务）读到的是最近一次快照。
+        """
+        if not refresh:
+            return self._metrics
+        now = time.time()
+        feeds = {}
+        for s in self.schedules.values():
+            feeds[s.feed.get("name", s.url)] = {
+                "interval_s": round(s.interval, 1),
+                "entries_per_day": round(86400 / s.gap_ewma, 2) if s.gap_ewma else None,
+                "next_due_in_s": round(s.next_due - now, 1),
+                "last_status": s.last_status, "last_error": s.last_error,
+                "polls": s.polls, "not_modified": s.not_modified, "errors": s.errors, "new_entries": s.new_entries,
+            }
+        self._metrics = {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "due": sum(1 for s in self.schedules.values() if s.next_due <= now and not s.running),
+            "totals": dict(self.totals),
+            "requests_per_hour": round(3600 * sum(1 / s.interval for s in self.schedules.values()), 2),
+            "schedule_lag_s": {"p50": _pct(self.schedule_lag, 0.5), "p95": _pct(self.schedule_lag, 0.95),
+                               "max": round(max(self.schedule_lag), 3) if self.schedule_lag else 0.0},
+            "freshness_lag_s": {"p50": _pct(self.freshness_lag, 0.5), "p95": _pct(self.freshness_lag, 0.95),
+                                "max": round(max(self.freshness_lag), 3) if self.freshness_lag else 0.0},
+            "uptime_s": round(now - self.started, 1),
+            "feeds": feeds,
+        }
+        return self._metrics
+
+    # ---------- 抓取 ----------
+
+    def _new_rows(self, s: FeedSchedule, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        out = []
+        for row in entries:
+            if not s.is_new(row["link"]):
+                continue
+            if self.dedup.query(row["title"], row["summary"], row.get("maintext") or ""):
+                s.mark_seen(row["link"])  # 转载稿：当作已处理
+                continue
+            out.append(row)
+        return out
+
+    async def _poll(self, s: FeedSchedule, due: float) -> None:
+        try:
+            async with self._sem:
+                self.waiting -= 1
+                self.in_flight += 1
+                start = time.time()
+                self.schedule_lag.append(max(0.0, start - due))
+                with span("scheduler.poll", feed=s.feed.get("name", s.url)) as sp:
+                    # 并发已由调度器的信号量限制，fetch_feed 内部不再排队
+                    res = await fetch_feed(s.feed, self.feed_state, nullcontext())
+                    sp.set(status=res["status"], entries=len(res["entries"]))
+            await self._handle(s, res, start)
+        finally:
+            self.in_flight = max(0, self.in_flight - 1)
+            s.running = False
+            try:
+                self.save()
+            except OSError:
+                pass
+
+    async def _handle(self, s: FeedSchedule, res: Dict[str, Any], start: float) -> None:
+        now = time.time()
+        s.polls += 1
+        s.last_poll = now
+        s.last_status = res["status"]
+        self.totals["polls"] += 1
+        if res["error"] or res["status"] not in (200, 304):
+            s.errors += 1
+            self.totals["errors"] += 1
+            s.last_error = res["error"] or f"HTTP {res['status']}"
+            s.reschedule(now, 0, ok=False)
+            return
+        s.last_error = None
+        if res["status"] == 304:
+            s.not_modified += 1
+            self.totals["not_modified"] += 1
+            s.reschedule(now, 0, ok=True)
+            return
+
+        first = s.last_entry_ts is None
+        fresh = s.fresh_since(res["published"])  # sink 成功之后才 learn，失败重试时还能看到这些条目
+        rows = self._new_rows(s, res["entries"])
+        if rows and self.sink is not None:
+            try:
+                await asyncio.to_thread(self.sink, rows)
+            except Exception as e:
+                self.totals["sink_errors"] += 1
+                s.last_error = f"sink: {type(e).__name__}: {e}"[:300]
+                # 不记这次的 ETag：下次仍带旧的条件头，重新拿到这些条目
+                s.reschedule(now, len(fresh), ok=True)
+                return
+        self.feed_state.commit(res)
+        s.learn(fresh)
+        if not first:
+            # 发现延迟：本次开始抓取时，新文章已经发布了多久（首次抓取的是历史条目，不计）
+            self.freshness_lag.extend(max(0.0, start - t) for t in fresh)
+        for row in rows:
+            s.mark_seen(row["link"])
+            self.dedup.add(row["link"], row["title"], row["summary"], row.get("maintext") or "")
+        s.new_entries += len(rows)
+        self.totals["entries"] += len(rows)
+        s.reschedule(now, len(fresh), ok=True)
+
+    def _dispatch_due(self) -> int:
+        now = time.time()
+        n = 0
+        for s in self.schedules.values():
+            if s.running or s.next_due > now:
+                continue
+            s.running = True
+            self.waiting += 1
+            asyncio.create_task(self._poll(s, s.next_due or now))
+            n += 1
+        return n
+
+    async def run(self, stop: Optional[asyncio.Event] = None, once: bool = False) -> None:
+        """主循环；stop 被 set 后等在途的抓取结束再返回。once=True 时只抓当前到期的 feed 一轮。"""
+        self._sem = asyncio.Semaphore(self.concurrency)
+        stop = stop or asyncio.Event()
+        self.metrics(refresh=True)
+        self._dispatch_due()
+        while not stop.is_set():
+            self.metrics(refresh=True)
+            if once and not any(s.running for s in self.schedules.values()):
+                break
+            idle = [s.next_due for s in self.schedules.values() if not s.running]
+            wait = min([TICK] + [max(0.0, d - time.time()) for d in idle])
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            if not once:
+                self._dispatch_due()
+        while any(s.running for s in self.schedules.values()):
+            await asyncio.sleep(0.05)
+        self.metrics(refresh=True)
+        self.save()
+
+
+# =========================
+# sink
+# =========================
+
+def print_sink(rows: List[Dict[str, Any]]) -> None:
+    for r in rows:
+        print(f"{r['pubdate'] or '----------'}  {r['Publisher']}: {r['title']}  {r['link']}")
+
+
+def supabase_sink(rows: List[Dict[str, Any]]) -> int:
+    """写入 News_storage：表里已有的 link 跳过，其余 insert（id 由数据库生成）。"""
+    from supabase_io import fetch_article_ids_by_link, upsert_articles
+    existing = fetch_article_ids_by_link([r["link"] for r in rows])
+    new = [r for r in rows if r["link"] not in existing]
+    return upsert_articles(new) if new else 0
+
+
+def notion_sink(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    from rss_to_notion import article_from_row, get_writer
+    return get_writer().push_all([article_from_row(r) for r in rows if r["pubdate"]])
+
+
+SINKS = {"print": print_sink, "supabase": supabase_sink, "notion": notion_sink}
+
+
+# =========================
+# 指标 HTTP 服务
+# =========================
+
+def _prometheus(m: Dict[str, Any]) -> str:
+    lines = [f"feed_scheduler_queue_depth {m.get('queue_depth', 0)}",
+             f"feed_scheduler_in_flight {m.get('in_flight', 0)}",
+             f"feed_scheduler_due {m.get('due', 0)}",
+             f"feed_scheduler_requests_per_hour {m.get('requests_per_hour', 0)}"]
+    for k, v in (m.get("totals") or {}).items():
+        lines.append(f"feed_scheduler_{k}_total {v}")
+    for lag in ("schedule_lag_s", "freshness_lag_s"):
+        d = m.get(lag) or {}
+        lines.append(f'feed_scheduler_{lag}{{quantile="0.5"}} {d.get("p50", 0)}')
+        lines.append(f'feed_scheduler_{lag}{{quantile="0.95"}} {d.get("p95", 0)}')
+        lines.append(f'feed_scheduler_{lag}_max {d.get("max", 0)}')
+    for name, f in (m.get("feeds") or {}).items():
+        lines.append(f'feed_scheduler_feed_interval_s{{feed="{name}"}} {f["interval_s"]}')
+        lines.append(f'feed_scheduler_feed_next_due_in_s{{feed="{name}"}} {f["next_due_in_s"]}')
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(scheduler: FeedScheduler, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """后台线程里提供 /metrics（Prometheus 文本）和 /metrics.json。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            m = scheduler.metrics()
+            if self.path.startswith("/metrics.json"):
+                body, ctype = json.dumps(m, ensure_ascii=False).encode("utf-8"), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = _prometheus(m).encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Poll RSS feeds adaptively based on each feed's publish rate.")
+    ap.add_argument("--feeds", help="JSON 文件：[{name, url, publisher, max_age_days}]，默认用内置 FEEDS")
+    ap.add_argument("--sink", choices=sorted(SINKS), default="print", help="新文章交给谁")
+    ap.add_argument("--state", default=SCHEDULER_STATE_PATH, help="调度状态文件")
+    ap.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="同时抓取的 feed 数上限")
+    ap.add_argument("--metrics-port", type=int, help="在这个端口提供 /metrics 和 /metrics.json")
+    ap.add_argument("--once", action="store_true", help="只抓当前到期的 feed 一轮就退出")
+    args = ap.parse_args(argv)
+
+    feeds = None
+    if args.feeds:
+        with open(args.feeds, "r", encoding="utf-8") as f:
+            feeds = json.load(f)
+    scheduler = FeedScheduler(feeds, SINKS[args.sink], state_path=args.state, concurrency=args.concurrency)
+    if args.metrics_port:
+        serve_metrics(scheduler, args.metrics_port)
+
+    async def _main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows
+        await scheduler.run(stop, once=args.once)
+
+    asyncio.run(_main())
+    m = scheduler.metrics()
+    print(f"polls {m['totals']['polls']} (304: {m['totals']['not_modified']}, errors: {m['totals']['errors']}), "
+          f"new entries {m['totals']['entries']}, ~{m['requests_per_hour']} requests/hour at current intervals")
+    for name, f in m["feeds"].items():
+        print(f"  {name}: every {f['interval_s'] / 60:.1f} min, "
+              f"{f['entries_per_day'] if f['entries_per_day'] is not None else '?'} entries/day")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
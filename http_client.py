@@ -0,0 +1,154 @@
+# http_client.py — 共享的 HTTP 客户端（图片 / og:image / RSS / Notion 都走这里）
+# 每个 host 一个 requests.Session（keep-alive 连接池复用 TCP+TLS），urllib3 Retry 统一重试，
+# 每个 host 限制同时进行的请求数，并按 host 记录延迟和错误。
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from perf import span
+
+RETRY_TOTAL      = 3
+RETRY_BACKOFF    = 0.5                          # 0.5s, 1s, 2s ...
+RETRY_STATUS     = (429, 500, 502, 503, 504)
+RETRY_METHODS    = frozenset({"GET", "HEAD"})   # POST 不自动重试（Notion 写入有自己的重试和去重）
+POOL_MAXSIZE     = 10                           # 每个 host 保留的空闲连接数
+PER_HOST_LIMIT   = 6                            # 每个 host 同时最多几个请求
+LATENCY_SAMPLES  = 256                          # 每个 host 保留最近多少次耗时用于算分位数
+
+
+class HostStats:
+    """单个 host 的计数：请求数、错误数、最近 LATENCY_SAMPLES 次耗时（毫秒，到拿到响应头为止）。"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.last_error: Optional[str] = None
+        self.latency_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lat = sorted(self.latency_ms)
+
+        def pct(p: float) -> float:
+            return lat[min(len(lat) - 1, int(len(lat) * p))] if lat else 0.0
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "last_error": self.last_error,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "max_ms": lat[-1] if lat else 0.0,
+        }
+
+
+class HttpClient:
+    """
+    线程安全。用法与 requests 相同：client.get(url, headers=..., timeout=...) / client.post(...)。
+    单次请求可传 retries=N 覆盖默认重试次数（例如页面上同步加载的图片只重试一次）。
+    stream=True 时 host 并发名额只占到拿到响应头为止，读 body 不占名额；读完后请关闭响应（用 with）。
+    """
+
+    def __init__(self, retries: int = RETRY_TOTAL, backoff: float = RETRY_BACKOFF,
+                 status_forcelist: Iterable[int] = RETRY_STATUS, retry_methods: Iterable[str] = RETRY_METHODS,
+                 per_host: int = PER_HOST_LIMIT, pool_maxsize: int = POOL_MAXSIZE):
+        self.retries = retries
+        self.backoff = backoff
+        self.status_forcelist = tuple(status_forcelist)
+        self.retry_methods = frozenset(retry_methods)
+        self.per_host = per_host
+        self.pool_maxsize = pool_maxsize
+        self._sessions: Dict[Tuple[str, int], requests.Session] = {}
+        self._sems: Dict[str, threading.BoundedSemaphore] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        p = urlparse(url)
+        return f"{p.scheme}://{p.netloc.lower()}"
+
+    def _make_retry(self, retries: int) -> Retry:
+        return Retry(total=retries, connect=retries, read=retries, status=retries,
+                     backoff_factor=self.backoff, status_forcelist=self.status_forcelist,
+                     allowed_methods=self.retry_methods, respect_retry_after_header=True,
+                     raise_on_status=False)
+
+    def _host(self, host: str, retries: int):
+        with self._lock:
+            sess = self._sessions.get((host, retries))
+            if sess is None:
+                sess = requests.Session()
+                adapter = HTTPAdapter(max_retries=self._make_retry(retries), pool_connections=1,
+                                      pool_maxsize=self.pool_maxsize)
+                sess.mount("http://", adapter)
+                sess.mount("https://", adapter)
+                self._sessions[(host, retries)] = sess
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.per_host)
+                self._stats[host] = HostStats()
+            return sess, self._sems[host], self._stats[host]
+
+    def session_for(self, url: str, retries: Optional[int] = None) -> requests.Session:
+        """该 host 的 Session（已挂好重试和连接池）。"""
+        return self._host(self.host_of(url), self.retries if retries is None else retries)[0]
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        host = self.host_of(url)
+        sess, sem, stats = self._host(host, self.retries if retries is None else retries)
+        with span(f"http.{method}", host=host) as sp:
+            t0 = time.perf_counter()
+            with sem:
+                try:
+                    resp = sess.request(method, url, **kwargs)
+                except requests.RequestException as e:
+                    with self._lock:
+                        stats.requests += 1
+                        stats.errors += 1
+                        stats.last_error = f"{type(e).__name__}: {e}"[:300]
+                        stats.latency_ms.append((time.perf_counter() - t0) * 1000)
+                    raise
+            sp.set(status=resp.status_code)
+            # stream=True 时 body 还没读，只能记 Content-Length
+            sp.add_bytes(resp.headers.get("Content-Length") if kwargs.get("stream")
+                         else len(resp.content))
+        with self._lock:
+            stats.requests += 1
+            stats.statuses[resp.status_code] = stats.statuses.get(resp.status_code, 0) + 1
+            if resp.status_code >= 400:
+                stats.errors += 1
+                stats.last_error = f"HTTP {resp.status_code}"
+            stats.latency_ms.append((time.perf_counter() - t0) * 1000)
+        return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{host: {requests, errors, statuses, last_error, p50_ms, p95_ms, max_ms}}"""
+        with self._lock:
+            return {h: s.snapshot() for h, s in self._stats.items()}
+
+    def close(self) -> None:
+        """关闭所有 Session，同时清空 host 名额和统计（之后再用等于一个新客户端）。"""
+        with self._lock:
+            for sess in self._sessions.values():
+                sess.close()
+            self._sessions.clear()
+            self._sems.clear()
+            self._stats.clear()
+
+
+# 进程内共享的客户端
+shared_client = HttpClient()
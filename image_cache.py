@@ -0,0 +1,326 @@
+# image_cache.py — 图片 / og:image 的两级缓存
+# 第一级：进程内 LRU（按字节数封顶）；第二级：磁盘内容寻址存储（带 TTL、负缓存与淘汰）
+# 注意：Streamlit 每次 rerun 都会重新执行 app.py，所以缓存对象必须放在被 import 的模块里才能跨 rerun 复用
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Optional, Tuple
+
+CACHE_DIR = os.environ.get("URBANLAB_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache"
+)
+
+MEMORY_MAX_BYTES = 64 * 1024 * 1024      # 进程内最多 64MB
+DISK_MAX_BYTES   = 512 * 1024 * 1024     # 磁盘最多 512MB
+DEFAULT_TTL      = 7 * 24 * 3600         # 命中结果保存 7 天
+DEFAULT_MISS_TTL = 30 * 60               # 确认没有的结果（None）保存 30 分钟，避免反复请求坏链接
+MISS_ENTRY_BYTES = 256                   # 负缓存条目在内存上限里按这个大小计费
+
+_MISS = object()  # 缓存里记录“确认没有”的哨兵
+
+
+class TransientFetchError(Exception):
+    """fetch 的临时失败（超时、连接错误、429 / 5xx）：不写负缓存，下次照常重试。"""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class MemoryLRU:
+    """进程内 LRU；按 value 的字节数计费，超过 max_bytes 时从最久未用的开始淘汰。"""
+
+    def __init__(self, max_bytes: int = MEMORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            value, size, expires = item
+            if expires < time.time():
+                self._drop(key)
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, size: int, ttl: float) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, size, time.time() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                self._drop(next(iter(self._data)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+
+class DiskStore:
+    """
+    磁盘内容寻址存储：
+      blobs/<aa>/<sha256(内容)>      —— 实际内容，相同内容只存一份
+      index/<aa>/<sha256(key)>.json  —— key → {digest, expires} 或 {miss, expires}
+    blob 和 index 一起计入 max_bytes；超过时先删过期的 index，再按最近访问时间淘汰 blob
+    （连同指向它们的 index），仍超量时再删最旧的 index（主要是负缓存）。
+    """
+
+    def __init__(self, root: str, max_bytes: int = DISK_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._blob_dir = os.path.join(root, "blobs")
+        self._index_dir = os.path.join(root, "index")
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # 首次写入时扫描一次
+
+    def _index_path(self, key: str) -> str:
+        h = _sha256(key.encode("utf-8"))
+        return os.path.join(self._index_dir, h[:2], h + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._blob_dir, digest[:2], digest)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """返回 (是否命中, 内容)；命中且为负缓存时内容为 _MISS。"""
+        ipath = self._index_path(key)
+        try:
+            with open(ipath, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False, None
+        if entry.get("expires", 0) < time.time():
+            self._remove(ipath)
+            return False, None
+        if entry.get("miss"):
+            return True, _MISS
+        bpath = self._blob_path(entry.get("digest", ""))
+        try:
+            with open(bpath, "rb") as f:
+                data = f.read()
+            os.utime(bpath)  # 记录访问时间，供淘汰使用
+        except OSError:
+            self._remove(ipath)
+            return False, None
+        return True, data
+
+    def set(self, key: str, data: Optional[bytes], ttl: float) -> None:
+        entry: dict = {"expires": time.time() + ttl}
+        added = 0
+        try:
+            if data is None:
+                entry["miss"] = True
+            else:
+                digest = _sha256(data)
+                bpath = self._blob_path(digest)
+                if not os.path.exists(bpath):
+                    self._atomic_write(bpath, data)
+                    added += len(data)
+                entry["digest"] = digest
+            payload = json.dumps(entry).encode("utf-8")
+            self._atomic_write(self._index_path(key), payload)
+            added += len(payload)
+        except OSError:
+            return  # 磁盘不可写时只用内存缓存
+        with self._lock:
+            # 覆盖已有 index 时会略微多算，evict() 重新扫描时校正
+            self._bytes = self._scan_bytes() if self._bytes is None else self._bytes + added
+        if self._bytes is not None and self._bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """把 blob + index 的总量降到上限的 90%：过期 index → 最久未访问的 blob 及其 index → 最旧的 index。"""
+        with self._lock:
+            now = time.time()
+            target = int(self.max_bytes * 0.9)
+            index = []  # (mtime, size, path, digest)
+            for mtime, size, p in self._files(self._index_dir):
+                try:
+                    with open(p, "r", encoding="utf-8") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    entry = {}
+                if entry.get("expires", 0) < now:
+                    self._remove(p)
+                    continue
+                index.append((mtime, size, p, entry.get("digest")))
+            blobs = self._files(self._blob_dir)
+            total = sum(b[1] for b in blobs) + sum(i[1] for i in index)
+
+            removed = set()
+            for _, size, p in sorted(blobs):
+                if total <= target:
+                    break
+                self._remove(p)
+                total -= size
+                removed.add(os.path.basename(p))
+            live = []
+            for item in index:
+                if item[3] and item[3] in removed:
+                    self._remove(item[2])
+                    total -= item[1]
+                else:
+                    live.append(item)
+            for _, size, p, _ in sorted(live):
+                if total <= target:
+                    break
+                self._remove(p)
+                total -= size
+            self._bytes = total
+
+    def clear(self) -> None:
+        for d in (self._blob_dir, self._index_dir):
+            for dirpath, _, files in os.walk(d):
+                for name in files:
+                    self._remove(os.path.join(dirpath, name))
+        with self._lock:
+            self._bytes = 0
+
+    @staticmethod
+    def _files(root: str) -> list:
+        """root 下所有文件的 (mtime, size, path)。"""
+        out = []
+        for dirpath, _, files in os.walk(root):
+            for name in files:
+                p = os.path.join(dirpath, name)
+                try:
+                    st_ = os.stat(p)
+                except OSError:
+                    continue
+                out.append((st_.st_mtime, st_.st_size, p))
+        return out
+
+    def _scan_bytes(self) -> int:
+        return sum(f[1] for d in (self._blob_dir, self._index_dir) for f in self._files(d))
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TwoTierCache:
+    """
+    内存 LRU → 磁盘 → 真正下载；同一个 key 并发请求时只下载一次。
+    fetch 返回 None 表示确认没有（写负缓存）；抛 TransientFetchError 表示临时失败，不缓存、原样抛出。
+    """
+
+    def __init__(self, memory: MemoryLRU, disk: Optional[DiskStore]):
+        self.memory = memory
+        self.disk = disk
+        self._key_locks: dict = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Optional[bytes]],
+                     ttl: float = DEFAULT_TTL, miss_ttl: float = DEFAULT_MISS_TTL) -> Optional[bytes]:
+        hit, value = self.memory.get(key)
+        if hit:
+            return None if value is _MISS else value
+        lock = self._lock_for(key)
+        with lock:
+            try:
+                hit, value = self.memory.get(key)  # 等锁期间可能已被别的线程填好
+                if hit:
+                    return None if value is _MISS else value
+                if self.disk is not None:
+                    hit, value = self.disk.get(key)
+                    if hit:
+                        self.memory.set(key, value, MISS_ENTRY_BYTES if value is _MISS else len(value),
+                                        miss_ttl if value is _MISS else ttl)
+                        return None if value is _MISS else value
+                data = fetch()
+                if data is None:
+                    self.memory.set(key, _MISS, MISS_ENTRY_BYTES, miss_ttl)
+                    if self.disk is not None:
+                        self.disk.set(key, None, miss_ttl)
+                else:
+                    self.memory.set(key, data, len(data), ttl)
+                    if self.disk is not None:
+                        self.disk.set(key, data, ttl)
+                return data
+            finally:
+                with self._locks_guard:
+                    if self._key_locks.get(key) is lock:
+                        del self._key_locks[key]
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+# 全局共享实例：审核面板、Summary 模板区、build_weekly_docx 都走这一份
+image_cache = TwoTierCache(MemoryLRU(MEMORY_MAX_BYTES), DiskStore(os.path.join(CACHE_DIR, "images")))
+
+
+def cached(namespace: str, as_text: bool = False,
+           ttl: float = DEFAULT_TTL, miss_ttl: float = DEFAULT_MISS_TTL,
+           cache: Optional[TwoTierCache] = None):
+    """
+    装饰 `f(url) -> bytes | str | None`，按 (namespace, url) 走两级缓存。
+    as_text=True 时返回值是 str（如 og:image 地址），落盘前按 utf-8 编码。
+    f 返回 None 为确认没有（按 miss_ttl 负缓存）；临时失败请抛 TransientFetchError，不缓存，wrapper 返回 None。
+    wrapper.raising(url) 同 wrapper，但把 TransientFetchError 抛给调用方（外层还有缓存时用，避免把临时失败记成没有）。
+    """
+    def deco(fn):
+        def raising(url: str):
+            if not url:
+                return fn(url)
+            store = cache or image_cache
+
+            def fetch() -> Optional[bytes]:
+                value = fn(url)
+                if value is None:
+                    return None
+                return value.encode("utf-8") if as_text else value
+
+            data = store.get_or_fetch(f"{namespace}:{url}", fetch, ttl=ttl, miss_ttl=miss_ttl)
+            if data is None:
+                return None
+            return data.decode("utf-8") if as_text else data
+
+        @wraps(fn)
+        def wrapper(url: str):
+            try:
+                return raising(url)
+            except TransientFetchError:
+                return None
+
+        wrapper.uncached = fn
+        wrapper.raising = raising
+        return wrapper
+    return deco
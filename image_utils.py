@@ -0,0 +1,431 @@
+# image_utils.py — 文章图片抓取（从 app.py 移出，配合 image_cache 的两级缓存跨 rerun 复用）
+
+import codecs
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from io import BytesIO
+from typing import Iterable
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from http_client import shared_client
+from image_cache import TransientFetchError, cached, image_cache
+from perf import span, traced
+
+# =========================
+# Image fetching utilities
+# =========================
+
+IMAGE_RETRIES = 1  # 图片 / 文章页在审核面板里同步加载，重试一次就够，避免坏链接卡住页面
+
+
+def _definitive(resp: requests.Response) -> bool:
+    """状态码是否为确定的结果：429 / 5xx 抛 TransientFetchError（不进负缓存），其它 4xx 返回 False。"""
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise TransientFetchError(f"HTTP {resp.status_code}")
+    return resp.status_code < 400
+
+
+# 统一的远程图片下载（共享连接池 + PIL 验证）
+@cached("img")
+def fetch_remote_img(url: str) -> bytes | None:
+    """
+    下载远程图片并返回二进制；404 等或不是图片时返回 None。
+    网络错误、429 / 5xx 抛 TransientFetchError（@cached 不缓存，对外仍返回 None）。
+    """
+    if not url:
+        return None
+    from PIL import Image  # Pillow 只在第一次处理图片时导入
+    headers = {"User-Agent": "Mozilla/5.0"}
+    try:
+        resp = shared_client.get(url, headers=headers, timeout=10, retries=IMAGE_RETRIES)
+        if not _definitive(resp):
+            return None
+        content = resp.content
+    except requests.RequestException as e:
+        raise TransientFetchError(f"{type(e).__name__}: {e}") from e
+    try:
+        # 用 PIL 验证是否为图片
+        img = Image.open(BytesIO(content))
+        img.verify()
+        return content
+    except Exception:
+        return None
+
+# =========================
+# Image variants（缩放 + 重新压缩后再用）
+# =========================
+
+# 原图动辄 2000px+ / 几 MB；DOCX 和页面都只需要显示尺寸的版本。
+# docx：6.5 英寸 × 150dpi，JPEG（python-docx 不支持 WebP）
+# ui：页面显示宽 400px，按 2 倍像素出图以适配高分屏，WebP
+IMAGE_VARIANTS = {
+    "docx": {"max_width": 975, "format": "JPEG", "quality": 82},
+    "ui":   {"max_width": 800, "format": "WEBP", "quality": 80},
+}
+
+
+def render_image_variant(img_bytes: bytes, variant: str) -> bytes | None:
+    """
+    把原图解码一次，按 IMAGE_VARIANTS[variant] 等比缩小（只缩不放）并重新压缩。
+    解码失败（不是图片 / 文件损坏）返回 None，等同于 img.verify() 不通过。
+    """
+    from PIL import Image
+    spec = IMAGE_VARIANTS[variant]
+    try:
+        img = Image.open(BytesIO(img_bytes))
+        if img.format == "JPEG" and img.width > spec["max_width"]:
+            # JPEG 可在解码时按 1/2、1/4、1/8 缩小，省掉大部分解码和缩放开销
+            img.draft("RGB", (spec["max_width"], spec["max_width"] * img.height // img.width))
+        img.load()  # 完整解码一次，损坏的图片在这里报错
+    except Exception:
+        return None
+    fmt = spec["format"]
+    if img.width > spec["max_width"]:
+        h = max(1, round(img.height * spec["max_width"] / img.width))
+        img = img.resize((spec["max_width"], h), Image.LANCZOS)
+    elif (img.format or "").upper() == fmt:
+        return img_bytes  # 尺寸和格式都已符合，不重复压缩
+    if fmt == "JPEG" and img.mode != "RGB":
+        # JPEG 没有透明通道：透明部分垫白底
+        rgba = img.convert("RGBA")
+        bg = Image.new("RGB", rgba.size, (255, 255, 255))
+        bg.paste(rgba, mask=rgba.getchannel("A"))
+        img = bg
+    elif fmt == "WEBP" and img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+    out = BytesIO()
+    try:
+        img.save(out, format=fmt, quality=spec["quality"], optimize=True)
+    except Exception:
+        return None
+    return out.getvalue()
+
+
+@traced("image.fetch_variant", bytes_of=len)
+def fetch_image_variant(url: str, variant: str) -> bytes | None:
+    """下载（走原图缓存）并生成指定版本；结果按 img:<variant> 命名空间单独缓存。"""
+    if not url:
+        return None
+
+    def fetch() -> bytes | None:
+        raw = fetch_remote_img.raising(url)  # 原图临时失败时不要把这个版本记成没有
+        if not raw:
+            return None
+        with span("image.render", variant=variant) as sp:
+            sp.add_bytes(len(raw))
+            return render_image_variant(raw, variant)
+
+    try:
+        return image_cache.get_or_fetch(f"img:{variant}:{url}", fetch)
+    except TransientFetchError:
+        return None
+
+# ✅ changed: 你提供的 curl 头和 cookie（可按需更新）；cookie 从环境变量读取，不写进代码
+NYT_HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+    "cache-control": "max-age=0",
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "none",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
+}
+NYT_COOKIE = os.environ.get("NYT_COOKIE", "")
+
+
+def page_headers() -> dict:
+    """抓文章页用的请求头（NYT_HEADERS + 环境变量里的 cookie）。"""
+    headers = NYT_HEADERS.copy()
+    if NYT_COOKIE:
+        headers["Cookie"] = NYT_COOKIE
+    return headers
+
+
+OG_CHUNK_SIZE = 8 * 1024      # 每次从连接读多少字节
+OG_MAX_BYTES  = 512 * 1024    # 没遇到 </head> 时最多读这么多就放弃
+
+# 按优先级：og:image → twitter:image → <link rel="image_src">
+OG_META_KEYS = {
+    "og:image": 0, "og:image:url": 0, "og:image:secure_url": 0,
+    "twitter:image": 1, "twitter:image:src": 1,
+}
+
+
+class _HeadImageParser(HTMLParser):
+    """只解析 <head>：收集候选图片地址，遇到 </head> 或 <body> 就标记 done。属性顺序、引号写法都不影响。"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found: dict[int, str] = {}  # 优先级 → 第一个出现的地址
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        a = {k: (v or "").strip() for k, v in attrs}
+        if tag == "meta":
+            key = (a.get("property") or a.get("name") or "").lower()
+            prio = OG_META_KEYS.get(key)
+            if prio is not None and a.get("content"):
+                self.found.setdefault(prio, a["content"])
+        elif tag == "link":
+            if "image_src" in (a.get("rel") or "").lower().split() and a.get("href"):
+                self.found.setdefault(2, a["href"])
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.done = True
+
+    def best(self) -> str | None:
+        return self.found[min(self.found)] if self.found else None
+
+
+def response_encoding(resp) -> str:
+    """流式响应的文本编码：没声明 charset 时 requests 默认 ISO-8859-1，HTML 实际上基本都是 utf-8。"""
+    ctype = resp.headers.get("Content-Type", "")
+    encoding = resp.encoding if "charset" in ctype.lower() and resp.encoding else "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    return encoding
+
+
+def extract_head_image(chunks: Iterable[bytes], base_url: str = "", encoding: str = "utf-8",
+                       max_bytes: int = OG_MAX_BYTES) -> str | None:
+    """
+    从 HTML 字节流里增量解析 <head> 中的配图地址，读到 </head>（或 max_bytes）就停止、不再消费后续数据。
+    相对地址按 base_url 补全。
+    """
+    parser = _HeadImageParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    read = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        read += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done or read >= max_bytes:
+            break
+    url = parser.best()
+    if not url:
+        return None
+    if url.startswith("//"):
+        return "https:" + url
+    return urljoin(base_url, url)
+
+
+@traced("image.og_url")
+@cached("og", as_text=True)
+def fetch_og_image_url_with_curl(page_url: str) -> str | None:
+    """
+    用 curl 等价的 headers + cookie 抓页面，解析 og:image（回退 twitter:image、link rel=image_src）。
+    流式读取，读完 <head> 就关闭连接，不下载整篇文章。
+    页面没有配图或 404 等返回 None（负缓存）；网络错误、429 / 5xx 抛 TransientFetchError（不缓存）。
+    """
+    if not page_url:
+        return None
+    try:
+        with shared_client.get(page_url, headers=page_headers(), timeout=12, allow_redirects=True, stream=True,
+                               retries=IMAGE_RETRIES) as resp:
+            if not _definitive(resp):
+                return None
+            return extract_head_image(resp.iter_content(OG_CHUNK_SIZE), resp.url, response_encoding(resp))
+    except (requests.RequestException, OSError) as e:
+        raise TransientFetchError(f"{type(e).__name__}: {e}") from e
+
+
+def _fetch_img(url: str, variant: str | None) -> bytes | None:
+    return fetch_image_variant(url, variant) if variant else fetch_remote_img(url)
+
+
+def resolve_article_image(image_url: str, page_url: str, variant: str | None = None) -> bytes | None:
+    """
+    优先下载存储的 image_url；失败再从文章页抓 og:image 下载。
+    variant 为 IMAGE_VARIANTS 的键（"docx" / "ui"）时返回缩放后的版本，None 返回原图。
+    """
+    image_url = (image_url or "").strip()
+    img_bytes = _fetch_img(image_url, variant) if image_url else None
+    if (not img_bytes) and page_url:
+        og_url = fetch_og_image_url_with_curl(page_url)
+        if og_url:
+            img_bytes = _fetch_img(og_url, variant)
+    return img_bytes
+
+# =========================
+# Parallel prefetch (weekly DOCX)
+# =========================
+
+PREFETCH_WORKERS  = 8     # 线程池大小
+PREFETCH_PER_HOST = 3     # 同一域名同时最多几个请求
+PREFETCH_DEADLINE = 60.0  # 整批最多等多少秒
+
+
+class _HostLimiter:
+    """按域名的并发上限（每个 host 一个信号量）。"""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._sems: dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def slot(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.Semaphore(self.per_host)
+            return sem
+
+
+def _resolve_limited(image_url: str, page_url: str, limiter: _HostLimiter, variant: str | None) -> bytes | None:
+    """同 resolve_article_image，但每次网络请求都占用对应 host 的并发名额。"""
+    image_url = (image_url or "").strip()
+    img_bytes = None
+    if image_url:
+        with limiter.slot(image_url):
+            img_bytes = _fetch_img(image_url, variant)
+    if (not img_bytes) and page_url:
+        with limiter.slot(page_url):
+            og_url = fetch_og_image_url_with_curl(page_url)
+        if og_url:
+            with limiter.slot(og_url):
+                img_bytes = _fetch_img(og_url, variant)
+    return img_bytes
+
+
+@traced("image.prefetch_rows")
+def prefetch_row_images(rows: list[dict],
+                        max_workers: int = PREFETCH_WORKERS,
+                        per_host: int = PREFETCH_PER_HOST,
+                        deadline: float = PREFETCH_DEADLINE,
+                        variant: str | None = "docx") -> tuple[dict[int, bytes | None], list[int]]:
+    """
+    并发解析并下载每一行的图片（默认直接给出 DOCX 版本）。
+    返回 (images, timed_out)：images[i] 为第 i 行的图片字节（没有图为 None），
+    timed_out 为超过 deadline 仍未完成的行号。超时的任务不会被打断，完成后照常写入缓存。
+    """
+    images: dict[int, bytes | None] = {}
+    if not rows:
+        return images, []
+    limiter = _HostLimiter(per_host)
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="img-prefetch")
+    futures = {
+        pool.submit(_resolve_limited, r.get("image_url") or "", r.get("link") or r.get("url") or "", limiter, variant): i
+        for i, r in enumerate(rows)
+    }
+    done, not_done = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+    for fut in done:
+        try:
+            images[futures[fut]] = fut.result()
+        except Exception:
+            images[futures[fut]] = None
+    timed_out = sorted(futures[f] for f in not_done)
+    for i in timed_out:
+        images[i] = None
+    return images, timed_out
+
+# =========================
+# Look-ahead prefetch (review queue)
+# =========================
+
+LOOKAHEAD_ITEMS   = 5    # 预热当前文章之后的几篇
+LOOKAHEAD_WORKERS = 3
+LOOKAHEAD_OWNERS  = 256  # 最多记住多少个会话的状态
+
+
+class LookaheadPrefetcher:
+    """
+    审核时在后台预热接下来几篇文章的图片（og:image 查找 + 指定版本的图片），结果直接进 image_cache，
+    切到下一篇时面板命中缓存、不再等待网络。
+    每个会话（owner）有自己的“代”：筛选条件（state）变了就换代——排队中的任务取消，
+    执行中的任务在下一次网络请求前发现自己过期并退出。
+    """
+
+    def __init__(self, max_workers: int = LOOKAHEAD_WORKERS, per_host: int = PREFETCH_PER_HOST,
+                 variant: str | None = "ui"):
+        self.variant = variant
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="img-lookahead")
+        self._limiter = _HostLimiter(per_host)
+        self._lock = threading.Lock()
+        self._owners: dict[str, dict] = {}  # owner → {"state", "gen", "seen", "futures"}
+        self.stats = {"scheduled": 0, "cancelled": 0, "stale": 0, "done": 0}
+
+    def schedule(self, owner: str, state, items: list[tuple[str, str]]) -> int:
+        """
+        items 为 [(image_url, page_url)]，按优先级排列；同一代里已经排过的条目不会重复提交。
+        返回新提交的任务数。
+        """
+        with self._lock:
+            entry = self._owners.get(owner)
+            if entry is None or entry["state"] != state:
+                gen = 0
+                if entry is not None:
+                    gen = entry["gen"] + 1
+                    self._cancel(entry)
+                entry = {"state": state, "gen": gen, "seen": set(), "futures": []}
+                self._owners[owner] = entry
+                while len(self._owners) > LOOKAHEAD_OWNERS:
+                    self._cancel(self._owners.pop(next(iter(self._owners))))
+            entry["futures"] = [f for f in entry["futures"] if not f.done()]
+            n = 0
+            for image_url, page_url in items:
+                key = ((image_url or "").strip(), page_url or "")
+                if key in entry["seen"] or not any(key):
+                    continue
+                entry["seen"].add(key)
+                entry["futures"].append(self._pool.submit(self._warm, owner, entry["gen"], *key))
+                n += 1
+            self.stats["scheduled"] += n
+            return n
+
+    def cancel(self, owner: str) -> None:
+        """放弃某个会话的全部预热任务。"""
+        with self._lock:
+            entry = self._owners.pop(owner, None)
+            if entry is not None:
+                self._cancel(entry)
+
+    def _cancel(self, entry: dict) -> None:
+        entry["gen"] = -1  # 让执行中的任务发现自己过期
+        for f in entry["futures"]:
+            if f.cancel():
+                self.stats["cancelled"] += 1
+
+    def _current(self, owner: str, gen: int) -> bool:
+        with self._lock:
+            entry = self._owners.get(owner)
+            current = entry is not None and entry["gen"] == gen
+            if not current:
+                self.stats["stale"] += 1
+            return current
+
+    def _warm(self, owner: str, gen: int, image_url: str, page_url: str) -> None:
+        try:
+            if image_url:
+                if not self._current(owner, gen):
+                    return
+                with self._limiter.slot(image_url):
+                    if _fetch_img(image_url, self.variant):
+                        return
+            if page_url:
+                if not self._current(owner, gen):
+                    return
+                with self._limiter.slot(page_url):
+                    og_url = fetch_og_image_url_with_curl(page_url)
+                if og_url and self._current(owner, gen):
+                    with self._limiter.slot(og_url):
+                        _fetch_img(og_url, self.variant)
+        finally:
+            with self._lock:
+                self.stats["done"] += 1
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,508 @@
+# maintext_extract.py — 并发抓取文章正文，补全 News_storage 里为空的 maintext（顺带补空的 image_url）
+# 对应 n8n 的 “HTTP Request” → “get the news text” 两个节点，但不再一篇一篇串行：
+#   python maintext_extract.py                   # 处理所有 maintext 为空的行
+#   python maintext_extract.py --limit 20 --dry-run
+#   python maintext_extract.py --retry-failed    # 另外重新尝试之前记为失败的行（不从头扫描）
+# 按 id 升序分页读取待处理行，asyncio 工作池并发抓取（总并发 + 每个域名的并发数和请求间隔），
+# 边下载边解析，正文读完就断开连接；结果攒满一批写回一次，写完再推进断点文件。
+# 写回 News_storage 的同时改本地镜像（supabase_io.patch_mirror_rows），看板下次刷新即可看到补好的正文。
+
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from http_client import shared_client
+from image_utils import OG_CHUNK_SIZE, OG_META_KEYS, page_headers, response_encoding
+from perf import span
+from supabase_io import (SYNC_PAGE_SIZE, fetch_missing_maintext_by_ids, fetch_missing_maintext_page,
+                         update_article_texts)
+
+EXTRACT_WORKERS = 8                 # 同时处理的文章数
+DOMAIN_LIMIT    = 2                 # 同一域名同时最多几个请求
+DOMAIN_INTERVAL = 1.0               # 同一域名两次请求开始之间至少隔几秒
+FETCH_TIMEOUT   = 20
+PAGE_MAX_BYTES  = 4 * 1024 * 1024   # 单页最多读这么多
+MAX_TEXT_CHARS  = 12000             # 与 n8n 一致，正文截断长度
+WRITE_BATCH     = 50                # 攒多少篇写回一次
+TRANSIENT_STATUS = (408, 429)       # 这些 4xx 和 5xx、超时、连接错误一样算临时失败，下次运行重抓
+
+CHECKPOINT_PATH = os.environ.get("URBANLAB_EXTRACT_CHECKPOINT") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "maintext_checkpoint.json"
+)
+
+# 与 n8n 的 cleanPara 相同：命中这些规则的段落不算正文
+_DROP_PARA = [re.compile(p, re.I) for p in
+              (r"^supported by", r"^advertisement", r"sign up", r"subscribe", r"^photo:")]
+_SKIP_TAGS = {"script", "style", "noscript", "figure"}
+_WS_RE = re.compile(r"\s+")
+
+# 图片候选优先级：OG_META_KEYS（og:image 0、twitter:image 1）之后依次是
+_IMG_LINK, _IMG_JSONLD, _IMG_FIRST = 2, 3, 4
+
+
+# =========================
+# 流式解析
+# =========================
+
+def _clean_para(text: str) -> str:
+    text = _WS_RE.sub(" ", text).strip()
+    if not text or any(p.search(text) for p in _DROP_PARA):
+        return ""
+    return text
+
+
+def _jsonld_image(obj: Any) -> Optional[str]:
+    """JSON-LD 里的 image：字符串、列表或 {url: ...}；也会看 @graph。"""
+    if isinstance(obj, list):
+        for x in obj:
+            url = _jsonld_image(x)
+            if url:
+                return url
+        return None
+    if not isinstance(obj, dict):
+        return None
+    img = obj.get("image")
+    if isinstance(img, list):
+        img = img[0] if img else None
+    if isinstance(img, dict):
+        img = img.get("url") or img.get("contentUrl")
+    if isinstance(img, str) and img.strip():
+        return img.strip()
+    return _jsonld_image(obj.get("@graph"))
+
+
+class ArticleTextParser(HTMLParser):
+    """
+    增量解析整页：收集 <p> 段落（跳过 script / style / noscript / figure），同时收集配图候选。
+    正文优先取 <section name="articleBody"> 里的段落，其次 <article id="story">，都没有时退回全页的 <p>。
+    articleBody 结束（或正文已够 MAX_TEXT_CHARS）时标记 done，调用方可以不再读后面的数据。
+    """
+
+    def __init__(self, max_chars: int = MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self.images: Dict[int, str] = {}             # 优先级 → 第一个出现的地址
+        self._paras: Tuple[List[str], ...] = ([], [], [])  # articleBody / article#story / 全页
+        self._chars = [0, 0, 0]
+        self._section = 0   # 在 articleBody 里时为 <section> 的嵌套深度
+        self._article = 0   # 同上，<article id="story">
+        self._skip = 0
+        self._p: Optional[List[str]] = None
+        self._ld: Optional[List[str]] = None
+
+    # ---------- 段落 ----------
+
+    def _end_para(self) -> None:
+        if self._p is None:
+            return
+        text = _clean_para("".join(self._p))
+        self._p = None
+        if not text:
+            return
+        targets = [2]
+        if self._article:
+            targets.insert(0, 1)
+        if self._section:
+            targets.insert(0, 0)
+        for i in targets:
+            if self._chars[i] < self.max_chars:
+                self._paras[i].append(text)
+                self._chars[i] += len(text) + 1
+        if self._chars[0] >= self.max_chars:
+            self.done = True
+
+    def text(self) -> str:
+        """与 n8n 相同：段落用空格连接，截断到 max_chars。"""
+        self._end_para()
+        for paras in self._paras:
+            if paras:
+                return " ".join(paras)[:self.max_chars]
+        return ""
+
+    # ---------- 标签 ----------
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: (v or "").strip() for k, v in attrs}
+        if tag == "meta":
+            key = (a.get("property") or a.get("name") or "").lower()
+            prio = OG_META_KEYS.get(key)
+            if prio is not None and a.get("content"):
+                self.images.setdefault(prio, a["content"])
+            return
+        if tag == "link":
+            if "image_src" in (a.get("rel") or "").lower().split() and a.get("href"):
+                self.images.setdefault(_IMG_LINK, a["href"])
+            return
+        if tag == "script" and a.get("type", "").lower() == "application/ld+json":
+            self._ld = []
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+            return
+        if tag == "img":
+            src = a.get("src") or ""
+            if (src and not src.startswith("data:") and not src.lower().split("?", 1)[0].endswith(".svg")
+                    and a.get("width") != "1" and a.get("height") != "1"):
+                self.images.setdefault(_IMG_FIRST, src)
+            return
+        if tag == "section":
+            if self._section:
+                self._section += 1
+            elif a.get("name") == "articleBody":
+                self._end_para()
+                self._section = 1
+        elif tag == "article":
+            if self._article:
+                self._article += 1
+            elif a.get("id") == "story":
+                self._end_para()
+                self._article = 1
+        elif tag == "p":
+            self._end_para()  # 没闭合的 <p> 遇到下一个 <p> 就结束
+            if not self._skip:
+                self._p = []
+        elif tag == "br" and self._p is not None:
+            self._p.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._ld is not None:
+            if _IMG_JSONLD not in self.images:
+                try:
+                    url = _jsonld_image(json.loads("".join(self._ld)))
+                except ValueError:
+                    url = None
+                if url:
+                    self.images[_IMG_JSONLD] = url
+            self._ld = None
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "p":
+            self._end_para()
+        elif tag == "section" and self._section:
+            if self._section == 1:
+                self._end_para()  # 没闭合的最后一段仍算在容器里
+            self._section -= 1
+            if not self._section:
+                if self._paras[0]:
+                    self.done = True
+        elif tag == "article" and self._article:
+            if self._article == 1:
+                self._end_para()
+            self._article -= 1
+
+    def handle_data(self, data):
+        if self._ld is not None:
+            self._ld.append(data)
+        elif self._p is not None and not self._skip:
+            self._p.append(data)
+
+    def best_image(self) -> Optional[str]:
+        return self.images[min(self.images)] if self.images else None
+
+
+def extract_article(chunks: Iterable[bytes], base_url: str = "", encoding: str = "utf-8",
+                    max_bytes: int = PAGE_MAX_BYTES, max_chars: int = MAX_TEXT_CHARS) -> Tuple[str, Optional[str]]:
+    """
+    从 HTML 字节流里增量解析 (正文, 配图地址)，正文读完（或读够 max_bytes）就停止消费后续数据。
+    配图按 og:image → twitter:image → link rel=image_src → JSON-LD image → 正文第一张图，相对地址按 base_url 补全。
+    """
+    parser = ArticleTextParser(max_chars)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    read = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        read += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done or read >= max_bytes:
+            break
+    parser.close()
+    url = parser.best_image()
+    if url:
+        url = "https:" + url if url.startswith("//") else urljoin(base_url, url)
+    return parser.text(), url
+
+
+def fetch_article(url: str, timeout: float = FETCH_TIMEOUT) -> Dict[str, Any]:
+    """抓一篇文章页并解析；返回 {"text", "image_url", "status", "bytes", "error"}，不抛异常。"""
+    out: Dict[str, Any] = {"text": "", "image_url": None, "status": None, "bytes": 0, "error": None}
+    with span("extract.fetch", host=urlparse(url).netloc.lower()) as sp:
+        try:
+            with shared_client.get(url, headers=page_headers(), timeout=timeout, allow_redirects=True,
+                                   stream=True) as resp:
+                out["status"] = resp.status_code
+                resp.raise_for_status()
+
+                def chunks():
+                    for c in resp.iter_content(OG_CHUNK_SIZE):
+                        out["bytes"] += len(c)
+                        yield c
+
+                out["text"], out["image_url"] = extract_article(chunks(), resp.url, response_encoding(resp))
+        except Exception as e:
+            out["error"] = f"{type(e).__name__}: {e}"[:300]
+        sp.add_bytes(out["bytes"])
+        sp.set(status=out["status"], chars=len(out["text"]))
+    return out
+
+
+def is_permanent_failure(res: Dict[str, Any]) -> bool:
+    """fetch_article 没取到正文时：页面解析成功但没有正文，或 4xx（408 / 429 除外）才算永久失败。"""
+    if res["error"] is None:
+        return True
+    status = res["status"]
+    return status is not None and 400 <= status < 500 and status not in TRANSIENT_STATUS
+
+
+# =========================
+# 礼貌限速 + 断点
+# =========================
+
+class DomainLimiter:
+    """每个域名的并发上限 + 相邻两次请求开始的最小间隔。只在一个事件循环里使用。"""
+
+    def __init__(self, per_domain: int = DOMAIN_LIMIT, interval: float = DOMAIN_INTERVAL):
+        self.per_domain = per_domain
+        self.interval = interval
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._next: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = urlparse(url).netloc.lower()
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.per_domain)
+        async with sem:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, 0.0))
+            self._next[host] = start + self.interval  # 先占好时间点，等待期间别的任务排在后面
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class ExtractCheckpoint:
+    """
+    断点文件（JSON）：after_id 及之前的行都已处理完（写回或记为失败），续跑从它之后开始；
+    failed 为 {id: 原因}，只记永久失败，续跑时跳过（--retry-failed 按 id 单独重试这些行）。
+    临时失败（超时、429、5xx）的行不结束，after_id 停在它前面，下次运行会重新抓。
+    写回成功的行 maintext 已非空，本来就不会再被查出来，断点只是省掉重新扫描。
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.after_id: Optional[int] = data.get("after_id")
+        self.failed: Dict[str, str] = data.get("failed") or {}
+        self.written: int = data.get("written", 0)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"after_id": self.after_id, "failed": self.failed, "written": self.written},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+class _Watermark:
+    """行按 id 升序派发、乱序完成；返回“它及之前的行都已结束”的最大 id。"""
+
+    def __init__(self, start: Optional[int]):
+        self.value = start
+        self._order: deque = deque()
+        self._settled: set = set()
+
+    def dispatch(self, row_id: int) -> None:
+        self._order.append(row_id)
+
+    def settle(self, row_id: int) -> None:
+        self._settled.add(row_id)
+        while self._order and self._order[0] in self._settled:
+            self.value = self._order.popleft()
+            self._settled.discard(self.value)
+
+
+# =========================
+# 工作池
+# =========================
+
+async def extract_missing_async(checkpoint_path: str = CHECKPOINT_PATH,
+                                workers: int = EXTRACT_WORKERS,
+                                per_domain: int = DOMAIN_LIMIT,
+                                interval: float = DOMAIN_INTERVAL,
+                                batch_size: int = WRITE_BATCH,
+                                page_size: int = SYNC_PAGE_SIZE,
+                                limit: Optional[int] = None,
+                                retry_failed: bool = False,
+                                dry_run: bool = False) -> Dict[str, Any]:
+    """
+    处理 maintext 为空的行，返回统计 {rows, written, failed, transient, skipped, bytes, chars, write_errors, elapsed_s}。
+    retry_failed=True 时先按 id 重试断点里记为失败的行（清空 failed，再失败的重新记上），再从 after_id 继续。
+    dry_run=True 时只抓取解析、不写回也不动断点，统计里带 preview（前几篇的摘要）。
+    """
+    ckpt = ExtractCheckpoint(checkpoint_path)
+    retry_ids: set = set()
+    if retry_failed:
+        retry_ids = {int(x) for x in ckpt.failed}
+        ckpt.failed = {}
+    mark = _Watermark(ckpt.after_id)
+    limiter = DomainLimiter(per_domain, interval)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    pending: List[Dict[str, Any]] = []
+    write_lock = asyncio.Lock()
+    stats: Dict[str, Any] = {"rows": 0, "written": 0, "failed": 0, "transient": 0, "skipped": 0, "bytes": 0,
+                             "chars": 0, "write_errors": 0, "last_error": None}
+    if dry_run:
+        stats["preview"] = []
+    loop = asyncio.get_running_loop()
+    # 默认线程池在小机器上只有几个线程，抓取和写回用自己的池，大小跟 workers 对齐
+    pool = ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix="maintext")
+    t0 = time.perf_counter()
+
+    def settle(row_id: int) -> None:
+        # 重试的旧失败行在 after_id 之前，不参与水位线
+        if row_id not in retry_ids:
+            mark.settle(row_id)
+
+    async def flush(force: bool = False) -> None:
+        async with write_lock:
+            while pending and (force or len(pending) >= batch_size):
+                batch = pending[:batch_size]
+                del pending[:batch_size]
+                if not dry_run:
+                    try:
+                        await loop.run_in_executor(pool, update_article_texts, batch)
+                    except Exception as e:
+                        # 这批不推进断点：行的 maintext 仍为空，下次运行会重新抓
+                        stats["write_errors"] += 1
+                        stats["last_error"] = f"{type(e).__name__}: {e}"[:300]
+                        continue
+                stats["written"] += len(batch)
+                ckpt.written += len(batch)
+                for r in batch:
+                    settle(r["id"])
+            if not dry_run:
+                ckpt.after_id = mark.value
+                ckpt.save()
+
+    async def produce() -> None:
+        after, queued = ckpt.after_id, 0
+        try:
+            if retry_ids:
+                rows = await loop.run_in_executor(pool, fetch_missing_maintext_by_ids, sorted(retry_ids))
+                for r in rows[:limit]:
+                    await queue.put(r)
+                    queued += 1
+            while limit is None or queued < limit:
+                rows = await loop.run_in_executor(pool, fetch_missing_maintext_page, after, page_size)
+                for r in rows:
+                    if limit is not None and queued >= limit:
+                        break
+                    after = r["id"]
+                    if r["id"] in retry_ids:
+                        continue  # 上面已经排过
+                    mark.dispatch(r["id"])
+                    if str(r["id"]) in ckpt.failed or not (r.get("link") or "").strip():
+                        stats["skipped"] += 1
+                        mark.settle(r["id"])
+                        continue
+                    await queue.put(r)
+                    queued += 1
+                if len(rows) < page_size:
+                    break
+        finally:
+            for _ in range(workers):
+                await queue.put(None)
+
+    async def work() -> None:
+        while True:
+            row = await queue.get()
+            if row is None:
+                return
+            link = row["link"].strip()
+            async with limiter.slot(link):
+                res = await loop.run_in_executor(pool, fetch_article, link)
+            stats["rows"] += 1
+            stats["bytes"] += res["bytes"]
+            if not res["text"]:
+                if is_permanent_failure(res) or row["id"] in retry_ids:
+                    # 重试的行在 after_id 之前，临时失败也要记回 failed，否则不会再被扫到
+                    stats["failed"] += 1
+                    ckpt.failed[str(row["id"])] = res["error"] or "no text"
+                    settle(row["id"])
+                else:
+                    # 不结束这一行：after_id 停在它前面，下次运行重新抓
+                    stats["transient"] += 1
+                    stats["last_error"] = res["error"]
+                continue
+            stats["chars"] += len(res["text"])
+            image = res["image_url"] if not (row.get("image_url") or "").strip() else None
+            pending.append({"id": row["id"], "maintext": res["text"], "image_url": image})
+            if dry_run and len(stats["preview"]) < 5:
+                stats["preview"].append({"id": row["id"], "chars": len(res["text"]), "image_url": image,
+                                         "text": res["text"][:120]})
+            if len(pending) >= batch_size:
+                await flush()
+
+    with span("extract.run", workers=workers) as sp:
+        try:
+            await asyncio.gather(produce(), *(work() for _ in range(workers)))
+            await flush(force=True)
+        finally:
+            pool.shutdown(wait=False)
+        sp.set(rows=stats["rows"], written=stats["written"], failed=stats["failed"], transient=stats["transient"])
+        sp.add_bytes(stats["bytes"])
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+
+def extract_missing(**kwargs) -> Dict[str, Any]:
+    """同步入口，参数同 extract_missing_async。"""
+    return asyncio.run(extract_missing_async(**kwargs))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Fill empty News_storage.maintext by fetching the article pages.")
+    ap.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="断点文件")
+    ap.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="同时处理的文章数")
+    ap.add_argument("--per-domain", type=int, default=DOMAIN_LIMIT, help="同一域名同时最多几个请求")
+    ap.add_argument("--interval", type=float, default=DOMAIN_INTERVAL, help="同一域名请求间隔（秒）")
+    ap.add_argument("--batch", type=int, default=WRITE_BATCH, help="攒多少篇写回一次")
+    ap.add_argument("--limit", type=int, help="最多处理多少篇")
+    ap.add_argument("--retry-failed", action="store_true", help="重试断点里记为失败的行（不从头扫描）")
+    ap.add_argument("--dry-run", action="store_true", help="只抓取解析，不写回、不更新断点")
+    args = ap.parse_args(argv)
+
+    stats = extract_missing(checkpoint_path=args.checkpoint, workers=args.workers, per_domain=args.per_domain,
+                            interval=args.interval, batch_size=args.batch, limit=args.limit,
+                            retry_failed=args.retry_failed, dry_run=args.dry_run)
+    for p in stats.pop("preview", []):
+        print(f"  #{p['id']}: {p['chars']} chars, image={p['image_url'] or '-'}\n    {p['text']}")
+    rate = stats["rows"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+    print(f"fetched {stats['rows']} pages ({stats['bytes'] / 1e6:.1f} MB) in {stats['elapsed_s']}s "
+          f"({rate:.1f} pages/s): written {stats['written']}, failed {stats['failed']}, "
+          f"retry later {stats['transient']}, skipped {stats['skipped']}, write errors {stats['write_errors']}")
+    if stats["last_error"]:
+        print(f"last write error: {stats['last_error']}")
+    return 1 if stats["write_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
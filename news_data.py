@@ -0,0 +1,251 @@
+# news_data.py — 文章表构建与侧边栏筛选（从 app.py 移出，供 Streamlit 和基准测试复用）
+
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dedup import NearDupIndex
+from search_index import SearchIndex
+
+# 四个研究支柱（Category / categories 字段里用 "; " 分隔）
+CATEGORIES = [
+    "Housing Affordability",
+    "Culture Led Development",
+    "Net Zero Cities",
+    "Public/Private Development",
+]
+
+_CANON_CATEGORIES = {
+    "housing affordability": "Housing Affordability",
+    "culture led development": "Culture Led Development",
+    "culture-led development": "Culture Led Development",
+    "net zero cities": "Net Zero Cities",
+    "public/private development": "Public/Private Development",
+    "public / private development": "Public/Private Development",
+}
+
+
+def normalize_cat(s: str) -> str:
+    """把 AI / 人工写的类别名规范成 CATEGORIES 里的写法；不认识的原样返回。"""
+    s = (s or "").strip()
+    return _CANON_CATEGORIES.get(s.lower(), s)
+
+
+def split_categories(value: Any) -> List[str]:
+    """'A; B' → 规范化后、属于 CATEGORIES 的类别列表。"""
+    if not value or (isinstance(value, float) and pd.isna(value)):
+        return []
+    out = [normalize_cat(x) for x in str(value).split(";")]
+    return [c for c in out if c in CATEGORIES]
+
+
+try:
+    import pyarrow  # noqa: F401  （streamlit 自带；没有时文本列退回 pandas 自己的 string 类型）
+    TEXT_DTYPE = "string[pyarrow]"
+except ImportError:
+    TEXT_DTYPE = "string"
+
+_TEXT_COLUMNS = ["title", "url", "summary", "image_url", "maintext"]
+_NO_DAY = np.iinfo(np.int64).min  # 没有发布日期
+
+
+def articles_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    把 News_storage / 镜像的行按列直接构建成看板使用的表（不经过逐行 dict）：
+    publisher / category 为 category 类型，publish_date 为 datetime64（只保留日期），文本列为 Arrow 字符串。
+    """
+    cols: Dict[str, List[Any]] = {k: [] for k in ("id", "title", "publisher", "publish_date", "url",
+                                                   "summary", "category", "image_url", "maintext")}
+    for r in rows:
+        cols["id"].append(r.get("id"))
+        cols["title"].append(r.get("title") or "")
+        cols["publisher"].append(r.get("Publisher") or r.get("creator") or "")
+        cols["publish_date"].append(r.get("pubdate") or None)
+        cols["url"].append(r.get("link") or "")
+        cols["summary"].append(r.get("summary") or "")
+        cols["category"].append(r.get("Category") or "")
+        cols["image_url"].append(r.get("image_url") or "")
+        cols["maintext"].append(r.get("maintext") or "")
+    dates = pd.to_datetime(pd.Series(cols.pop("publish_date"), dtype=object), errors="coerce")
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_localize(None)  # 保留原始时区下的日期，与原来 .dt.date 的结果一致
+    df = pd.DataFrame({
+        "id":           pd.Series(cols.pop("id"), dtype="int64"),
+        "publish_date": dates.dt.normalize(),
+        "publisher":    pd.Series(cols.pop("publisher"), dtype="category"),
+        "category":     pd.Series(cols.pop("category"), dtype="category"),
+        **{k: pd.Series(v, dtype=TEXT_DTYPE) for k, v in cols.items()},
+    })
+    return df[["id", "title", "publisher", "publish_date", "url", "summary", "category", "image_url", "maintext"]]
+
+
+def concat_article_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """把按分区分别构建的 articles_frame 拼成一张表；各分区的 category 列类别不同，拼完后重新编码。"""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return articles_frame([])
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    df = pd.concat(frames, ignore_index=True)
+    for col in ("publisher", "category"):
+        if df[col].dtype != "category":
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _day_number(d: date) -> int:
+    return int(np.datetime64(d, "D").astype(np.int64))
+
+
+class ArticleStore:
+    """
+    镜像每同步一次构建一次、所有会话共享的只读文章表（放在 st.cache_resource 里，不要原地修改 frame）。
+    筛选时只用下面预先算好的数组，返回行号，不复制整张表：
+      _day           publish_date 的天数（int64，没有日期为 _NO_DAY）
+      _pub_codes     publisher 的分类编码
+      _unreviewed    Category 为空
+      _search_text   小写的 “标题 + 摘要”，没有倒排索引时做子串匹配
+      _cluster_ids   近似重复簇号（dedup.NearDupIndex），没有索引时为自身 id
+    """
+
+    def __init__(self, frame: pd.DataFrame, dedup_index: Optional[NearDupIndex] = None,
+                 version: Optional[str] = None):
+        self.version = version
+        frame = frame.reset_index(drop=True)
+        n = len(frame)
+        self.ids = frame["id"].to_numpy(dtype=np.int64) if n else np.empty(0, dtype=np.int64)
+        self._pos = pd.Index(self.ids)
+        if n:
+            days = frame["publish_date"].to_numpy(dtype="datetime64[D]")
+            self._day = np.where(np.isnat(days), _NO_DAY, days.astype(np.int64))
+            self._pub_codes = frame["publisher"].cat.codes.to_numpy()
+            self._cat_codes = frame["category"].cat.codes.to_numpy()
+            self._unreviewed = (frame["category"].astype(object).fillna("") == "").to_numpy()
+            self._search_text = (frame["title"] + " " + frame["summary"]).str.lower()
+            clusters = dedup_index.clusters() if dedup_index is not None else {}
+            self._cluster_ids = np.fromiter((clusters.get(i, i) for i in self.ids.tolist()), dtype=np.int64, count=n)
+            _, inverse, counts = np.unique(self._cluster_ids, return_inverse=True, return_counts=True)
+            frame["cluster_id"] = self._cluster_ids
+            frame["cluster_size"] = counts[inverse]
+        else:
+            self._day = self._pub_codes = self._cat_codes = self._cluster_ids = np.empty(0, dtype=np.int64)
+            self._unreviewed = np.empty(0, dtype=bool)
+            self._search_text = pd.Series([], dtype=TEXT_DTYPE)
+            frame["cluster_id"] = frame["cluster_size"] = pd.Series([], dtype=np.int64)
+        self.frame = frame
+        self.titles = frame["title"].to_numpy(dtype=object)  # 下拉选项每次 rerun 都要用
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.ids) == 0
+
+    def date_bounds(self) -> Tuple[Optional[date], Optional[date]]:
+        """最早 / 最晚发布日期；没有任何日期时为 (None, None)。"""
+        days = self._day[self._day != _NO_DAY]
+        if not len(days):
+            return None, None
+        return (np.datetime64(int(days.min()), "D").astype(object),
+                np.datetime64(int(days.max()), "D").astype(object))
+
+    def publishers(self) -> List[str]:
+        """出现过的出版方（去掉空值），已排序。"""
+        used = np.unique(self._pub_codes[self._pub_codes >= 0])
+        cats = self.frame["publisher"].cat.categories
+        return sorted(p for p in cats[used] if str(p).strip())
+
+    def select(self,
+               from_d: Optional[date] = None,
+               to_d: Optional[date] = None,
+               sel_pubs: Optional[List[str]] = None,
+               q: str = "",
+               only_unreviewed: bool = False,
+               search_index: Optional[SearchIndex] = None,
+               collapse_dups: bool = False,
+               semantic_ids: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        侧边栏筛选，返回符合条件的行号（np.ndarray）；有搜索词时按相关度排序。
+        semantic_ids（向量索引按相似度排好的文章 id）不为 None 时只保留其中的文章，并按它的顺序排列。
+        collapse_dups=True 时每个近似重复簇只保留排在最前的一篇。
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        if from_d and to_d:
+            mask &= (self._day >= _day_number(from_d)) & (self._day <= _day_number(to_d))
+        if sel_pubs:
+            codes = self.frame["publisher"].cat.categories.get_indexer(list(sel_pubs))
+            mask &= np.isin(self._pub_codes, codes[codes >= 0])
+        if only_unreviewed:
+            mask &= self._unreviewed
+        if q and search_index is not None:
+            ranked = self._pos.get_indexer([doc_id for doc_id, _ in search_index.search(q)])
+            ranked = ranked[ranked >= 0]
+            pos = ranked[mask[ranked]]  # 按相关度排序
+        else:
+            if q:
+                mask &= self._search_text.str.contains(q.lower(), regex=False).to_numpy(dtype=bool, na_value=False)
+            pos = np.flatnonzero(mask)
+        if semantic_ids is not None:
+            ranked = self._pos.get_indexer(list(semantic_ids))
+            ranked = ranked[ranked >= 0]
+            keep = np.zeros(len(self.ids), dtype=bool)
+            keep[pos] = True
+            pos = ranked[keep[ranked]]
+        if collapse_dups and len(pos):
+            _, first = np.unique(self._cluster_ids[pos], return_index=True)
+            pos = pos[np.sort(first)]
+        return pos
+
+    def aggregate(self, pos: np.ndarray) -> Dict[str, Any]:
+        """
+        对一组行号做统计（右侧面板用）：
+          count / publisher_counts（DataFrame: source, count，按数量降序）/ category_counts（类别 → 篇数）/
+          week_counts（周一 → 篇数）/ date_bounds
+        全部用分类编码和天数数组 bincount / unique，不需要 groupby。
+        """
+        pubs = self.frame["publisher"].cat.categories
+        pc = np.bincount(self._pub_codes[pos][self._pub_codes[pos] >= 0], minlength=len(pubs))
+        nz = np.flatnonzero(pc)
+        order = nz[np.argsort(-pc[nz], kind="stable")]
+        publisher_counts = pd.DataFrame({"source": pubs[order].astype(str), "count": pc[order]})
+
+        cats = self.frame["category"].cat.categories
+        cc = np.bincount(self._cat_codes[pos][self._cat_codes[pos] >= 0], minlength=len(cats))
+        category_counts = {c: 0 for c in CATEGORIES}
+        for code in np.flatnonzero(cc):
+            for c in split_categories(cats[code]):
+                category_counts[c] += int(cc[code])
+
+        days = self._day[pos]
+        days = days[days != _NO_DAY]
+        mondays, n = np.unique(days - (days + 3) % 7, return_counts=True)  # 1970-01-01 是周四
+        week_counts = {np.datetime64(int(m), "D").astype(object): int(k) for m, k in zip(mondays, n)}
+        bounds = ((np.datetime64(int(days.min()), "D").astype(object),
+                   np.datetime64(int(days.max()), "D").astype(object)) if len(days) else (None, None))
+        return {"count": int(len(pos)), "publisher_counts": publisher_counts,
+                "category_counts": category_counts, "week_counts": week_counts, "date_bounds": bounds}
+
+    def view(self, pos: np.ndarray) -> pd.DataFrame:
+        """按行号取子表（只复制选中的行）。"""
+        return self.frame.iloc[pos]
+
+    def row(self, doc_id: int) -> Dict[str, Any]:
+        """单篇文章转成普通 dict：publish_date 为 date（或 None），文本缺失为 ""。"""
+        rec = self.frame.iloc[int(self._pos.get_loc(doc_id))].to_dict()
+        d = rec.get("publish_date")
+        rec["publish_date"] = None if pd.isna(d) else d.date()
+        for k, v in rec.items():
+            if v is pd.NA:
+                rec[k] = ""
+            elif isinstance(v, np.integer):
+                rec[k] = int(v)
+        return rec
+
+    def cluster_members(self, doc_id: int) -> pd.DataFrame:
+        """与 doc_id 同一近似重复簇的其他文章。"""
+        cid = self._cluster_ids[self._pos.get_loc(doc_id)]
+        pos = np.flatnonzero((self._cluster_ids == cid) & (self.ids != doc_id))
+        return self.frame.iloc[pos]
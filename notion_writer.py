@@ -0,0 +1,216 @@
+# notion_writer.py — 批量写入 Notion：连接复用、令牌桶限速、重试退避、已推送账本去重
+# Notion API 平均限速约 3 req/s，超出会返回 429（带 Retry-After）。
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import requests
+
+from http_client import HttpClient, shared_client
+
+NOTION_PAGES_URL = "https://api.notion.com/v1/pages"
+NOTION_QUERY_URL = "https://api.notion.com/v1/databases/{database_id}/query"
+NOTION_URL_PROPERTY = "URL"  # 数据库里存文章链接的 url 属性，重试前按它查重
+NOTION_RATE = 3.0          # 每秒请求数
+NOTION_WORKERS = 3
+NOTION_MAX_RETRIES = 5
+NOTION_BACKOFF_BASE = 1.0  # 秒
+NOTION_BACKOFF_CAP = 30.0
+NOTION_LEDGER_PATH = os.environ.get("URBANLAB_NOTION_LEDGER") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "notion_ledger.jsonl"
+)
+
+_RETRY_STATUS = {409, 429, 500, 502, 503, 504}
+_UNKNOWN_STATUS = {409, 500, 502, 503, 504}  # 页面可能已经建好了，再 POST 之前先查库
+
+
+class TokenBucket:
+    """令牌桶：平均 rate 次/秒，允许 capacity 次突发。"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+    def pause(self, seconds: float) -> None:
+        """收到 429 时清空令牌，让所有 worker 一起等待。"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class PushLedger:
+    """已成功推送的链接（JSONL，每行一条），重复运行时据此跳过。"""
+
+    def __init__(self, path: str = NOTION_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._links = set()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._links.add(json.loads(line)["link"])
+                    except (ValueError, KeyError):
+                        continue
+        except OSError:
+            pass
+
+    def __contains__(self, link: str) -> bool:
+        with self._lock:
+            return link in self._links
+
+    def add(self, link: str, page_id: Optional[str] = None) -> None:
+        with self._lock:
+            if link in self._links:
+                return
+            self._links.add(link)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"link": link, "page_id": page_id,
+                                    "pushed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+                                   ensure_ascii=False) + "\n")
+
+
+class NotionWriter:
+    """
+    多个 worker 线程从队列取文章，经令牌桶限速后 POST 到 Notion。
+    429 按 Retry-After 暂停令牌桶后重试；5xx / 409 / 网络错误时 POST 结果未知，
+    先按链接查数据库，查到就算已插入，查不到才带抖动的指数退避后重发。成功的链接写入账本。
+    """
+
+    def __init__(self, headers: Dict[str, str], build_payload: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 workers: int = NOTION_WORKERS, rate: float = NOTION_RATE,
+                 max_retries: int = NOTION_MAX_RETRIES, ledger: Optional[PushLedger] = None,
+                 client: Optional[HttpClient] = None, url_property: str = NOTION_URL_PROPERTY):
+        self.build_payload = build_payload
+        self.url_property = url_property
+        self.workers = workers
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self.ledger = ledger if ledger is not None else PushLedger()
+        self.headers = dict(headers)
+        self.client = client or shared_client  # 连接池复用；POST 不被 client 自动重试，重试在 _push_one 里
+        self._stats_lock = threading.Lock()
+
+    def _post(self, payload: Dict[str, Any]) -> requests.Response:
+        return self.client.post(NOTION_PAGES_URL, headers=self.headers, json=payload, timeout=30)
+
+    def _find_page(self, payload: Dict[str, Any], link: str) -> Optional[str]:
+        """按链接在目标数据库里查已有页面，返回 page id；查询本身失败时抛 RequestException。"""
+        database_id = (payload.get("parent") or {}).get("database_id")
+        if not database_id or not link:
+            return None
+        r = self.client.post(NOTION_QUERY_URL.format(database_id=database_id), headers=self.headers, timeout=30,
+                             json={"filter": {"property": self.url_property, "url": {"equals": link}}, "page_size": 1})
+        r.raise_for_status()
+        results = (r.json() or {}).get("results") or []
+        return results[0].get("id") if results else None
+
+    def _inserted(self, article: Dict[str, Any], page_id: Optional[str], stats: Dict[str, Any]) -> None:
+        self.ledger.add(article.get("link") or "", page_id)
+        with self._stats_lock:
+            stats["inserted"] += 1
+        print("Inserted:", article.get("title", ""))
+
+    def _push_one(self, article: Dict[str, Any], stats: Dict[str, Any]) -> None:
+        link = article.get("link") or ""
+        payload = self.build_payload(article)
+        unknown = False  # 上一次 POST 可能已经建好页面（超时 / 断连 / 5xx / 409）
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            if unknown:
+                try:
+                    page_id = self._find_page(payload, link)
+                except requests.RequestException as e:
+                    err = f"query: {e}"  # 查不了就不重发，等下一轮再查
+                else:
+                    if page_id:
+                        self._inserted(article, page_id, stats)
+                        return
+                    unknown = False
+                    self.bucket.acquire()
+            if not unknown:
+                try:
+                    r = self._post(payload)
+                except requests.ConnectTimeout as e:
+                    err = str(e)  # 连接都没建立，请求没有发出去
+                except requests.RequestException as e:
+                    err = str(e)
+                    unknown = True
+                else:
+                    if r.status_code == 200:
+                        self._inserted(article, (r.json() or {}).get("id"), stats)
+                        return
+                    err = f"{r.status_code} {r.text[:200]}"
+                    if r.status_code not in _RETRY_STATUS:
+                        break
+                    unknown = r.status_code in _UNKNOWN_STATUS
+                    if r.status_code == 429:
+                        try:
+                            retry_after = float(r.headers.get("Retry-After", ""))
+                        except ValueError:
+                            retry_after = None
+                        if retry_after:
+                            # 只等这一次：清空令牌桶，下一轮 acquire 会等到 Retry-After 之后，所有 worker 一起
+                            self.bucket.pause(retry_after)
+                            continue
+            if attempt < self.max_retries:
+                delay = min(NOTION_BACKOFF_CAP, NOTION_BACKOFF_BASE * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+        with self._stats_lock:
+            stats["failed"] += 1
+            stats["errors"].append({"link": link, "error": err})
+        print("Error:", err)
+
+    def push_all(self, articles: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """推送一批文章，阻塞到全部完成；返回 {inserted, skipped, failed, errors}。"""
+        stats: Dict[str, Any] = {"inserted": 0, "skipped": 0, "failed": 0, "errors": []}
+        q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        queued = set()
+        for art in articles:
+            link = art.get("link") or ""
+            if not link or link in queued or link in self.ledger:
+                stats["skipped"] += 1
+                continue
+            queued.add(link)
+            q.put(art)
+
+        def worker():
+            while True:
+                art = q.get()
+                if art is None:
+                    return
+                try:
+                    self._push_one(art, stats)
+                except Exception as e:
+                    with self._stats_lock:
+                        stats["failed"] += 1
+                        stats["errors"].append({"link": art.get("link"), "error": str(e)})
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(self.workers, len(queued)))]
+        for _ in threads:
+            q.put(None)
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return stats
@@ -0,0 +1,226 @@
+# perf.py — 热点路径计时（span）
+# 用法：with span("supabase.sync", rows=0) as sp: ...; sp.set(rows=n); sp.add_bytes(len(body))
+#      或 @traced("weekly.build_docx")
+# 结束的 span 写进进程内环形缓冲（只保留最近 SPAN_BUFFER 条），可按 trace（一次 rerun）汇总，
+# 也可导出 JSON 或 Chrome trace 格式（chrome://tracing / Perfetto 直接打开）。
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+SPAN_BUFFER = 4096
+ENABLED = os.environ.get("URBANLAB_TRACE", "1") not in ("0", "false", "False", "")
+# 默认开启时字节数只记响应里现成的（Content-Length / 已读的 body）；
+# 显式设置 URBANLAB_TRACE 时才对没有响应可量的调用按 JSON 序列化估算（payload_bytes）
+EXPLICIT = ENABLED and "URBANLAB_TRACE" in os.environ
+
+# 当前 trace（例如一次 Streamlit rerun）；worker 线程里没有设置时为 None
+_current_trace: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("perf_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("perf_span", default=None)
+
+
+class Span:
+    """一段计时；with 块里可以 set() 附加属性、add_bytes() 累加字节数。"""
+
+    __slots__ = ("sid", "name", "trace", "parent", "start", "dur_ms", "bytes", "attrs", "error", "tid")
+
+    def __init__(self, sid: int, name: str, trace: Optional[str], parent: Optional[int], attrs: Dict[str, Any]):
+        self.sid = sid
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.start = time.time()
+        self.dur_ms = 0.0
+        self.bytes = 0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.tid = threading.get_ident()
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add_bytes(self, n: Optional[int]) -> None:
+        if n:
+            self.bytes += int(n)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.sid, "name": self.name, "trace": self.trace, "parent": self.parent,
+                "start": self.start, "dur_ms": round(self.dur_ms, 3), "bytes": self.bytes,
+                "attrs": dict(self.attrs), "error": self.error, "tid": self.tid}
+
+
+class _NullSpan:
+    """ENABLED 关闭时返回的空对象，调用方不用判断。"""
+
+    bytes = 0
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def add_bytes(self, n: Optional[int]) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """线程安全的 span 环形缓冲。"""
+
+    def __init__(self, capacity: int = SPAN_BUFFER):
+        self._spans: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def span(self, name: str, **attrs) -> "_SpanContext":
+        return _SpanContext(self, name, attrs)
+
+    def record(self, sp: Span) -> None:
+        with self._lock:
+            self._spans.append(sp)
+
+    def spans(self, trace: Optional[str] = None, limit: Optional[int] = None) -> List[Span]:
+        """按结束顺序返回 span；trace 不为 None 时只要该 trace 的。"""
+        with self._lock:
+            out = list(self._spans)
+        if trace is not None:
+            out = [s for s in out if s.trace == trace]
+        return out[-limit:] if limit else out
+
+    def summary(self, trace: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按 span 名汇总：次数、总耗时、最大耗时、字节数、出错次数；按总耗时降序。"""
+        agg: Dict[str, Dict[str, Any]] = {}
+        for s in self.spans(trace):
+            a = agg.setdefault(s.name, {"name": s.name, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                        "bytes": 0, "errors": 0})
+            a["count"] += 1
+            a["total_ms"] += s.dur_ms
+            a["max_ms"] = max(a["max_ms"], s.dur_ms)
+            a["bytes"] += s.bytes
+            a["errors"] += s.error is not None
+        for a in agg.values():
+            a["total_ms"] = round(a["total_ms"], 2)
+            a["max_ms"] = round(a["max_ms"], 2)
+        return sorted(agg.values(), key=lambda a: -a["total_ms"])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    # ---------- 导出 ----------
+
+    def to_json(self, trace: Optional[str] = None) -> str:
+        return json.dumps([s.to_dict() for s in self.spans(trace)], ensure_ascii=False, default=str)
+
+    def to_chrome_trace(self, trace: Optional[str] = None) -> str:
+        """Chrome trace event 格式（"X" 完整事件，时间单位微秒）。"""
+        pid = os.getpid()
+        events = []
+        for s in self.spans(trace):
+            args = dict(s.attrs)
+            if s.bytes:
+                args["bytes"] = s.bytes
+            if s.error:
+                args["error"] = s.error
+            if s.trace:
+                args["trace"] = s.trace
+            events.append({"name": s.name, "cat": s.name.split(".", 1)[0], "ph": "X",
+                           "ts": int(s.start * 1e6), "dur": max(1, int(s.dur_ms * 1000)),
+                           "pid": pid, "tid": s.tid, "args": args})
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False, default=str)
+
+
+class _SpanContext:
+    __slots__ = ("_tracer", "_name", "_attrs", "_span", "_token", "_t0")
+
+    def __init__(self, tracer: Tracer, name: str, attrs: Dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._attrs = attrs
+        self._span: Optional[Span] = None
+
+    def __enter__(self):
+        if not ENABLED:
+            return _NULL_SPAN
+        parent = _current_span.get()
+        self._span = Span(self._tracer._next_id(), self._name, _current_trace.get(),
+                          parent.sid if parent else None, self._attrs)
+        self._token = _current_span.set(self._span)
+        self._t0 = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        sp = self._span
+        if sp is None:
+            return False
+        sp.dur_ms = (time.perf_counter() - self._t0) * 1000
+        _current_span.reset(self._token)
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            sp.error = f"{exc_type.__name__}: {exc}"[:300]
+        self._tracer.record(sp)
+        return False
+
+
+# 进程内共享
+tracer = Tracer()
+
+
+def span(name: str, **attrs) -> _SpanContext:
+    return tracer.span(name, **attrs)
+
+
+def traced(name: Optional[str] = None, bytes_of: Optional[Callable[[Any], Optional[int]]] = None):
+    """
+    装饰器：整个函数调用记一个 span（默认名为 模块.函数名）。
+    函数体里没有记到字节数（例如没有经过 HTTP 钩子）时，bytes_of(result) 的返回值记到 span 上。
+    """
+    def deco(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(label) as sp:
+                result = fn(*args, **kwargs)
+                if bytes_of is not None and result is not None and not sp.bytes:
+                    sp.add_bytes(bytes_of(result))
+                return result
+        return wrapper
+    return deco
+
+
+def begin_trace(label: str = "trace") -> str:
+    """开始一个新 trace（例如每次 rerun 开头调用），之后本线程 / 上下文里的 span 都归到它下面。"""
+    trace_id = f"{label}-{uuid.uuid4().hex[:8]}"
+    _current_trace.set(trace_id)
+    _current_span.set(None)
+    return trace_id
+
+
+def current_trace() -> Optional[str]:
+    return _current_trace.get()
+
+
+def current_span() -> Optional[Span]:
+    """当前上下文里最内层的 span（没有或 ENABLED 关闭时为 None），给 HTTP 钩子记字节数用。"""
+    return _current_span.get()
+
+
+def payload_bytes(data: Any) -> int:
+    """粗略估计一批行（list[dict]）的大小：按 JSON 序列化长度。只在显式开启 URBANLAB_TRACE 时计算。"""
+    if not EXPLICIT or not data:
+        return 0
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return 0
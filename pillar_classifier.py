@@ -0,0 +1,271 @@
+# pillar_classifier.py — 本地研究支柱预分类（替代 n8n 里逐篇调用 Gemini 的 “AI Agent” 节点）
+#
+#   python pillar_classifier.py train                    # 用 news_reviews 里 confirm 的审核结果训练
+#   python pillar_classifier.py predict --csv low.csv    # 给镜像里还没有有效 Category 的文章打分
+#   python pillar_classifier.py predict --write          # 把高置信度结果写回 News_storage.Category
+#
+# 特征：标题 + 摘要的词和二元词组做 feature hashing（2^18 维，log TF，L2 归一化）；
+# 模型：每个类别一个逻辑回归（可多选），Adagrad 全批量训练。稀疏矩阵用 CSR 三个数组表示，只依赖 numpy。
+# 低置信度的文章才需要再交给 LLM。
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from news_data import CATEGORIES, split_categories
+from search_index import tokenize
+
+N_FEATURES = 1 << 18
+TITLE_WEIGHT = 2.0          # 标题里的词权重加倍
+EPOCHS = 80
+LEARNING_RATE = 0.5
+L2 = 1e-4
+DECISION_THRESHOLD = 0.5    # 概率 ≥ 0.5 的类别被预选
+CONFIDENCE_THRESHOLD = 0.7  # 低于此值的文章标记为低置信度，交给 LLM / 人工
+
+MODEL_PATH = os.environ.get("URBANLAB_PILLAR_MODEL") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "pillar_model.npz"
+)
+
+Csr = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (indptr, indices, data)
+
+
+def _features(title: str, summary: str) -> Dict[int, float]:
+    counts: Dict[int, float] = defaultdict(float)
+    for text, weight in ((title, TITLE_WEIGHT), (summary, 1.0)):
+        toks = tokenize(text)
+        grams = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+        for g in grams:
+            counts[zlib.crc32(g.encode("utf-8")) % N_FEATURES] += weight
+    return counts
+
+
+def featurize(docs: Iterable[Tuple[str, str]]) -> Csr:
+    """[(title, summary)] → CSR 特征矩阵（每行 L2 归一化）。"""
+    indptr, indices, data = [0], [], []
+    for title, summary in docs:
+        feats = _features(title or "", summary or "")
+        vals = [math.log1p(v) for v in feats.values()]
+        norm = math.sqrt(sum(v * v for v in vals)) or 1.0
+        indices.extend(feats.keys())
+        data.extend(v / norm for v in vals)
+        indptr.append(len(indices))
+    return (np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(data, dtype=np.float32))
+
+
+def _row_ids(indptr: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class PillarClassifier:
+    """多标签线性模型：W (N_FEATURES × 类别数) + b。"""
+
+    def __init__(self, categories: Sequence[str] = CATEGORIES):
+        self.categories = list(categories)
+        self.W = np.zeros((N_FEATURES, len(self.categories)), dtype=np.float32)
+        self.b = np.zeros(len(self.categories), dtype=np.float32)
+        self.n_train = 0
+        self.trained_at: Optional[str] = None
+
+    # ---------- 训练 ----------
+
+    def _scores(self, X: Csr) -> np.ndarray:
+        indptr, indices, data = X
+        rows = _row_ids(indptr)
+        n = len(indptr) - 1
+        out = np.empty((n, len(self.categories)), dtype=np.float32)
+        contrib = self.W[indices] * data[:, None]
+        for k in range(len(self.categories)):
+            out[:, k] = np.bincount(rows, weights=contrib[:, k], minlength=n)
+        return out + self.b
+
+    def fit(self, docs: Sequence[Tuple[str, str]], labels: Sequence[List[str]],
+            epochs: int = EPOCHS, lr: float = LEARNING_RATE, l2: float = L2) -> "PillarClassifier":
+        """docs: [(title, summary)]；labels: 每篇的类别列表（已规范化）。"""
+        X = featurize(docs)
+        indptr, indices, data = X
+        rows = _row_ids(indptr)
+        Y = np.array([[c in lab for c in self.categories] for lab in labels], dtype=np.float32)
+        n = max(len(Y), 1)
+        acc_W = np.zeros_like(self.W)
+        acc_b = np.zeros_like(self.b)
+        touched = np.unique(indices)  # 只更新出现过的特征，其余权重保持 0
+        for _ in range(epochs):
+            err = (_sigmoid(self._scores(X)) - Y) / n
+            grad = np.empty((len(touched), len(self.categories)), dtype=np.float32)
+            for k in range(len(self.categories)):
+                grad[:, k] = np.bincount(indices, weights=data * err[rows, k], minlength=N_FEATURES)[touched]
+            grad += l2 * self.W[touched]
+            acc_W[touched] += grad * grad
+            self.W[touched] -= lr * grad / (np.sqrt(acc_W[touched]) + 1e-8)
+            gb = err.sum(axis=0)
+            acc_b += gb * gb
+            self.b -= lr * gb / (np.sqrt(acc_b) + 1e-8)
+        self.n_train = len(Y)
+        self.trained_at = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        return self
+
+    # ---------- 预测 ----------
+
+    def predict_proba(self, docs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        return _sigmoid(self._scores(featurize(docs)))
+
+    def predict(self, docs: Sequence[Tuple[str, str]],
+                threshold: float = DECISION_THRESHOLD,
+                min_confidence: float = CONFIDENCE_THRESHOLD) -> List[Dict[str, Any]]:
+        """
+        每篇返回 {"category": "A; B", "confidence", "low_confidence", "scores": {类别: 概率}}。
+        category 与 Category 字段同格式，可直接用 split_categories / normalize_cat 解析；
+        没有类别过阈值时取概率最高的一个。confidence = 各类别“选/不选”判断里最没把握的那个。
+        """
+        P = self.predict_proba(docs)
+        out = []
+        for p in P:
+            chosen = [c for c, v in zip(self.categories, p) if v >= threshold]
+            if not chosen:
+                chosen = [self.categories[int(np.argmax(p))]]
+            conf = float(np.min(np.maximum(p, 1 - p)))
+            out.append({
+                "category": "; ".join(chosen),
+                "confidence": conf,
+                "low_confidence": conf < min_confidence,
+                "scores": {c: float(v) for c, v in zip(self.categories, p)},
+            })
+        return out
+
+    # ---------- 保存 / 读取 ----------
+
+    def save(self, path: str = MODEL_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        nz = np.flatnonzero(np.any(self.W != 0, axis=1))  # 只存非零行
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, rows=nz, W=self.W[nz], b=self.b,
+                            categories=np.array(self.categories),
+                            meta=np.array([str(self.n_train), self.trained_at or ""]))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> Optional["PillarClassifier"]:
+        """没有模型文件时返回 None。"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            model = cls([str(c) for c in z["categories"]])
+            model.W[z["rows"]] = z["W"]
+            model.b[:] = z["b"]
+            n_train, trained_at = (str(x) for x in z["meta"])
+        model.n_train = int(n_train)
+        model.trained_at = trained_at or None
+        return model
+
+
+# =========================
+# 训练数据 / 命令行
+# =========================
+
+def load_training_reviews() -> Tuple[List[Tuple[str, str]], List[List[str]]]:
+    """读取 news_reviews 中 decision=confirm 且类别有效的记录；同一链接只取最新一条。"""
+    from supabase_io import fetch_reviews_page
+    latest: Dict[str, Dict[str, Any]] = {}
+    after = None
+    while True:
+        page = fetch_reviews_page(after, fields="id,title,summary,link,decision,categories")
+        if not page:
+            break
+        for r in page:
+            key = r.get("link") or r.get("title") or str(r["id"])
+            latest[key] = r  # 按 id 递增读取，后面的覆盖前面的
+        after = page[-1]["id"]
+    docs, labels = [], []
+    for r in latest.values():
+        cats = split_categories(r.get("categories"))
+        if (r.get("decision") or "").lower() == "confirm" and cats:
+            docs.append((r.get("title") or "", r.get("summary") or ""))
+            labels.append(cats)
+    return docs, labels
+
+
+def _holdout_report(docs, labels, frac: float) -> None:
+    rng = np.random.RandomState(0)
+    idx = rng.permutation(len(docs))
+    cut = int(len(docs) * (1 - frac))
+    tr, te = idx[:cut], idx[cut:]
+    if not len(te):
+        return
+    model = PillarClassifier().fit([docs[i] for i in tr], [labels[i] for i in tr])
+    preds = model.predict([docs[i] for i in te])
+    for c in model.categories:
+        tp = sum(c in split_categories(p["category"]) and c in labels[i] for p, i in zip(preds, te))
+        fp = sum(c in split_categories(p["category"]) and c not in labels[i] for p, i in zip(preds, te))
+        fn = sum(c not in split_categories(p["category"]) and c in labels[i] for p, i in zip(preds, te))
+        f1 = 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+        print(f"  {c:<28} F1={f1:.2f}  (tp={tp} fp={fp} fn={fn})")
+    exact = sum(set(split_categories(p["category"])) == set(labels[i]) for p, i in zip(preds, te))
+    low = sum(p["low_confidence"] for p in preds)
+    print(f"  exact match {exact}/{len(te)}, low confidence {low}/{len(te)}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Train / run the local pillar pre-classifier.")
+    ap.add_argument("command", choices=["train", "predict"])
+    ap.add_argument("--model", default=MODEL_PATH, help="模型文件路径")
+    ap.add_argument("--holdout", type=float, default=0.2, help="train：留出多少比例做评估（0 不评估）")
+    ap.add_argument("--all", action="store_true", help="predict：对所有文章打分（默认只处理没有有效 Category 的）")
+    ap.add_argument("--write", action="store_true", help="predict：高置信度结果写回 News_storage.Category")
+    ap.add_argument("--csv", help="predict：把低置信度文章写到 CSV，供 LLM / 人工处理")
+    args = ap.parse_args(argv)
+
+    if args.command == "train":
+        docs, labels = load_training_reviews()
+        if not docs:
+            print("news_reviews 里没有可用的 confirm 记录")
+            return 1
+        if args.holdout > 0:
+            print(f"holdout {args.holdout:.0%}:")
+            _holdout_report(docs, labels, args.holdout)
+        t0 = time.perf_counter()
+        PillarClassifier().fit(docs, labels).save(args.model)
+        print(f"trained on {len(docs)} reviews in {time.perf_counter() - t0:.2f}s -> {args.model}")
+        return 0
+
+    model = PillarClassifier.load(args.model)
+    if model is None:
+        print(f"模型不存在：{args.model}，先运行 train")
+        return 1
+    from supabase_io import load_mirror_articles, update_article_categories
+    rows = [r for r in load_mirror_articles() if args.all or not split_categories(r.get("Category"))]
+    t0 = time.perf_counter()
+    preds = model.predict([(r.get("title") or "", r.get("summary") or "") for r in rows])
+    dt = time.perf_counter() - t0
+    print(f"scored {len(rows)} articles in {dt * 1000:.1f}ms ({len(rows) / dt if dt else 0:.0f} rows/s)")
+    confident = {r["id"]: p["category"] for r, p in zip(rows, preds) if not p["low_confidence"]}
+    low = [(r, p) for r, p in zip(rows, preds) if p["low_confidence"]]
+    print(f"confident: {len(confident)}, low confidence: {len(low)}")
+    if args.csv:
+        with open(args.csv, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["id", "title", "link", "suggested", "confidence"])
+            for r, p in low:
+                w.writerow([r["id"], r.get("title"), r.get("link"), p["category"], f"{p['confidence']:.3f}"])
+    if args.write and confident:
+        print(f"updated {update_article_categories(confident)} rows in News_storage")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
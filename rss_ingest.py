@@ -0,0 +1,239 @@
+# rss_ingest.py — 多源 RSS 并发抓取（asyncio），支持 ETag / Last-Modified 条件请求
+# 对应 n8n 里的三个 “RSS Read” 节点；输出统一成 supabase_io.ARTICLE_FIELDS 的字段结构。
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from html import unescape
+from typing import Any, Dict, List, Optional
+
+import feedparser
+import requests
+
+from dedup import NearDupIndex
+from http_client import shared_client
+from supabase_io import ARTICLE_FIELDS
+
+# 与 News collector final.json 中的 RSS Read / Edit Fields 节点保持一致
+FEEDS: List[Dict[str, Any]] = [
+    {"name": "nyt-realestate", "url": "https://rss.nytimes.com/services/xml/rss/nyt/RealEstate.xml",
+     "publisher": "The New York Times", "max_age_days": 3},
+    {"name": "therealdeal", "url": "https://therealdeal.com/new-york/feed",
+     "publisher": "therealdeal.com", "max_age_days": 3},
+    {"name": "curbed", "url": "https://www.curbed.com/rss/index.xml",
+     "publisher": "curbed.com", "max_age_days": 3},
+]
+
+FEED_STATE_PATH = os.environ.get("URBANLAB_FEED_STATE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "feed_state.json"
+)
+FEED_CONCURRENCY = 8
+FEED_TIMEOUT = 20
+USER_AGENT = "Mozilla/5.0 (compatible; UrbanLabIngest/1.0)"
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+
+
+# =========================
+# 条件请求状态（每个 feed 的 ETag / Last-Modified）
+# =========================
+
+class FeedState:
+    """feed url → {etag, last_modified}，存成一个 JSON 文件。"""
+
+    def __init__(self, path: str = FEED_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.data: Dict[str, Dict[str, str]] = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def headers_for(self, url: str) -> Dict[str, str]:
+        st_ = self.data.get(url) or {}
+        h = {}
+        if st_.get("etag"):
+            h["If-None-Match"] = st_["etag"]
+        if st_.get("last_modified"):
+            h["If-Modified-Since"] = st_["last_modified"]
+        return h
+
+    def update(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        with self._lock:
+            self.data[url] = {k: v for k, v in (("etag", etag), ("last_modified", last_modified)) if v}
+
+    def commit(self, result: Dict[str, Any]) -> None:
+        """记下 fetch_feed 结果里的 ETag / Last-Modified；只在条目已经交给下游之后调用。"""
+        if result.get("status") == 200 and not result.get("error"):
+            self.update(result["url"], result.get("etag"), result.get("last_modified"))
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+
+# =========================
+# 字段规范化
+# =========================
+
+def _plain_text(html: str) -> str:
+    """去掉 HTML 标签，相当于 n8n 的 contentSnippet。"""
+    return _WS_RE.sub(" ", unescape(_TAG_RE.sub(" ", html or ""))).strip()
+
+
+def _entry_date(entry) -> Optional[datetime]:
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    if not parsed:
+        return None
+    return datetime(*parsed[:6])
+
+
+def normalize_entry(entry, feed: Dict[str, Any]) -> Dict[str, Any]:
+    """把一条 feedparser entry 转成 ARTICLE_FIELDS 结构（id / row_no 由数据库生成，这里为 None）。"""
+    published = _entry_date(entry)
+    summary = entry.get("summary") or ""
+    if not summary and entry.get("content"):
+        summary = entry["content"][0].get("value", "")
+    row = {k: None for k in ARTICLE_FIELDS}
+    row.update({
+        "title":     (entry.get("title") or "").strip(),
+        "creator":   (entry.get("author") or "").strip(),
+        "link":      (entry.get("link") or "").strip(),
+        "pubdate":   published.strftime("%Y-%m-%d") if published else None,
+        "summary":   _plain_text(summary),
+        "Publisher": feed.get("publisher") or feed.get("name", ""),
+        "Category":  "",
+    })
+    return row
+
+
+# =========================
+# 抓取
+# =========================
+
+def _get(url: str, headers: Dict[str, str]) -> requests.Response:
+    return shared_client.get(url, headers=headers, timeout=FEED_TIMEOUT)
+
+
+async def fetch_feed(feed: Dict[str, Any], state: FeedState, sem: asyncio.Semaphore) -> Dict[str, Any]:
+    """
+    抓一个 feed。返回 {"feed", "url", "status", "entries", "published", "etag", "last_modified", "error"}：
+      status = 200 正常解析；304 未变化（不解析、entries 为空）；其它为错误。
+      published 为 feed 里全部条目的发布时间（UTC epoch 秒，不受 max_age_days 限制），供调度器估算更新频率。
+    state 只用来带条件请求头，不会被修改：下游处理完 entries 之后由调用方 state.commit(result)，
+    否则写入失败时下次会收到 304，这些条目就丢了。
+    """
+    url = feed["url"]
+    headers = {"User-Agent": USER_AGENT, **state.headers_for(url)}
+    result: Dict[str, Any] = {"feed": feed.get("name", url), "url": url, "status": None, "entries": [],
+                              "published": [], "etag": None, "last_modified": None, "error": None}
+    try:
+        async with sem:
+            resp = await asyncio.to_thread(_get, url, headers)
+        result["status"] = resp.status_code
+        if resp.status_code == 304:
+            return result
+        resp.raise_for_status()
+        parsed = await asyncio.to_thread(feedparser.parse, resp.content)
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+
+    cutoff = None
+    if feed.get("max_age_days"):
+        cutoff = datetime.utcnow() - timedelta(days=feed["max_age_days"])
+    for entry in parsed.entries:
+        published = _entry_date(entry)
+        if published is not None:
+            result["published"].append(published.replace(tzinfo=timezone.utc).timestamp())
+        if cutoff and (published is None or published < cutoff or published > datetime.utcnow()):
+            continue  # 与 n8n 的 If 节点一致：只要最近 N 天内的文章
+        row = normalize_entry(entry, feed)
+        if row["link"]:
+            result["entries"].append(row)
+    result["etag"] = resp.headers.get("ETag")
+    result["last_modified"] = resp.headers.get("Last-Modified")
+    return result
+
+
+async def ingest_feeds_async(feeds: Optional[List[Dict[str, Any]]] = None,
+                             state_path: str = FEED_STATE_PATH,
+                             concurrency: int = FEED_CONCURRENCY) -> List[Dict[str, Any]]:
+    """并发抓取全部 feed，返回每个 feed 的结果；条件请求状态不在这里保存，见 commit_feed_state。"""
+    feeds = FEEDS if feeds is None else feeds
+    state = FeedState(state_path)
+    sem = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(fetch_feed(f, state, sem) for f in feeds))
+    return list(results)
+
+
+def commit_feed_state(results: List[Dict[str, Any]], state_path: str = FEED_STATE_PATH) -> None:
+    """下游已经处理完这些结果的条目后，保存它们的 ETag / Last-Modified。"""
+    state = FeedState(state_path)
+    for res in results:
+        state.commit(res)
+    try:
+        state.save()
+    except OSError:
+        pass
+
+
+def dedup_entries(results: List[Dict[str, Any]],
+                  dedup_index: Optional[NearDupIndex] = None) -> List[Dict[str, Any]]:
+    """
+    合并各 feed 的条目，先按 link 去重，再去掉近似重复（转载稿）。
+    dedup_index 可传入已装好库内文章的索引，与已有文章重复的也会被去掉；新文章按 link 加进索引。
+    """
+    index = dedup_index if dedup_index is not None else NearDupIndex()
+    seen, out = set(), []
+    for res in results:
+        for row in res["entries"]:
+            if row["link"] in seen:
+                continue
+            seen.add(row["link"])
+            if index.query(row["title"], row["summary"], row.get("maintext") or ""):
+                continue
+            index.add(row["link"], row["title"], row["summary"], row.get("maintext") or "")
+            out.append(row)
+    return out
+
+
+def ingest_feeds(feeds: Optional[List[Dict[str, Any]]] = None,
+                 state_path: str = FEED_STATE_PATH,
+                 concurrency: int = FEED_CONCURRENCY,
+                 dedup_index: Optional[NearDupIndex] = None) -> List[Dict[str, Any]]:
+    """
+    同步入口：返回所有 feed 去重后的新文章，并立即保存条件请求状态。
+    只适合拿到结果就算处理完的场合；要写入下游的调用方用 ingest_feeds_async + commit_feed_state。
+    """
+    results = asyncio.run(ingest_feeds_async(feeds, state_path, concurrency))
+    out = dedup_entries(results, dedup_index)
+    commit_feed_state(results, state_path)
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fetch configured RSS feeds concurrently.")
+    ap.add_argument("--state", default=FEED_STATE_PATH, help="ETag/Last-Modified 状态文件")
+    ap.add_argument("--feeds", help="JSON 文件：[{name, url, publisher, max_age_days}]，默认用内置 FEEDS")
+    args = ap.parse_args()
+
+    feeds = None
+    if args.feeds:
+        with open(args.feeds, "r", encoding="utf-8") as f:
+            feeds = json.load(f)
+    results = asyncio.run(ingest_feeds_async(feeds, args.state))
+    for res in results:
+        print(f"{res['feed']}: status={res['status']} entries={len(res['entries'])}"
+              + (f" error={res['error']}" if res["error"] else ""))
+    commit_feed_state(results, args.state)
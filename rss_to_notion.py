@@ -1,6 +1,7 @@
-import feedparser
-import requests
-from datetime import datetime
+from notion_writer import NotionWriter
+import asyncio
+
+from rss_ingest import FEEDS, commit_feed_state, dedup_entries, ingest_feeds_async
 
 NOTION_TOKEN = "secret_xxx"  # 你的 Notion Integration Token
 DATABASE_ID = "xxxx-xxxx-xxxx-xxxx"  # 你的 Notion 数据库 ID
@@ -11,38 +12,55 @@ headers = {
     "Notion-Version": "2022-06-28"
 }
 
-def create_page_in_notion(article):
-    url = "https://api.notion.com/v1/pages"
-    data = {
+def build_page(article):
+    return {
         "parent": {"database_id": DATABASE_ID},
         "properties": {
             "Title": {"title": [{"text": {"content": article["title"]}}]},
             "URL": {"url": article["link"]},
-            "Publisher": {"rich_text": [{"text": {"content": "NYT"}}]},
+            "Publisher": {"rich_text": [{"text": {"content": article.get("publisher") or "NYT"}}]},
             "Published Date": {"date": {"start": article["date"]}},
             "Summary": {"rich_text": [{"text": {"content": article["summary"][:500]}}]},
             "Status": {"select": {"name": "待审核"}},
         }
     }
-    r = requests.post(url, headers=headers, json=data)
-    if r.status_code != 200:
-        print("Error:", r.text)
-    else:
-        print("Inserted:", article["title"])
-
-def fetch_rss():
-    feed = feedparser.parse("https://rss.nytimes.com/services/xml/rss/nyt/RealEstate.xml")
-    articles = []
-    for entry in feed.entries:
-        pub_date = datetime(*entry.published_parsed[:6]).strftime("%Y-%m-%d")
-        articles.append({
-            "title": entry.title,
-            "link": entry.link,
-            "date": pub_date,
-            "summary": entry.summary,
-        })
-    return articles
+
+_writer = None
+
+def get_writer():
+    """共享一个 NotionWriter（同一个限速器和去重账本，连接走 http_client 的连接池）。"""
+    global _writer
+    if _writer is None:
+        _writer = NotionWriter(headers, build_page)
+    return _writer
+
+def create_page_in_notion(article):
+    """单条写入；已推送过的链接会被跳过。"""
+    return get_writer().push_all([article])
+
+def article_from_row(row):
+    """rss_ingest 的一行（ARTICLE_FIELDS 结构）→ build_page 用的 article。"""
+    return {
+        "title": row["title"],
+        "link": row["link"],
+        "date": row["pubdate"],
+        "summary": row["summary"],
+        "publisher": row.get("Publisher"),
+    }
+
+def fetch_rss(feeds=None):
+    """
+    通过 rss_ingest 并发抓取 feed（默认只抓 NYT RealEstate），返回 (articles, results)；
+    未变化的 feed 返回 304，不会产生任何文章。推送成功后再 commit_feed_state(results)。
+    """
+    if feeds is None:
+        feeds = [f for f in FEEDS if f["name"] == "nyt-realestate"]
+    results = asyncio.run(ingest_feeds_async(feeds))
+    return [article_from_row(row) for row in dedup_entries(results) if row["pubdate"]], results
 
 if __name__ == "__main__":
-    for art in fetch_rss():
-        create_page_in_notion(art)
+    articles, results = fetch_rss()
+    stats = get_writer().push_all(articles)
+    print(f"Done: inserted={stats['inserted']} skipped={stats['skipped']} failed={stats['failed']}")
+    if not stats["failed"]:
+        commit_feed_state(results)  # 有失败的不记 ETag，下次还会拿到这些条目重试
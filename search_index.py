@@ -0,0 +1,261 @@
+# search_index.py — 侧边栏 “Search title/summary” 用的倒排索引
+# 支持：多词 AND、"引号短语"、前缀匹配（边输入边搜）、BM25 排序；按文章增量更新。
+
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# 字段权重：标题命中最重要，正文最轻
+FIELD_WEIGHTS = {"title": 3.0, "summary": 1.0, "maintext": 0.5}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class SearchIndex:
+    """
+    内存布局尽量紧凑（语料大了 maintext 会占大头）：
+      _seq[docno][field]  每篇文章每个字段的 token id 序列（array('I')），用于算 tf 和校验短语
+      _postings[tid]      出现过该 token 的 docno 列表（array('I')，只追加）
+      _tfs[tid]           与 _postings 对齐的各字段词频，每字段 8 位打包在一个整数里
+    文章更新/删除时旧 docno 标记为失效，失效比例过半时整体压缩一次。
+    """
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None):
+        self.field_weights = dict(field_weights or FIELD_WEIGHTS)
+        self._fields = list(self.field_weights)
+        self._tok_id: Dict[str, int] = {}
+        self._postings: List[array] = []
+        self._tfs: List[array] = []
+        self._seq: List[Optional[Tuple[array, ...]]] = []
+        self._doc_ids: List[Any] = []          # docno → doc_id
+        self._docno: Dict[Any, int] = {}       # doc_id → 当前有效的 docno
+        self._fingerprint: Dict[Any, int] = {}
+        self._total_len = [0] * len(self._fields)
+        self._dead = 0
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self._lock = threading.RLock()
+        self.version: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._docno)
+
+    # ---------- 写入 ----------
+
+    def add(self, doc_id: Any, **fields: str) -> bool:
+        """加入/更新一篇文章；内容没变时直接跳过，返回是否真的改动了索引。"""
+        texts = [str(fields.get(f) or "") for f in self._fields]
+        fp = hash(tuple(texts))
+        with self._lock:
+            if self._fingerprint.get(doc_id) == fp:
+                return False
+            if doc_id in self._docno:
+                self._remove(doc_id)
+            docno = len(self._seq)
+            seqs = []
+            packed: Dict[int, int] = {}
+            for fi, text in enumerate(texts):
+                ids = array("I")
+                for tok in tokenize(text):
+                    tid = self._tok_id.get(tok)
+                    if tid is None:
+                        tid = self._tok_id[tok] = len(self._postings)
+                        self._postings.append(array("I"))
+                        self._tfs.append(array("I"))
+                        self._vocab_dirty = True
+                    ids.append(tid)
+                for tid, tf in Counter(ids).items():
+                    packed[tid] = packed.get(tid, 0) | (min(tf, 255) << (8 * fi))
+                seqs.append(ids)
+                self._total_len[fi] += len(ids)
+            for tid, tf in packed.items():
+                self._postings[tid].append(docno)
+                self._tfs[tid].append(tf)
+            self._seq.append(tuple(seqs))
+            self._doc_ids.append(doc_id)
+            self._docno[doc_id] = docno
+            self._fingerprint[doc_id] = fp
+            return True
+
+    def remove(self, doc_id: Any) -> None:
+        with self._lock:
+            if doc_id in self._docno:
+                self._remove(doc_id)
+                self._maybe_compact()
+
+    def _remove(self, doc_id: Any) -> None:
+        docno = self._docno.pop(doc_id)
+        for fi, ids in enumerate(self._seq[docno]):
+            self._total_len[fi] -= len(ids)
+        self._seq[docno] = None
+        self._fingerprint.pop(doc_id, None)
+        self._dead += 1
+
+    def _maybe_compact(self) -> None:
+        """失效的 docno 超过一半时重排 docno、重建 postings。"""
+        if self._dead * 2 <= len(self._seq):
+            return
+        remap = {}
+        seq, doc_ids = [], []
+        for old, s in enumerate(self._seq):
+            if s is not None:
+                remap[old] = len(seq)
+                seq.append(s)
+                doc_ids.append(self._doc_ids[old])
+        self._seq, self._doc_ids = seq, doc_ids
+        self._docno = {d: i for i, d in enumerate(doc_ids)}
+        postings, tfs = [], []
+        for p, t in zip(self._postings, self._tfs):
+            keep = [(remap[d], tf) for d, tf in zip(p, t) if d in remap]
+            postings.append(array("I", (d for d, _ in keep)))
+            tfs.append(array("I", (tf for _, tf in keep)))
+        self._postings, self._tfs = postings, tfs
+        self._dead = 0
+
+    def update_from_records(self, records: Iterable[Dict[str, Any]], version: Optional[str] = None,
+                            id_field: str = "id") -> int:
+        """
+        用一批记录增量更新索引（新增/变更的才会重新分词），返回改动的篇数。
+        传入 version 且与上次相同则整批跳过——数据没变时每次 rerun 几乎零成本。
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return 0
+            changed = 0
+            seen = set()
+            for r in records:
+                doc_id = r.get(id_field)
+                seen.add(doc_id)
+                if self.add(doc_id, **{f: r.get(f) for f in self._fields}):
+                    changed += 1
+            for doc_id in [d for d in self._docno if d not in seen]:
+                self._remove(doc_id)
+                changed += 1
+            self._maybe_compact()
+            self.version = version
+            return changed
+
+    # ---------- 查询 ----------
+
+    def _expand(self, term: str) -> List[int]:
+        """前缀展开成 token id 列表，例如 hous → housing, house, houses。"""
+        if self._vocab_dirty:
+            self._vocab = sorted(self._tok_id)
+            self._vocab_dirty = False
+        out = []
+        i = bisect_left(self._vocab, term)
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            out.append(self._tok_id[self._vocab[i]])
+            i += 1
+        return out
+
+    def _live_docs(self, tids: List[int]) -> set:
+        docs = set()
+        for tid in tids:
+            docs.update(self._postings[tid])
+        return {d for d in docs if self._seq[d] is not None}
+
+    def _bm25(self, tids: List[int], docs: set, df: int) -> Dict[int, float]:
+        """tids 视为同一个词（前缀展开的多个 token 词频相加），只给 docs 里的文章打分。"""
+        n_docs = len(self._docno) or 1
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        avgs = [(t / n_docs) or 1.0 for t in self._total_len]
+        weights = [self.field_weights[f] for f in self._fields]
+        n_fields = len(self._fields)
+        tf_by_doc: Dict[int, List[int]] = {}
+        for t in tids:
+            for d, packed in zip(self._postings[t], self._tfs[t]):
+                if d in docs:
+                    acc = tf_by_doc.setdefault(d, [0] * n_fields)
+                    for fi in range(n_fields):
+                        acc[fi] += (packed >> (8 * fi)) & 0xFF
+        out = {}
+        for d, tfs in tf_by_doc.items():
+            score = 0.0
+            for fi, ids in enumerate(self._seq[d]):
+                tf = tfs[fi]
+                if tf:
+                    score += weights[fi] * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * len(ids) / avgs[fi]))
+            out[d] = idf * score
+        return out
+
+    def _has_phrase(self, docno: int, tids: List[int]) -> bool:
+        needle = array("I", tids).tobytes()
+        for ids in self._seq[docno]:
+            hay = ids.tobytes()
+            i = hay.find(needle)
+            while i != -1:
+                if i % ids.itemsize == 0:  # 必须按 token 边界对齐
+                    return True
+                i = hay.find(needle, i + 1)
+        return False
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """
+        返回按相关度排序的 [(doc_id, score)]。
+        所有词/短语都必须命中（AND）；不带引号的词按前缀匹配，例如 hous → housing。
+        """
+        clauses: List[Tuple[str, List[str]]] = []
+        for phrase, word in _QUERY_RE.findall(query or ""):
+            toks = tokenize(phrase if phrase else word)
+            if not toks:
+                continue
+            if phrase and len(toks) > 1:
+                clauses.append(("phrase", toks))
+            else:
+                clauses.extend(("term", [t]) for t in toks)
+        if not clauses:
+            return []
+
+        with self._lock:
+            # 每个子句先求命中的 docno 集合，从最小的开始求交集
+            resolved = []
+            for kind, toks in clauses:
+                if kind == "phrase":
+                    tids = [self._tok_id.get(t) for t in toks]
+                    if None in tids:
+                        return []
+                    docs = self._live_docs(tids[:1])
+                    for t in tids[1:]:
+                        docs &= self._live_docs([t])
+                else:
+                    tids = self._expand(toks[0])
+                    docs = self._live_docs(tids)
+                if not docs:
+                    return []
+                resolved.append((kind, tids, docs))
+            resolved.sort(key=lambda c: len(c[2]))
+
+            cand = set(resolved[0][2])
+            for kind, tids, docs in resolved:
+                cand &= docs
+                if kind == "phrase":
+                    cand = {d for d in cand if self._has_phrase(d, tids)}
+                if not cand:
+                    return []
+
+            scores = dict.fromkeys(cand, 0.0)
+            for kind, tids, docs in resolved:
+                if kind == "phrase":
+                    for t in set(tids):
+                        df = len(self._live_docs([t]))
+                        for d, s in self._bm25([t], cand, df).items():
+                            scores[d] += s
+                else:
+                    for d, s in self._bm25(tids, cand, len(docs)).items():
+                        scores[d] += s
+            ranked = sorted(((self._doc_ids[d], s) for d, s in scores.items()),
+                            key=lambda kv: kv[1], reverse=True)
+        return ranked[:limit] if limit else ranked
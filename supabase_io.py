@@ -1,15 +1,67 @@
 # supabase_io.py
 import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+from cache_versions import REVIEWS_WEEK, UNDATED, week_key
+from perf import current_span, payload_bytes, span, traced
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 load_dotenv()
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_KEY = os.environ["SUPABASE_SERVICE_ROLE"]  # 后端安全环境
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Supabase 客户端在第一次访问时才创建：导入本模块不需要环境变量、不加载 supabase 包，
+# 离线时也能用本地镜像（load_mirror_articles / mirror_version）
+_client: Optional["Client"] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> "Client":
+    """共享的 Supabase 客户端（线程安全的懒创建）；缺少环境变量时抛 RuntimeError。"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url = os.environ.get("SUPABASE_URL")
+                key = os.environ.get("SUPABASE_SERVICE_ROLE")  # 后端安全环境
+                if not url or not key:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE must be set")
+                from supabase import create_client
+                client = create_client(url, key)
+                _count_http_bytes(client)
+                _client = client
+    return _client
+
+
+def _record_response_bytes(response) -> None:
+    """httpx 响应钩子：把请求体和响应体的字节数记到当前 span 上（响应优先用 Content-Length）。"""
+    sp = current_span()
+    if sp is None:
+        return
+    sp.add_bytes(response.request.headers.get("Content-Length"))
+    n = response.headers.get("Content-Length")
+    sp.add_bytes(n if n is not None else len(response.read()))
+
+
+def _count_http_bytes(client: "Client") -> None:
+    # service role 客户端不会登录 / 换 token，postgrest 会话建一次后一直复用，钩子挂一次即可
+    hooks = getattr(getattr(client.postgrest, "session", None), "event_hooks", None)
+    if hooks is not None:
+        hooks["response"].append(_record_response_bytes)
+
+
+def __getattr__(name: str):
+    # 兼容旧写法 `from supabase_io import supabase`
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 表名
 ARTICLES_TABLE = "News_storage"   # 你的源表（图里这张）
@@ -18,17 +70,19 @@ REVIEWS_TABLE  = "news_reviews"   # 目标表（自定义，下面有建表示
 # 读取字段（与你表结构一致）
 ARTICLE_FIELDS = ["id","title","creator","link","pubdate","summary","row_no","Publisher","Category"]
 
+@traced("supabase.fetch_articles", bytes_of=payload_bytes)
 def fetch_articles(limit: int = 200) -> List[Dict[str, Any]]:
     """读取 News_storage 最新文章"""
-    res = (supabase.table(ARTICLES_TABLE)
+    res = (get_client().table(ARTICLES_TABLE)
            .select(",".join(ARTICLE_FIELDS))
            .order("pubdate", desc=True)
            .limit(limit)
            .execute())
     return res.data or []
 
+@traced("supabase.fetch_article_by_id")
 def fetch_article_by_id(article_id: int | str) -> Optional[Dict[str, Any]]:
-    res = (supabase.table(ARTICLES_TABLE)
+    res = (get_client().table(ARTICLES_TABLE)
            .select(",".join(ARTICLE_FIELDS))
            .eq("id", article_id)
            .limit(1)
@@ -36,6 +90,7 @@ def fetch_article_by_id(article_id: int | str) -> Optional[Dict[str, Any]]:
     rows = res.data or []
     return rows[0] if rows else None
 
+@traced("supabase.upsert_review")
 def upsert_review(review_row: Dict[str, Any]) -> Dict[str, Any]:
     """
     写入/更新一条审核结果。要求 REVIEWS_TABLE 上 id 唯一（primary key 或 unique），
@@ -44,5 +99,709 @@ def upsert_review(review_row: Dict[str, Any]) -> Dict[str, Any]:
     if not isinstance(review_row.get("reviewed_at", None), str):
         review_row["reviewed_at"] = datetime.utcnow().isoformat() + "Z"
 
-    res = supabase.table(REVIEWS_TABLE).upsert(review_row, on_conflict="id").execute()
+    res = get_client().table(REVIEWS_TABLE).upsert(review_row, on_conflict="id").execute()
     return (res.data or [{}])[0]
+
+
+# =========================
+# 增量同步：News_storage → 本地 SQLite 镜像
+# =========================
+# 按 (pubdate, id) 做 keyset 分页，首次全量，之后只拉高水位线之后的新行。
+# pubdate 为空的行单独按 id 分页（keyset 比较对 NULL 无效）。
+
+MIRROR_PATH = os.environ.get("URBANLAB_MIRROR_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "news_mirror.sqlite3"
+)
+SYNC_FIELDS = ARTICLE_FIELDS + ["maintext", "image_url"]  # 镜像里额外保存正文和图片地址
+SYNC_PAGE_SIZE = 500
+RECONCILE_INTERVAL = 3600  # 增量同步只拉新行；每隔这么久按 id 全表核对一次，补上修改和删除
+
+_mirror_lock = threading.Lock()
+
+
+def _open_mirror(path: str = MIRROR_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    cols = ", ".join(f'"{c}"' for c in SYNC_FIELDS if c != "id")
+    conn.execute(f'CREATE TABLE IF NOT EXISTS articles (id INTEGER PRIMARY KEY, {cols})')
+    conn.execute('CREATE INDEX IF NOT EXISTS articles_pubdate_id ON articles (pubdate, id)')
+    conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    return conn
+
+
+def _get_meta(conn: sqlite3.Connection, key: str, default: Any = None) -> Any:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: Any) -> None:
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+
+@traced("supabase.fetch_articles_page", bytes_of=payload_bytes)
+def fetch_articles_page(after: Optional[Tuple[str, int]] = None,
+                        page_size: int = SYNC_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """按 (pubdate, id) 升序读取 after 之后的一页（pubdate 非空的行）。"""
+    q = (get_client().table(ARTICLES_TABLE)
+         .select(",".join(SYNC_FIELDS))
+         .not_.is_("pubdate", "null"))
+    if after:
+        pub, aid = after
+        q = q.or_(f'pubdate.gt."{pub}",and(pubdate.eq."{pub}",id.gt.{int(aid)})')
+    res = q.order("pubdate").order("id").limit(page_size).execute()
+    return res.data or []
+
+
+@traced("supabase.fetch_undated_articles_page", bytes_of=payload_bytes)
+def fetch_undated_articles_page(after_id: Optional[int] = None,
+                                page_size: int = SYNC_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """按 id 升序读取 pubdate 为空的一页。"""
+    q = (get_client().table(ARTICLES_TABLE)
+         .select(",".join(SYNC_FIELDS))
+         .is_("pubdate", "null"))
+    if after_id is not None:
+        q = q.gt("id", int(after_id))
+    res = q.order("id").limit(page_size).execute()
+    return res.data or []
+
+
+def _bump_versions(conn: sqlite3.Connection, weeks) -> None:
+    """镜像内容变了：相关发布周的分区版本号和整体 revision 各加一（与行写在同一个事务里）。"""
+    for key in ["revision"] + [f"part:{wk}" for wk in weeks]:
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (key,))
+
+
+def _write_rows(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> None:
+    cols = ", ".join(f'"{c}"' for c in SYNC_FIELDS)
+    marks = ", ".join("?" for _ in SYNC_FIELDS)
+    # 覆盖已有行时，旧行所在的周也算变动（发布日期被改过的情况）
+    ids = [r.get("id") for r in rows]
+    old_weeks = {week_key(p) for (p,) in conn.execute(
+        f"SELECT pubdate FROM articles WHERE id IN ({','.join('?' for _ in ids)})", ids)} if ids else set()
+    conn.executemany(
+        f"INSERT OR REPLACE INTO articles ({cols}) VALUES ({marks})",
+        [tuple(r.get(c) for c in SYNC_FIELDS) for r in rows],
+    )
+    # 按发布周记分区版本号，缓存只需重建变动的周（cache_versions.ARTICLES_WEEK）
+    _bump_versions(conn, old_weeks | {week_key(r.get("pubdate")) for r in rows})
+
+
+def _delete_rows(conn: sqlite3.Connection, ids: List[int]) -> None:
+    if not ids:
+        return
+    marks = ",".join("?" for _ in ids)
+    weeks = {week_key(p) for (p,) in conn.execute(f"SELECT pubdate FROM articles WHERE id IN ({marks})", ids)}
+    conn.execute(f"DELETE FROM articles WHERE id IN ({marks})", ids)
+    _bump_versions(conn, weeks)
+
+
+def _reconcile(conn: sqlite3.Connection, page_size: int) -> Tuple[int, int]:
+    """
+    按 id 分页读全表，与镜像逐行比较：内容不同的行覆盖，镜像里有、上游已没有的 id 删除。
+    只有真正变了的行会写入（分区版本号也只动这些周）。返回 (更新行数, 删除行数)。
+    """
+    changed = deleted = 0
+    after: Optional[int] = None
+    while True:
+        rows = fetch_articles_by_id_page(after, page_size)
+        lo, hi = after, (rows[-1]["id"] if rows else None)
+        q, args = "SELECT * FROM articles", []
+        if lo is not None or hi is not None:
+            conds = []
+            if lo is not None:
+                conds.append("id > ?")
+                args.append(lo)
+            if hi is not None:
+                conds.append("id <= ?")
+                args.append(hi)
+            q += " WHERE " + " AND ".join(conds)
+        local = {r["id"]: tuple(r[c] for c in SYNC_FIELDS) for r in conn.execute(q, args)}
+        upstream_ids = {r["id"] for r in rows}
+        diff = [r for r in rows if local.get(r["id"]) != tuple(r.get(c) for c in SYNC_FIELDS)]
+        gone = [i for i in local if i not in upstream_ids]
+        if diff:
+            _write_rows(conn, diff)
+        _delete_rows(conn, gone)
+        conn.commit()
+        changed += len(diff)
+        deleted += len(gone)
+        if not rows:
+            break  # 最后一页之后的区间（id > after）也已在上面核对并删除
+        after = hi
+    return changed, deleted
+
+
+@traced("supabase.sync_articles")
+def sync_articles(path: str = MIRROR_PATH, page_size: int = SYNC_PAGE_SIZE,
+                  full: bool = False, reconcile_every: float = RECONCILE_INTERVAL) -> int:
+    """
+    把 News_storage 增量同步到本地镜像，返回本次写入（新增 + 修改）和删除的行数。
+    每页写完即提交并推进高水位线，中途失败下次会从断点继续。
+    高水位线只能发现新行；距上次核对超过 reconcile_every 秒（或 full=True）时再按 id 全表核对，
+    补上已有行的修改（审核改 Category、补正文、CSV 导入）和上游删除。
+    """
+    written = 0
+    with _mirror_lock:
+        conn = _open_mirror(path)
+        try:
+            hw = _get_meta(conn, "high_water")
+            first = hw is None and _get_meta(conn, "undated_high_water") is None
+            while True:
+                rows = fetch_articles_page(tuple(hw) if hw else None, page_size)
+                if not rows:
+                    break
+                _write_rows(conn, rows)
+                hw = [rows[-1]["pubdate"], rows[-1]["id"]]
+                _set_meta(conn, "high_water", hw)
+                conn.commit()
+                written += len(rows)
+                if len(rows) < page_size:
+                    break
+
+            undated_hw = _get_meta(conn, "undated_high_water")
+            while True:
+                rows = fetch_undated_articles_page(undated_hw, page_size)
+                if not rows:
+                    break
+                _write_rows(conn, rows)
+                undated_hw = rows[-1]["id"]
+                _set_meta(conn, "undated_high_water", undated_hw)
+                conn.commit()
+                written += len(rows)
+                if len(rows) < page_size:
+                    break
+
+            last = _get_meta(conn, "reconciled_at_ts")
+            if first and not full:
+                last = time.time()  # 刚从空镜像全量拉过，不必马上再核对
+                _set_meta(conn, "reconciled_at_ts", last)
+            if full or last is None or time.time() - last >= reconcile_every:
+                with span("supabase.reconcile_mirror") as sp:
+                    changed, deleted = _reconcile(conn, page_size)
+                    sp.set(changed=changed, deleted=deleted)
+                written += changed + deleted
+                _set_meta(conn, "reconciled_at_ts", time.time())
+
+            _set_meta(conn, "synced_at", datetime.utcnow().isoformat() + "Z")
+            conn.commit()
+        finally:
+            conn.close()
+    return written
+
+
+def patch_mirror_rows(updates: Dict[int, Dict[str, Any]], path: str = MIRROR_PATH) -> int:
+    """
+    写回 News_storage 的工具（类别预选、正文补全）在写成功后顺带改本地镜像：{id: {列: 值}}。
+    镜像里没有的 id 忽略（下次同步会拉到）；还没有镜像文件时什么也不做。返回改动的行数。
+    """
+    if not updates or not os.path.exists(path):
+        return 0
+    with _mirror_lock:
+        conn = _open_mirror(path)
+        try:
+            ids = list(updates)
+            marks = ",".join("?" for _ in ids)
+            weeks = {week_key(p) for (p,) in conn.execute(f"SELECT pubdate FROM articles WHERE id IN ({marks})", ids)}
+            n = 0
+            for article_id, cols in updates.items():
+                cols = {c: v for c, v in cols.items() if c in SYNC_FIELDS and c != "id"}
+                if cols:
+                    sets = ", ".join(f'"{c}" = ?' for c in cols)
+                    n += conn.execute(f"UPDATE articles SET {sets} WHERE id = ?",
+                                      [*cols.values(), article_id]).rowcount
+            if n:
+                _bump_versions(conn, weeks)
+            conn.commit()
+            return n
+        finally:
+            conn.close()
+
+
+def load_mirror_articles(path: str = MIRROR_PATH, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """从本地镜像读取文章（最新在前），不访问网络。"""
+    conn = _open_mirror(path)
+    try:
+        sql = "SELECT * FROM articles ORDER BY pubdate DESC, id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with span("mirror.load_articles") as sp:
+            rows = [dict(r) for r in conn.execute(sql)]
+            sp.set(rows=len(rows))
+        return rows
+    finally:
+        conn.close()
+
+
+def mirror_partition_versions(path: str = MIRROR_PATH) -> Dict[str, int]:
+    """镜像各发布周分区的版本号（{周一 ISO 日期或 'undated': 版本}），该周有行被写入就会加一。"""
+    conn = _open_mirror(path)
+    try:
+        return {k[5:]: int(v) for k, v in conn.execute("SELECT key, value FROM meta WHERE key LIKE 'part:%'")}
+    finally:
+        conn.close()
+
+
+def review_week_versions(path: str = MIRROR_PATH) -> Dict[str, int]:
+    """news_reviews 各周（start_of_week(publish_date)）的版本号：{周一 ISO 日期: 版本}，该周有审核写入就会加一。"""
+    conn = _open_mirror(path)
+    try:
+        prefix = f"{REVIEWS_WEEK}:"
+        return {k[len(prefix):]: int(v) for k, v in
+                conn.execute("SELECT key, value FROM meta WHERE key LIKE ?", (prefix + "%",))}
+    finally:
+        conn.close()
+
+
+def bump_review_weeks(weeks, path: str = MIRROR_PATH) -> None:
+    """
+    让这些周的审核缓存失效。版本号记在镜像的 meta 表里，同一台机器上的其它进程
+    （另一个看板实例、weekly_cli、启动时重放 journal）写入的审核也能让看板的缓存失效。
+    """
+    weeks = sorted({w for w in weeks if w and w != UNDATED})
+    if not weeks:
+        return
+    with _mirror_lock:
+        conn = _open_mirror(path)
+        try:
+            for wk in weeks:
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, '1') "
+                             "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                             (f"{REVIEWS_WEEK}:{wk}",))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def mirror_version(path: str = MIRROR_PATH) -> str:
+    """镜像的版本标识（写入 revision + 行数 + 高水位线），内容变了它就会变，可作为缓存 key。"""
+    conn = _open_mirror(path)
+    try:
+        n = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        hw = _get_meta(conn, "high_water")
+        undated_hw = _get_meta(conn, "undated_high_water")
+        revision = _get_meta(conn, "revision", 0)
+        return f"{revision}:{n}:{hw}:{undated_hw}"
+    finally:
+        conn.close()
+
+
+# =========================
+# 批量写入审核结果 + 写后队列（write-behind）
+# =========================
+
+REVIEW_CHUNK_SIZE = 200
+REVIEW_JOURNAL_PATH = os.environ.get("URBANLAB_REVIEW_JOURNAL") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "review_journal.jsonl"
+)
+# 不带 id 的审核由客户端生成幂等键，按它 upsert，重发同一批（journal 重放、超时重试）不会多出行。
+# 需要表上有这一列并且唯一：alter table news_reviews add column client_key text unique;
+REVIEW_KEY = "client_key"
+
+_review_key_ok = True  # 表上还没有 client_key（或没有唯一约束）时退回直接 insert
+
+
+def upsert_reviews(review_rows: List[Dict[str, Any]], chunk_size: int = REVIEW_CHUNK_SIZE) -> List[Dict[str, Any]]:
+    """
+    批量写入审核结果，每 chunk_size 行一次请求。
+    带 id 的行按 id upsert（覆盖同一篇的旧审核）；不带 id 的行按 REVIEW_KEY upsert，
+    没有给键的行在这里生成一个（调用方重试时要带上同一个键才能去重，写后队列用 journal id）。
+    写完（包括中途失败）让涉及的周的审核缓存失效（bump_review_weeks）。
+    """
+    now = datetime.utcnow().isoformat() + "Z"
+    with_id, without_id = [], []
+    for r in review_rows:
+        r = dict(r)
+        if not isinstance(r.get("reviewed_at", None), str):
+            r["reviewed_at"] = now
+        if r.get("id") is not None:
+            with_id.append(r)
+        else:
+            r.setdefault(REVIEW_KEY, uuid.uuid4().hex)
+            without_id.append(r)
+
+    out: List[Dict[str, Any]] = []
+    with span("supabase.upsert_reviews", rows=len(review_rows)) as sp:
+        try:
+            _send_reviews(with_id, without_id, chunk_size, out)
+        finally:
+            bump_review_weeks(week_key(r.get("publish_date")) for r in review_rows)
+        if not sp.bytes:
+            sp.add_bytes(payload_bytes(review_rows))
+    return out
+
+
+def _send_reviews(with_id: List[Dict[str, Any]], without_id: List[Dict[str, Any]], chunk_size: int,
+                  out: List[Dict[str, Any]]) -> None:
+    global _review_key_ok
+    for i in range(0, len(with_id), chunk_size):
+        res = get_client().table(REVIEWS_TABLE).upsert(with_id[i:i + chunk_size], on_conflict="id").execute()
+        out.extend(res.data or [])
+    for i in range(0, len(without_id), chunk_size):
+        batch = without_id[i:i + chunk_size]
+        if _review_key_ok:
+            try:
+                res = get_client().table(REVIEWS_TABLE).upsert(batch, on_conflict=REVIEW_KEY).execute()
+                out.extend(res.data or [])
+                continue
+            except Exception as e:
+                # 没有这一列（PGRST204 / 42703）或没有唯一约束（42P10）；其它错误照常抛出
+                if getattr(e, "code", None) not in ("PGRST204", "42703", "42P10"):
+                    raise
+                _review_key_ok = False
+        batch = [{k: v for k, v in r.items() if k != REVIEW_KEY} for r in batch]
+        res = get_client().table(REVIEWS_TABLE).insert(batch).execute()
+        out.extend(res.data or [])
+
+
+class ReviewWriteBehind:
+    """
+    审核结果写后队列：enqueue() 先写本地 journal 立即返回，后台线程按批 upsert_reviews。
+    journal 为 JSONL（{"op": "add", "jid", "row"} / {"op": "done", "jids"}），
+    进程崩溃后重启会把没有 done 的记录重新放回队列；row 里带着 jid 作为 REVIEW_KEY，重发不会重复写入。
+    """
+
+    def __init__(self, journal_path: str = REVIEW_JOURNAL_PATH, chunk_size: int = REVIEW_CHUNK_SIZE,
+                 flush_interval: float = 2.0, writer=None, on_flush=None):
+        self.journal_path = journal_path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self._writer = writer or upsert_reviews
+        self._on_flush = on_flush  # 一批写入成功后回调 on_flush(rows)，用于让相关缓存失效
+        self._pending: List[Tuple[str, Dict[str, Any]]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # 后台线程与手动 flush 不会重复发送同一批
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._seq = 0
+        self.flushed = 0
+        self.last_flush: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._replay()
+
+    # ---------- journal ----------
+
+    def _replay(self) -> None:
+        added: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时可能留下半行
+                    if rec.get("op") == "add":
+                        added[rec["jid"]] = rec["row"]
+                        rec["row"].setdefault(REVIEW_KEY, rec["jid"])  # 旧 journal 里的记录没有键
+                    elif rec.get("op") == "done":
+                        for jid in rec.get("jids", []):
+                            added.pop(jid, None)
+        except OSError:
+            pass
+        self._pending = list(added.items())
+        self._compact()
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self) -> None:
+        """只保留仍未发送的记录。"""
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for jid, row in self._pending:
+                f.write(json.dumps({"op": "add", "jid": jid, "row": row}, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp, self.journal_path)
+
+    # ---------- 队列 ----------
+
+    def start(self) -> "ReviewWriteBehind":
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = threading.Thread(target=self._run, name="review-write-behind", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, flush: bool = True) -> None:
+        if flush:
+            self.flush()
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def enqueue(self, review_row: Dict[str, Any]) -> str:
+        """写入 journal 后立即返回 journal id；真正的网络写入在后台完成。"""
+        row = dict(review_row)
+        if not isinstance(row.get("reviewed_at", None), str):
+            row["reviewed_at"] = datetime.utcnow().isoformat() + "Z"
+        with self._cond:
+            self._seq += 1
+            jid = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}-{self._seq}"
+            row.setdefault(REVIEW_KEY, jid)  # 重放时按同一个键 upsert，已写过的不会重复
+            self._append({"op": "add", "jid": jid, "row": row})
+            self._pending.append((jid, row))
+            if len(self._pending) >= self.chunk_size:
+                self._cond.notify_all()
+        return jid
+
+    def flush(self) -> bool:
+        """同步发送当前所有待写记录；全部成功返回 True。"""
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.chunk_size]
+                if not batch:
+                    return True
+                if not self._send(batch):
+                    return False
+
+    def _send(self, batch: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        try:
+            self._writer([row for _, row in batch], chunk_size=self.chunk_size)
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+        jids = {jid for jid, _ in batch}
+        with self._cond:
+            self._pending = [p for p in self._pending if p[0] not in jids]
+            self._append({"op": "done", "jids": sorted(jids)})
+            if not self._pending:
+                self._compact()
+            self.flushed += len(batch)
+            self.last_flush = datetime.utcnow().isoformat() + "Z"
+            self.last_error = None
+        if self._on_flush is not None:
+            try:
+                self._on_flush([row for _, row in batch])
+            except Exception:
+                pass  # 回调失败不影响已经写入的结果
+        return True
+
+    def _run(self) -> None:
+        backoff = self.flush_interval
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=backoff)
+                if self._stop:
+                    return
+            ok = self.flush()
+            # 失败时逐步拉长间隔，最长 60 秒；成功后恢复
+            backoff = self.flush_interval if ok else min(60.0, backoff * 2)
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "flushed": self.flushed,
+            "last_flush": self.last_flush,
+            "last_error": self.last_error,
+            "running": bool(self._thread and self._thread.is_alive()),
+        }
+
+
+# =========================
+# 本地类别预选（pillar_classifier）用到的读写
+# =========================
+
+@traced("supabase.fetch_reviews_page", bytes_of=payload_bytes)
+def fetch_reviews_page(after_id: Optional[int] = None, page_size: int = SYNC_PAGE_SIZE,
+                       fields: str = "id,title,summary,decision,categories") -> List[Dict[str, Any]]:
+    """按 id 做 keyset 分页读取 news_reviews。"""
+    q = get_client().table(REVIEWS_TABLE).select(fields)
+    if after_id is not None:
+        q = q.gt("id", after_id)
+    res = q.order("id").limit(page_size).execute()
+    return res.data or []
+
+
+@traced("supabase.update_article_categories")
+def update_article_categories(updates: Dict[int, str], chunk_size: int = REVIEW_CHUNK_SIZE) -> int:
+    """
+    批量写回 News_storage.Category（{id: "A; B"}）。
+    相同取值的文章合并成一个 in.(...) 请求，四个类别的组合很少，请求数远小于文章数。
+    写成功的行同时改进本地镜像（增量同步只拉新行，看不到这类修改）。
+    """
+    by_value: Dict[str, List[int]] = {}
+    for article_id, value in updates.items():
+        by_value.setdefault(value, []).append(article_id)
+    done: Dict[int, Dict[str, Any]] = {}
+    try:
+        for value, ids in by_value.items():
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                get_client().table(ARTICLES_TABLE).update({"Category": value}).in_("id", chunk).execute()
+                done.update((article_id, {"Category": value}) for article_id in chunk)
+    finally:
+        patch_mirror_rows(done)
+    return len(done)
+
+
+# =========================
+# 正文补全（maintext_extract）用到的读写
+# =========================
+
+TEXT_CHUNK_SIZE = 50  # 正文一篇上万字符，每批行数比审核结果少
+
+_text_upsert_ok = True  # 表上有 NOT NULL 且无默认值的列时部分列 upsert 会被拒，之后改走逐行 PATCH
+
+
+@traced("supabase.fetch_missing_maintext_page", bytes_of=payload_bytes)
+def fetch_missing_maintext_page(after_id: Optional[int] = None,
+                                page_size: int = SYNC_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """按 id 做 keyset 分页，读取 maintext 为空（NULL 或空串）的文章。"""
+    q = (get_client().table(ARTICLES_TABLE)
+         .select("id,link,image_url")
+         .or_("maintext.is.null,maintext.eq."))
+    if after_id is not None:
+        q = q.gt("id", int(after_id))
+    res = q.order("id").limit(page_size).execute()
+    return res.data or []
+
+
+@traced("supabase.fetch_missing_maintext_by_ids", bytes_of=payload_bytes)
+def fetch_missing_maintext_by_ids(ids: List[int], chunk_size: int = SYNC_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """按 id 读取指定的行里 maintext 仍为空的那些（按 id 升序）。"""
+    out: List[Dict[str, Any]] = []
+    ids = sorted(int(x) for x in ids)
+    for i in range(0, len(ids), chunk_size):
+        res = (get_client().table(ARTICLES_TABLE)
+               .select("id,link,image_url")
+               .or_("maintext.is.null,maintext.eq.")
+               .in_("id", ids[i:i + chunk_size])
+               .order("id")
+               .execute())
+        out.extend(res.data or [])
+    return out
+
+
+def update_article_texts(rows: List[Dict[str, Any]], chunk_size: int = TEXT_CHUNK_SIZE) -> int:
+    """
+    批量写回 News_storage 的 maintext（和 image_url）：rows 为 [{id, maintext, image_url?}]。
+    每 chunk_size 行一次按 id 的 upsert，只带这几列，其它列不动；
+    PostgREST 要求一批里各行的列相同，所以带 image_url 的行和不带的分开发。
+    写成功的行同时改进本地镜像。
+    """
+    global _text_upsert_ok
+    groups: Dict[bool, List[Dict[str, Any]]] = {True: [], False: []}
+    for r in rows:
+        has_img = bool(r.get("image_url"))
+        row = {"id": r["id"], "maintext": r.get("maintext") or ""}
+        if has_img:
+            row["image_url"] = r["image_url"]
+        groups[has_img].append(row)
+
+    done: Dict[int, Dict[str, Any]] = {}
+    with span("supabase.update_article_texts", rows=len(rows)) as sp:
+        try:
+            for batch_rows in groups.values():
+                for i in range(0, len(batch_rows), chunk_size):
+                    batch = batch_rows[i:i + chunk_size]
+                    if _text_upsert_ok:
+                        try:
+                            get_client().table(ARTICLES_TABLE).upsert(batch, on_conflict="id").execute()
+                            done.update((row["id"], row) for row in batch)
+                            continue
+                        except Exception as e:
+                            if getattr(e, "code", None) != "23502":  # not_null_violation 以外的错误照常抛出
+                                raise
+                            _text_upsert_ok = False
+                    for row in batch:
+                        patch = {k: v for k, v in row.items() if k != "id"}
+                        get_client().table(ARTICLES_TABLE).update(patch).eq("id", row["id"]).execute()
+                        done[row["id"]] = row
+        finally:
+            patch_mirror_rows(done)
+        if not sp.bytes:
+            sp.add_bytes(payload_bytes(rows))
+    return len(done)
+
+
+# =========================
+# CSV 批量导入 / 导出（csv_bulk）用到的读写
+# =========================
+
+LINK_LOOKUP_CHUNK = 40  # in.(...) 放在 URL 里，链接较长，每次少查一些以免 URL 超长
+ID_SEQUENCE_RPC = "reset_news_storage_id_seq"
+# PostgREST 不能直接调 setval；需要在库里建一次这个函数（README 里有同样的 SQL）
+ID_SEQUENCE_SQL = (
+    "create or replace function reset_news_storage_id_seq() returns bigint language sql security definer as $$ "
+    "select setval(pg_get_serial_sequence('\"News_storage\"', 'id'), "
+    "coalesce((select max(id) from \"News_storage\"), 0) + 1, false) $$;"
+)
+
+
+@traced("supabase.fetch_articles_by_id_page", bytes_of=payload_bytes)
+def fetch_articles_by_id_page(after_id: Optional[int] = None, page_size: int = SYNC_PAGE_SIZE,
+                              fields: List[str] = SYNC_FIELDS) -> List[Dict[str, Any]]:
+    """按 id 做 keyset 分页读取 News_storage 的全部行（含 pubdate 为空的）。"""
+    q = get_client().table(ARTICLES_TABLE).select(",".join(fields))
+    if after_id is not None:
+        q = q.gt("id", int(after_id))
+    res = q.order("id").limit(page_size).execute()
+    return res.data or []
+
+
+@traced("supabase.fetch_article_ids_by_link")
+def fetch_article_ids_by_link(links: List[str], chunk_size: int = LINK_LOOKUP_CHUNK) -> Dict[str, int]:
+    """link → 表里已有行的 id（同一 link 有多行时取最小的 id）。"""
+    out: Dict[str, int] = {}
+    for i in range(0, len(links), chunk_size):
+        quoted = ",".join('"' + l.replace('"', '\\"') + '"' for l in links[i:i + chunk_size])
+        res = (get_client().table(ARTICLES_TABLE)
+               .select("id,link")
+               .filter("link", "in", f"({quoted})")
+               .order("id")
+               .execute())
+        for r in res.data or []:
+            out.setdefault(r["link"], r["id"])
+    return out
+
+
+def upsert_articles(rows: List[Dict[str, Any]], chunk_size: int = SYNC_PAGE_SIZE) -> int:
+    """
+    批量写入 News_storage，每 chunk_size 行一次请求：带 id 的行按 id upsert，不带 id 的行 insert（id 由数据库生成）。
+    返回写入的行数。
+    """
+    with_id = [r for r in rows if r.get("id") is not None]
+    without_id = [{k: v for k, v in r.items() if k != "id"} for r in rows if r.get("id") is None]
+    with span("supabase.upsert_articles", rows=len(rows)) as sp:
+        for i in range(0, len(with_id), chunk_size):
+            get_client().table(ARTICLES_TABLE).upsert(with_id[i:i + chunk_size], on_conflict="id").execute()
+        for i in range(0, len(without_id), chunk_size):
+            get_client().table(ARTICLES_TABLE).insert(without_id[i:i + chunk_size]).execute()
+        if not sp.bytes:
+            sp.add_bytes(payload_bytes(rows))
+    return len(rows)
+
+
+def reset_article_id_sequence() -> int:
+    """
+    按显式 id 恢复过行之后，把 News_storage.id 的序列推到 max(id) 之后，否则之后的 insert 会撞已有 id。
+    调用库里的 reset_news_storage_id_seq()（建法见 ID_SEQUENCE_SQL），返回序列的下一个值。
+    """
+    res = get_client().rpc(ID_SEQUENCE_RPC, {}).execute()
+    return res.data
+
+
+def main(argv=None) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="Sync News_storage into the local SQLite mirror.")
+    ap.add_argument("command", choices=["sync"])
+    ap.add_argument("--full", action="store_true", help="按 id 核对全表，补上已有行的修改和上游删除")
+    ap.add_argument("--page-size", type=int, default=SYNC_PAGE_SIZE)
+    args = ap.parse_args(argv)
+    n = sync_articles(page_size=args.page_size, full=args.full)
+    print(f"synced {n} rows -> {MIRROR_PATH} (version {mirror_version()})")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
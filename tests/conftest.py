@@ -0,0 +1,6 @@
+# tests/conftest.py — 让测试能直接 import 仓库根目录下的模块和 bench 夹具
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
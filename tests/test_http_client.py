@@ -0,0 +1,140 @@
+# tests/test_http_client.py — HttpClient 对本地 http.server 的测试：重试、POST 不重试、host 并发上限、HostStats
+
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import HttpClient
+
+SLOW_S = 0.1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    /flaky/<k>/<tag>   前 k 次返回 503，之后 200（按 方法+路径 计数）
+    /slow              睡 SLOW_S 秒，记录同时在处理的请求数
+    /status/<code>     直接返回该状态码
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code: int, body: bytes = b"ok"):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        srv = self.server
+        with srv.lock:
+            srv.hits[(self.command, self.path)] += 1
+            n = srv.hits[(self.command, self.path)]
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "flaky":
+            self._reply(503 if n <= int(parts[1]) else 200)
+        elif parts[0] == "slow":
+            with srv.lock:
+                srv.in_flight += 1
+                srv.max_in_flight = max(srv.max_in_flight, srv.in_flight)
+            time.sleep(SLOW_S)
+            with srv.lock:
+                srv.in_flight -= 1
+            self._reply(200)
+        elif parts[0] == "status":
+            self._reply(int(parts[1]))
+        else:
+            self._reply(404)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._handle()
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.lock = threading.Lock()
+    srv.hits = Counter()
+    srv.in_flight = srv.max_in_flight = 0
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}"
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client():
+    c = HttpClient(backoff=0)
+    yield c
+    c.close()
+
+
+def test_get_retried_on_503(server, client):
+    resp = client.get(f"{server.url}/flaky/2/get", timeout=5)
+    assert resp.status_code == 200
+    assert server.hits[("GET", "/flaky/2/get")] == 3
+
+    # 超过重试次数时返回最后一次的 503，不抛异常
+    resp = client.get(f"{server.url}/flaky/9/give-up", retries=1, timeout=5)
+    assert resp.status_code == 503
+    assert server.hits[("GET", "/flaky/9/give-up")] == 2
+
+
+def test_post_not_retried(server, client):
+    resp = client.post(f"{server.url}/flaky/1/post", json={"a": 1}, timeout=5)
+    assert resp.status_code == 503
+    assert server.hits[("POST", "/flaky/1/post")] == 1
+
+
+def test_per_host_limit(server):
+    client = HttpClient(backoff=0, per_host=2)
+    try:
+        threads = [threading.Thread(target=client.get, args=(f"{server.url}/slow",), kwargs={"timeout": 5})
+                   for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        client.close()
+    assert server.hits[("GET", "/slow")] == 6
+    assert server.max_in_flight == 2
+
+
+def test_host_stats(server, client):
+    client.get(f"{server.url}/slow", timeout=5)
+    client.get(f"{server.url}/status/200", timeout=5)
+    client.get(f"{server.url}/status/404", timeout=5)
+
+    st = client.stats()[client.host_of(server.url)]
+    assert st["requests"] == 3
+    assert st["errors"] == 1
+    assert st["statuses"] == {200: 2, 404: 1}
+    assert st["last_error"] == "HTTP 404"
+    assert st["max_ms"] >= SLOW_S * 1000
+    assert 0 < st["p50_ms"] <= st["p95_ms"] <= st["max_ms"]
+
+    # 连接失败也算一次请求 + 一次错误
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{s.getsockname()[1]}"
+    with pytest.raises(requests.ConnectionError):
+        client.get(f"{dead}/x", retries=0, timeout=2)
+    st = client.stats()[client.host_of(dead)]
+    assert st["requests"] == 1 and st["errors"] == 1
+    assert st["last_error"].startswith("ConnectionError")
+
+    client.close()
+    assert client.stats() == {}
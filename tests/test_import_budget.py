@@ -0,0 +1,18 @@
+# tests/test_import_budget.py — 看板冷启动导入预算（bench/import_budget 的 pytest 版）
+
+import statistics
+
+from bench.import_budget import DASHBOARD_MODULES, DEFAULT_BUDGET_MS, DEFERRED, probe
+
+
+def test_dashboard_modules_follow_app_imports():
+    # 由 app.py 的导入推出来，后加的模块也在预算里
+    assert {"supabase_io", "vector_index", "cache_versions", "perf"} <= set(DASHBOARD_MODULES)
+
+
+def test_import_budget():
+    runs = [probe(DASHBOARD_MODULES) for _ in range(3)]  # 取中位数，单次冷启动抖动较大
+    ms = statistics.median(r["ms"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    assert loaded == [], f"imported at startup (should be deferred: {DEFERRED})"
+    assert ms < DEFAULT_BUDGET_MS, f"{ms:.0f} ms > budget {DEFAULT_BUDGET_MS:.0f} ms"
@@ -0,0 +1,121 @@
+# tests/test_rss_ingest.py — rss_ingest 对本地夹具 feed 的端到端测试（bench/fixture_server 的 /feed.xml）
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bench.fixture_server import FixtureServer
+from rss_ingest import FeedState, commit_feed_state, dedup_entries, fetch_feed, ingest_feeds_async
+from supabase_io import ARTICLE_FIELDS
+
+
+@pytest.fixture
+def server():
+    srv = FixtureServer(body_kb=1).start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def feed(server):
+    return {"name": "fixture", "url": f"{server.url}/feed.xml", "publisher": "fixture.test", "max_age_days": 3}
+
+
+def _fetch(feed, state):
+    return asyncio.run(fetch_feed(feed, state, asyncio.Semaphore(1)))
+
+
+def test_200_parses_and_normalizes(server, feed, tmp_path):
+    state = FeedState(str(tmp_path / "state.json"))
+    res = _fetch(feed, state)
+
+    assert res["status"] == 200 and res["error"] is None
+    assert res["url"] == feed["url"]
+    assert res["etag"] == server.feed_etag
+    assert res["last_modified"] == server.feed_last_modified
+    assert [r["link"] for r in res["entries"]] == [f"{server.url}/article/1.html", f"{server.url}/article/2.html"]
+
+    row = res["entries"][0]
+    assert set(row) == set(ARTICLE_FIELDS)
+    assert row["id"] is None and row["row_no"] is None
+    assert row["title"] == "Fixture story one"
+    assert row["creator"] == "Jane Doe"
+    assert row["summary"] == "Zoning board approves plan."  # 标签去掉、实体解码、空白合并
+    assert row["Publisher"] == "fixture.test"
+    assert row["Category"] == ""
+    expected = (datetime.now(timezone.utc) - timedelta(hours=2)).strftime("%Y-%m-%d")
+    assert row["pubdate"] == expected
+
+
+def test_fetch_does_not_commit_validators(feed, tmp_path):
+    state = FeedState(str(tmp_path / "state.json"))
+    _fetch(feed, state)
+    assert state.data == {}
+    assert state.headers_for(feed["url"]) == {}
+
+
+def test_304_when_validators_match(server, feed, tmp_path):
+    state = FeedState(str(tmp_path / "state.json"))
+    state.commit(_fetch(feed, state))
+
+    res = _fetch(feed, state)
+    assert res["status"] == 304
+    assert res["entries"] == [] and res["published"] == []
+    assert server.hits["feed_304"] == 1
+
+    # 只有 Last-Modified 也能命中
+    state.update(feed["url"], None, server.feed_last_modified)
+    assert _fetch(feed, state)["status"] == 304
+
+    # feed 变了（新 ETag）就重新解析
+    server.feed_etag = '"fixture-v2"'
+    state.update(feed["url"], '"fixture-v1"', None)
+    res = _fetch(feed, state)
+    assert res["status"] == 200 and len(res["entries"]) == 2
+
+
+def test_feed_state_persists(server, feed, tmp_path):
+    path = str(tmp_path / "state.json")
+    results = asyncio.run(ingest_feeds_async([feed], path))
+    assert FeedState(path).data == {}  # 抓取本身不落盘
+
+    commit_feed_state(results, path)
+    reloaded = FeedState(path)
+    assert reloaded.headers_for(feed["url"]) == {
+        "If-None-Match": server.feed_etag,
+        "If-Modified-Since": server.feed_last_modified,
+    }
+    assert _fetch(feed, reloaded)["status"] == 304
+
+
+def test_failed_fetch_is_not_committed(feed, tmp_path):
+    state = FeedState(str(tmp_path / "state.json"))
+    res = _fetch(dict(feed, url=feed["url"].replace("/feed.xml", "/missing.xml")), state)
+    assert res["error"] and res["status"] == 404
+    state.commit(res)
+    assert state.data == {}
+
+
+def test_max_age_days_cutoff(server, feed, tmp_path):
+    now = datetime.now(timezone.utc)
+    server.feed_items.append({"title": "From the future", "link": f"{server.url}/article/9.html", "author": "",
+                              "published": now + timedelta(days=2), "summary": ""})
+    state = FeedState(str(tmp_path / "state.json"))
+
+    res = _fetch(feed, state)
+    links = {r["link"] for r in res["entries"]}
+    assert f"{server.url}/article/3.html" not in links  # 10 天前
+    assert f"{server.url}/article/9.html" not in links  # 发布时间在未来
+    assert len(res["published"]) == 4  # 调度器估算频率用的发布时间不受过滤影响
+
+    res = _fetch(dict(feed, max_age_days=None), state)
+    assert len(res["entries"]) == 4
+
+
+def test_dedup_entries_merges_feeds(server, feed, tmp_path):
+    state = FeedState(str(tmp_path / "state.json"))
+    a = _fetch(feed, state)
+    b = _fetch(dict(feed, name="fixture-copy"), state)
+    rows = dedup_entries([a, b])
+    assert [r["link"] for r in rows] == [r["link"] for r in a["entries"]]
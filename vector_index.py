@@ -0,0 +1,456 @@
+# vector_index.py — 本地向量索引（语义搜索；以后 “Ask the Urban Lab” 的 RAG 检索也用它）
+# 摘要 / 正文按词切成有重叠的块，每块连同标题编码成向量，存进磁盘上的 memmap 矩阵；
+# 块数少时精确搜索（一次矩阵乘），多了自动建 IVF（球面 k-means 分桶，查询只扫最近的几个桶）。
+# 按文章指纹增量更新，重启后直接复用磁盘上的向量，不重新编码。
+#
+#   python vector_index.py build                                   # 从本地镜像建索引 / 增量更新
+#   python vector_index.py query "affordable housing near transit" -k 5
+
+import argparse
+import importlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+
+VECTOR_DIR = os.environ.get("URBANLAB_VECTOR_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "vectors"
+)
+EMBED_DIM = 384
+CHUNK_WORDS = 120          # 每块多少个词
+CHUNK_OVERLAP = 30         # 相邻块重叠的词数，句子被切断时两边都还能搜到
+FIELDS = ("title", "summary", "maintext")  # 只有摘要和正文都为空时才单独给标题建一块
+EMBED_BATCH = 256          # 每批编码多少块
+INITIAL_CAPACITY = 1024    # memmap 初始行数，不够时翻倍
+IVF_MIN_ROWS = 2048        # 有效块数达到这个量才建 IVF，之下精确搜索更快也更准
+IVF_NPROBE = 16            # 查询时扫描最近的几个桶
+IVF_KMEANS_ITERS = 8
+IVF_SAMPLE_PER_LIST = 64   # 训练 k-means 时每个桶抽多少样本
+SEARCH_TOP_K = 50          # 看板语义搜索最多列出多少篇
+
+_WORD_RE = re.compile(r"\S+")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from had has have he her his i in is it its more new not of on "
+    "or our said she than that the their they this to was we were which who will with would you".split()
+)
+
+
+def chunk_spans(text: str, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """按空白切词后每 size 个词一块，返回各块的 (起始字符, 结束字符)；相邻块重叠 overlap 个词。"""
+    words = [(m.start(), m.end()) for m in _WORD_RE.finditer(text or "")]
+    out: List[Tuple[int, int]] = []
+    step = max(1, size - overlap)
+    for i in range(0, len(words), step):
+        seg = words[i:i + size]
+        out.append((seg[0][0], seg[-1][1]))
+        if i + size >= len(words):
+            break
+    return out
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    np.divide(mat, norms, out=mat, where=norms > 0)
+    return mat
+
+
+class HashingEmbedder:
+    """
+    默认的本地编码器：词和相邻词对做带符号的特征哈希，次线性词频，L2 归一化。
+    不需要模型文件、不联网；本质上是词面相似度，需要真正的语义向量时用 URBANLAB_EMBEDDER 换掉。
+    """
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            toks = [t for t in tokenize(text) if t not in STOPWORDS]
+            if not toks:
+                continue
+            feats = toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]
+            h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.uint32, count=len(feats))
+            sign = np.where(h & np.uint32(0x80000000), -1.0, 1.0)  # 最高位决定符号，低位决定维度
+            row = np.bincount((h % np.uint32(self.dim)).astype(np.intp), weights=sign, minlength=self.dim)
+            out[i] = np.sign(row) * np.log1p(np.abs(row))
+        return _normalize(out)
+
+
+def load_embedder(spec: Optional[str] = None):
+    """
+    spec（或环境变量 URBANLAB_EMBEDDER）为 "模块:工厂函数"，工厂返回的对象需要有 name、dim，
+    并且可调用 embedder(texts) -> (len(texts), dim) 的数组；不设置时用 HashingEmbedder。
+    """
+    spec = spec or os.environ.get("URBANLAB_EMBEDDER")
+    if not spec:
+        return HashingEmbedder()
+    module, _, factory = spec.partition(":")
+    return getattr(importlib.import_module(module), factory or "embedder")()
+
+
+class VectorIndex:
+    """
+    磁盘布局（path 目录下；path=None 时只在内存里）：
+      vectors.f32   memmap 矩阵（capacity × dim，float32，已归一化），前 _n 行有效
+      meta.npz      每行对应的文章 / 字段 / 字符区间、是否仍有效、IVF 分桶，以及各文章的指纹
+    文章更新或删除后旧行只标记作废，作废过半时原地压缩；IVF 在有效块数翻倍后重新训练。
+    """
+
+    def __init__(self, path: Optional[str] = VECTOR_DIR, embedder=None):
+        self.path = path
+        self.embedder = embedder or load_embedder()
+        self.dim = int(self.embedder.dim)
+        self._lock = threading.RLock()
+        self._reset()
+        if path:
+            self._load()
+
+    def _reset(self) -> None:
+        self.version: Optional[str] = None
+        self._n = 0
+        self._n_alive = 0
+        self._capacity = 0
+        self._mat: np.ndarray = np.zeros((0, self.dim), dtype=np.float32)
+        self._row_doc = np.zeros(0, dtype=np.int64)
+        self._row_field = np.zeros(0, dtype=np.int8)
+        self._row_span = np.zeros((0, 2), dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_rows = 0
+        self._docs: Dict[int, int] = {}            # doc_id → 指纹
+        self._doc_rows: Dict[int, List[int]] = {}  # doc_id → 行号
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---------- 存储 ----------
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.npz")
+
+    def _grow(self, need: int) -> None:
+        """保证至少能放 need 行；memmap 按倍数扩容（写到新文件再替换）。"""
+        if need <= self._capacity:
+            return
+        cap = max(INITIAL_CAPACITY, self._capacity * 2, need)
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = self._vectors_path + ".tmp"
+            new = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(cap, self.dim))
+            new[:self._n] = self._mat[:self._n]
+            new.flush()
+            del new
+            self._mat = np.zeros((0, self.dim), dtype=np.float32)  # 先释放旧映射，Windows 上才能替换文件
+            os.replace(tmp, self._vectors_path)
+            self._mat = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(cap, self.dim))
+        else:
+            mat = np.zeros((cap, self.dim), dtype=np.float32)
+            mat[:self._n] = self._mat[:self._n]
+            self._mat = mat
+
+        def grown(arr: np.ndarray, fill=0) -> np.ndarray:
+            out = np.full((cap,) + arr.shape[1:], fill, dtype=arr.dtype)
+            out[:self._n] = arr[:self._n]
+            return out
+
+        self._row_doc = grown(self._row_doc)
+        self._row_field = grown(self._row_field)
+        self._row_span = grown(self._row_span)
+        self._alive = grown(self._alive, False)
+        self._assign = grown(self._assign, -1)
+        self._capacity = cap
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            if isinstance(self._mat, np.memmap):
+                self._mat.flush()
+            n = self._n
+            header = {"dim": self.dim, "embedder": self.embedder.name, "capacity": self._capacity, "rows": n,
+                      "version": self.version, "trained_rows": self._trained_rows}
+            arrays = {
+                "header": np.array(json.dumps(header)),
+                "row_doc": self._row_doc[:n], "row_field": self._row_field[:n], "row_span": self._row_span[:n],
+                "alive": self._alive[:n], "assign": self._assign[:n],
+                "doc_ids": np.fromiter(self._docs.keys(), dtype=np.int64, count=len(self._docs)),
+                "doc_fps": np.fromiter(self._docs.values(), dtype=np.int64, count=len(self._docs)),
+            }
+            if self._centroids is not None:
+                arrays["centroids"] = self._centroids
+            tmp = self._meta_path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self._meta_path)
+
+    def _load(self) -> None:
+        """读取已有索引；编码器或维度变了、文件不完整时从空索引开始。"""
+        try:
+            with np.load(self._meta_path, allow_pickle=False) as z:
+                header = json.loads(str(z["header"]))
+                if header["dim"] != self.dim or header["embedder"] != self.embedder.name:
+                    return
+                cap, n = int(header["capacity"]), int(header["rows"])
+                if os.path.getsize(self._vectors_path) != cap * self.dim * 4:
+                    return
+                self._mat = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(cap, self.dim))
+                self._capacity, self._n = cap, n
+                self._row_doc = np.zeros(cap, dtype=np.int64)
+                self._row_field = np.zeros(cap, dtype=np.int8)
+                self._row_span = np.zeros((cap, 2), dtype=np.int32)
+                self._alive = np.zeros(cap, dtype=bool)
+                self._assign = np.full(cap, -1, dtype=np.int32)
+                self._row_doc[:n] = z["row_doc"]
+                self._row_field[:n] = z["row_field"]
+                self._row_span[:n] = z["row_span"]
+                self._alive[:n] = z["alive"]
+                self._assign[:n] = z["assign"]
+                self._centroids = z["centroids"] if "centroids" in z.files else None
+                self._docs = dict(zip(z["doc_ids"].tolist(), z["doc_fps"].tolist()))
+                self._trained_rows = int(header["trained_rows"])
+                self.version = header["version"]
+        except (OSError, KeyError, ValueError):
+            self._reset()
+            return
+        alive = np.flatnonzero(self._alive[:self._n])
+        self._n_alive = len(alive)
+        for r, d in zip(alive.tolist(), self._row_doc[alive].tolist()):
+            self._doc_rows.setdefault(d, []).append(r)
+
+    # ---------- 写入 ----------
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i in range(0, len(texts), EMBED_BATCH):
+            out[i:i + EMBED_BATCH] = _normalize(self.embedder(texts[i:i + EMBED_BATCH]))
+        return out
+
+    def _drop_doc(self, doc_id: int) -> None:
+        rows = self._doc_rows.pop(doc_id, [])
+        self._alive[rows] = False
+        self._n_alive -= len(rows)
+        self._docs.pop(doc_id, None)
+
+    def _add_docs(self, docs: List[Tuple[int, int, Dict[str, str]]]) -> None:
+        """docs: [(doc_id, 指纹, {字段: 文本})]，一起切块、编码、写入。"""
+        texts, meta = [], []
+        for doc_id, _, fields in docs:
+            title = fields["title"]
+            spans = [(fi, s, e) for fi, f in enumerate(FIELDS) if f != "title"
+                     for s, e in chunk_spans(fields[f])]
+            if not spans and title:
+                spans = [(0, 0, len(title))]
+            for fi, s, e in spans:
+                body = fields[FIELDS[fi]][s:e]
+                texts.append(body if fi == 0 else f"{title}\n{body}")
+                meta.append((doc_id, fi, s, e))
+        vecs = self._embed(texts) if texts else np.zeros((0, self.dim), dtype=np.float32)
+        start = self._n
+        self._grow(start + len(vecs))
+        end = start + len(vecs)
+        self._mat[start:end] = vecs
+        if meta:
+            arr = np.array(meta, dtype=np.int64)
+            self._row_doc[start:end] = arr[:, 0]
+            self._row_field[start:end] = arr[:, 1]
+            self._row_span[start:end] = arr[:, 2:]
+        self._alive[start:end] = True
+        if self._centroids is not None and len(vecs):
+            self._assign[start:end] = np.argmax(vecs @ self._centroids.T, axis=1)
+        self._n = end
+        self._n_alive += len(vecs)
+        for r, (doc_id, _, _, _) in enumerate(meta, start):
+            self._doc_rows.setdefault(doc_id, []).append(r)
+        for doc_id, fp, _ in docs:
+            self._docs[doc_id] = fp
+
+    def update_from_records(self, records: Iterable[Dict[str, Any]], version: Optional[str] = None,
+                            id_field: str = "id") -> int:
+        """records 需要 id / title / summary / maintext；只对新增、变更、删除的文章改动索引，同一 version 整批跳过。"""
+        with self._lock:
+            if version is not None and version == self.version:
+                return 0
+            todo: List[Tuple[int, int, Dict[str, str]]] = []
+            seen = set()
+            for r in records:
+                doc_id = int(r[id_field])
+                seen.add(doc_id)
+                fields = {f: str(r.get(f) or "") for f in FIELDS}
+                fp = zlib.crc32("\x1f".join(fields.values()).encode("utf-8"))
+                if self._docs.get(doc_id) == fp:
+                    continue
+                if doc_id in self._docs:
+                    self._drop_doc(doc_id)
+                todo.append((doc_id, fp, fields))
+            removed = [d for d in self._docs if d not in seen]
+            for doc_id in removed:
+                self._drop_doc(doc_id)
+            for i in range(0, len(todo), EMBED_BATCH):
+                self._add_docs(todo[i:i + EMBED_BATCH])
+            changed = len(todo) + len(removed)
+            if changed:
+                self._maybe_compact()
+                self._maybe_train()
+            self.version = version
+            self.save()
+            return changed
+
+    def _maybe_compact(self) -> None:
+        """作废的行超过一半时把有效行前移（顺序不变，按块复制，不整块读进内存）。"""
+        if (self._n - self._n_alive) * 2 <= self._n:
+            return
+        keep = np.flatnonzero(self._alive[:self._n])
+        k = len(keep)
+        for s in range(0, k, 8192):  # 目标位置总在来源之前，按顺序复制不会覆盖还没读的行
+            self._mat[s:s + 8192] = self._mat[keep[s:s + 8192]]
+        for name in ("_row_doc", "_row_field", "_row_span", "_assign"):
+            arr = getattr(self, name)
+            arr[:k] = arr[keep]
+        self._alive[:k] = True
+        self._alive[k:self._n] = False
+        self._n = k
+        self._doc_rows = {}
+        for r, d in enumerate(self._row_doc[:k].tolist()):
+            self._doc_rows.setdefault(d, []).append(r)
+
+    def _maybe_train(self) -> None:
+        if self._n_alive < IVF_MIN_ROWS:
+            self._centroids = None
+            self._trained_rows = 0
+            return
+        if self._centroids is not None and self._n_alive <= 2 * self._trained_rows:
+            return
+        self.train_ivf()
+
+    def train_ivf(self, nlist: Optional[int] = None, seed: int = 0) -> None:
+        """在有效行的抽样上做球面 k-means，然后给所有行分桶。"""
+        with self._lock:
+            alive = np.flatnonzero(self._alive[:self._n])
+            nlist = nlist or int(min(1024, max(16, np.sqrt(len(alive)))))
+            rng = np.random.RandomState(seed)
+            sample = np.sort(rng.choice(alive, min(len(alive), nlist * IVF_SAMPLE_PER_LIST), replace=False))
+            x = np.asarray(self._mat[sample])
+            cent = x[rng.choice(len(x), nlist, replace=False)].copy()
+            for _ in range(IVF_KMEANS_ITERS):
+                a = np.argmax(x @ cent.T, axis=1)
+                order = np.argsort(a, kind="stable")
+                used, starts = np.unique(a[order], return_index=True)
+                cent[used] = np.add.reduceat(x[order], starts, axis=0)  # 空桶保留上一轮的中心
+                cent = _normalize(cent)
+            for s in range(0, self._n, 8192):
+                self._assign[s:s + 8192] = np.argmax(self._mat[s:s + 8192] @ cent.T, axis=1)
+            self._centroids = cent
+            self._trained_rows = len(alive)
+
+    # ---------- 查询 ----------
+
+    def search(self, query: str, k: int = 10, exact: Optional[bool] = None,
+               nprobe: int = IVF_NPROBE) -> List[Dict[str, Any]]:
+        """
+        按余弦相似度返回前 k 个块：[{doc_id, score, field, start, end}]，start/end 为该字段文本里的字符区间。
+        exact=None 时有 IVF 就用 IVF，否则精确搜索。
+        """
+        q = self._embed([query])[0]
+        if not q.any():
+            return []
+        with self._lock:
+            n = self._n
+            if not self._n_alive:
+                return []
+            if self._centroids is not None and not exact:
+                probes = np.argsort(-(self._centroids @ q))[:nprobe]
+                rows = np.flatnonzero(np.isin(self._assign[:n], probes) & self._alive[:n])
+                scores = self._mat[rows] @ q
+            else:
+                rows = None
+                scores = self._mat[:n] @ q
+                scores[~self._alive[:n]] = -np.inf
+            if not len(scores):
+                return []
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            top = top[np.isfinite(scores[top])]
+            hit_rows = rows[top] if rows is not None else top
+            return [{"doc_id": int(self._row_doc[r]), "score": float(s), "field": FIELDS[self._row_field[r]],
+                     "start": int(self._row_span[r, 0]), "end": int(self._row_span[r, 1])}
+                    for r, s in zip(hit_rows.tolist(), scores[top].tolist())]
+
+    def search_docs(self, query: str, k: int = 10, **kwargs) -> List[Dict[str, Any]]:
+        """按文章去重：每篇只保留得分最高的块，最多 k 篇。"""
+        out: List[Dict[str, Any]] = []
+        seen = set()
+        for hit in self.search(query, k * 4, **kwargs):
+            if hit["doc_id"] not in seen:
+                seen.add(hit["doc_id"])
+                out.append(hit)
+                if len(out) == k:
+                    break
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"docs": len(self._docs), "chunks": self._n_alive, "rows": self._n, "capacity": self._capacity,
+                    "ivf_lists": 0 if self._centroids is None else len(self._centroids),
+                    "embedder": self.embedder.name}
+
+
+def hit_text(hit: Dict[str, Any], record: Dict[str, Any]) -> str:
+    """命中块的原文（record 为该文章的一行，需要含 hit["field"] 字段）。"""
+    return str(record.get(hit["field"]) or "")[hit["start"]:hit["end"]]
+
+
+# =========================
+# 命令行
+# =========================
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Build / query the local vector index over News_storage.")
+    ap.add_argument("command", choices=["build", "query"])
+    ap.add_argument("text", nargs="?", default="", help="query：查询文本")
+    ap.add_argument("-k", type=int, default=5, help="query：返回几篇")
+    ap.add_argument("--exact", action="store_true", help="query：不用 IVF，精确搜索")
+    ap.add_argument("--path", default=VECTOR_DIR, help="索引目录")
+    args = ap.parse_args(argv)
+
+    from supabase_io import load_mirror_articles, mirror_version
+    rows = load_mirror_articles()
+    index = VectorIndex(args.path)
+    t0 = time.perf_counter()
+    changed = index.update_from_records(rows, version=mirror_version())
+    print(f"index: {index.stats()} ({changed} articles updated in {time.perf_counter() - t0:.2f}s)")
+    if args.command == "build":
+        return 0
+    if not args.text:
+        print("query 需要查询文本")
+        return 1
+    by_id = {r["id"]: r for r in rows}
+    t0 = time.perf_counter()
+    hits = index.search_docs(args.text, args.k, exact=args.exact or None)
+    print(f"{len(hits)} hits in {(time.perf_counter() - t0) * 1000:.1f}ms")
+    for h in hits:
+        r = by_id.get(h["doc_id"], {})
+        print(f"{h['score']:.3f}  [{h['doc_id']}] {r.get('title', '')}\n        {hit_text(h, r)[:200]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
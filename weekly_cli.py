@@ -0,0 +1,127 @@
+# weekly_cli.py — 命令行批量生成 Weekly DOCX（不需要打开 Streamlit）
+#
+#   python weekly_cli.py --from 2025-10-06 --to 2025-11-17 --author "Jane Doe" --outdir ./weekly
+#
+# 每周一个进程并行生成；本周审核记录与上次生成时相同（指纹一致且文件还在）就跳过；
+# 文档直接写到磁盘（先写临时文件再改名），不在内存里保留整份 DOCX。
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from weekly_report import OUTPUT_DIR, build_weekly_docx, fetch_reviews_week, start_of_week
+
+MANIFEST_NAME = ".weekly_manifest.json"
+
+
+def report_filename(monday: date) -> str:
+    return f"UrbanLab_Weekly_{monday.isoformat()}.docx"  # 与看板下载的文件名一致
+
+
+def mondays_between(first: date, last: date) -> List[date]:
+    d, end = start_of_week(first), start_of_week(last)
+    out = []
+    while d <= end:
+        out.append(d)
+        d += timedelta(days=7)
+    return out
+
+
+def review_fingerprint(rows: List[Dict[str, Any]], author: str) -> str:
+    """本周审核记录 + 作者的指纹；任何一条记录变化都会改变它。"""
+    payload = json.dumps({"author": author, "rows": rows}, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(outdir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(outdir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(outdir: str, manifest: Dict[str, str]) -> None:
+    path = os.path.join(outdir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def generate_week(monday: date, author: str, outdir: str, previous: Optional[str], force: bool = False) -> Dict[str, Any]:
+    """
+    在 worker 进程里生成一周的报告。
+    返回 {"monday", "status": written/skipped/empty/error, "path", "rows", "fingerprint", "error"}。
+    """
+    result: Dict[str, Any] = {"monday": monday.isoformat(), "status": None, "path": None,
+                              "rows": 0, "fingerprint": None, "error": None}
+    try:
+        rows = fetch_reviews_week(monday)
+        result["rows"] = len(rows)
+        if not rows:
+            result["status"] = "empty"
+            return result
+        fp = review_fingerprint(rows, author)
+        result["fingerprint"] = fp
+        path = os.path.join(outdir, report_filename(monday))
+        result["path"] = path
+        if not force and fp == previous and os.path.exists(path):
+            result["status"] = "skipped"
+            return result
+        tmp = path + ".part"
+        try:
+            build_weekly_docx(rows, monday, author, out=tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):  # 生成失败时不留下半截文件
+                os.remove(tmp)
+        result["status"] = "written"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Generate Urban Lab weekly DOCX reports for a range of weeks.")
+    ap.add_argument("--from", dest="first", required=True, type=date.fromisoformat,
+                    help="第一周（任意一天，会对齐到周一），YYYY-MM-DD")
+    ap.add_argument("--to", dest="last", type=date.fromisoformat,
+                    help="最后一周（默认与 --from 相同），YYYY-MM-DD")
+    ap.add_argument("--author", default="Your Name", help="Urban Lab Author")
+    ap.add_argument("--outdir", default=OUTPUT_DIR, help="输出目录")
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="并行进程数")
+    ap.add_argument("--force", action="store_true", help="忽略指纹，全部重新生成")
+    args = ap.parse_args(argv)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    mondays = mondays_between(args.first, args.last or args.first)
+    manifest = load_manifest(args.outdir)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [
+            pool.submit(generate_week, m, args.author, args.outdir, manifest.get(m.isoformat()), args.force)
+            for m in mondays
+        ]
+        for fut in as_completed(futures):
+            res = fut.result()
+            if res["status"] in ("written", "skipped") and res["fingerprint"]:
+                manifest[res["monday"]] = res["fingerprint"]
+            if res["status"] == "error":
+                failed += 1
+            print(f"{res['monday']}: {res['status']:<7} rows={res['rows']}"
+                  + (f" -> {res['path']}" if res["status"] == "written" else "")
+                  + (f" ({res['error']})" if res["error"] else ""))
+    save_manifest(args.outdir, manifest)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
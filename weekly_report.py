@@ -0,0 +1,203 @@
+# weekly_report.py — Weekly DOCX / 文本模板生成（从 app.py 移出，供 Streamlit、命令行和基准测试复用）
+
+from datetime import date, timedelta
+from io import BytesIO
+from typing import IO, TYPE_CHECKING
+
+import pandas as pd
+
+from image_utils import prefetch_row_images
+from perf import payload_bytes, traced
+from supabase_io import get_client
+
+if TYPE_CHECKING:  # python-docx 只在真正生成报告时才导入（看板冷启动不需要它）
+    from docx.document import Document
+
+# ===== Weekly DOCX helpers =====
+
+OUTPUT_DIR = r"D:\Python Project\weekly outcome"  # 目标保存目录（可在UI里改）
+
+def start_of_week(d: date) -> date:
+    return d - timedelta(days=d.weekday())  # 周一
+
+def end_of_week(start: date) -> date:
+    return start + timedelta(days=6)
+
+def _add_label_value(doc: "Document", label: str, value: str, bold_label=True):
+    from docx.shared import Pt
+    p = doc.add_paragraph()
+    r1 = p.add_run(f"{label} ")
+    r1.bold = bold_label
+    r1.font.size = Pt(11)
+    r2 = p.add_run(value or "")
+    r2.font.size = Pt(11)
+    return p
+
+def _add_hyperlink(paragraph, url, text):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    part = paragraph.part
+    r_id = part.relate_to(url,
+                          reltype="http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink",
+                          is_external=True)
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.set(qn('r:id'), r_id)
+    new_run = OxmlElement('w:r')
+    rPr = OxmlElement('w:rPr')
+    u = OxmlElement('w:u'); u.set(qn('w:val'), 'single'); rPr.append(u)
+    color = OxmlElement('w:color'); color.set(qn('w:val'), '0563C1'); rPr.append(color)
+    new_run.append(rPr)
+    t = OxmlElement('w:t'); t.text = text
+    new_run.append(t)
+    hyperlink.append(new_run)
+    paragraph._p.append(hyperlink)
+
+@traced("supabase.fetch_reviews_week", bytes_of=payload_bytes)
+def fetch_reviews_week(monday: date) -> list[dict]:
+    """从审核表读取本周 [Mon..Sun] 的记录；表名优先 news_reviews，回退 '\"News_reviews\"'。"""
+    start_s, end_s = monday.isoformat(), end_of_week(monday).isoformat()
+    table_candidates = ["news_reviews", '"News_reviews"']
+    last_err = None
+    for tbl in table_candidates:
+        try:
+            res = (
+                get_client().table(tbl)
+                .select("*")
+                .gte("publish_date", start_s)
+                .lte("publish_date", end_s)
+                .order("publish_date", desc=False)
+                .execute()
+            )
+            data = res.data or []
+            if data is not None:
+                return data
+        except Exception as e:
+            last_err = e
+            continue
+    raise RuntimeError(f"Read reviews failed: {last_err}")
+
+@traced("weekly.build_docx")
+def build_weekly_docx(rows: list[dict], monday: date, author: str,
+                      images: dict[int, bytes | None] | None = None,
+                      out: str | IO[bytes] | None = None) -> BytesIO | None:
+    """
+    按模板生成 DOCX 并返回字节缓冲（供下载/另存）。
+    images 为 prefetch_row_images 的结果（行号 → 图片字节）；不传则在这里先并发预取。
+    out 为文件路径或可写文件对象时直接写过去、不在内存里留副本，此时返回 None。
+    """
+    from docx import Document
+    from docx.shared import Pt, Inches
+
+    week_text = monday.strftime("%B %d, %Y")  # e.g., October 27, 2025
+    if images is None:
+        images, _ = prefetch_row_images(rows)
+    doc = Document()
+
+    for i, r in enumerate(rows):
+        if i > 0:
+            doc.add_page_break()
+
+        # Week of
+        p_week = doc.add_paragraph()
+        run = p_week.add_run(f"Week of {week_text}")
+        run.bold = True; run.font.size = Pt(12)
+
+        # Title
+        _add_label_value(doc, "Title:", r.get("title",""))
+
+        # Source / Date Published / Link / Author
+        _add_label_value(doc, "Source:", r.get("publisher",""))
+        pubdate = r.get("publish_date")
+        pubdate_str = ""
+        try:
+            if pubdate:
+                pubdate_str = pd.to_datetime(pubdate).strftime("%m.%d.%Y")
+        except Exception:
+            pass
+        _add_label_value(doc, "Date Published:", pubdate_str)
+
+        p_link = doc.add_paragraph()
+        r_label = p_link.add_run("Link: "); r_label.bold = True; r_label.font.size = Pt(11)
+        link = r.get("link") or r.get("url") or ""
+        if link:
+            _add_hyperlink(p_link, link, link)
+
+        _add_label_value(doc, "Urban Lab Author:", author)
+
+        # ✅ changed: Article Photograph，图片已在预取阶段下载好并缩成 6.5 英寸的 JPEG（优先 image_url，再回退 og:image）
+        img_bytes = images.get(i)
+
+        if img_bytes:
+            doc.add_paragraph("Article Photograph:")
+            try:
+                doc.add_picture(BytesIO(img_bytes), width=Inches(6.5))
+            except Exception:
+                doc.add_paragraph("")
+        else:
+            _add_label_value(doc, "Article Photograph:", "")
+
+        # Summary
+        p_sum = doc.add_paragraph()
+        r1 = p_sum.add_run("Article Summary: "); r1.bold = True; r1.font.size = Pt(11)
+        p_sum.add_run(r.get("summary","")).font.size = Pt(11)
+
+        # Initiatives（红色/加粗）
+        p_init = doc.add_paragraph()
+        r2 = p_init.add_run("Initiative: "); r2.bold = True; r2.font.size = Pt(11)
+        r3 = p_init.add_run(r.get("categories","")); r3.bold = True; r3.font.size = Pt(11)
+
+    if out is not None:
+        doc.save(out)
+        return None
+    bio = BytesIO()
+    doc.save(bio)
+    bio.seek(0)
+    return bio
+
+def build_weekly_block_text(row: dict, categories: str, author: str) -> str:
+    """
+    生成一个纯文本版的 Weekly Report 块，用于在页面上直接复制到 Google Docs。
+    """
+    pubdate = row.get("publish_date")
+    # 计算 Week of
+    monday_text = ""
+    try:
+        if isinstance(pubdate, date):
+            d = pubdate
+        else:
+            d = pd.to_datetime(pubdate).date()
+        monday_text = start_of_week(d).strftime("%B %d, %Y")
+    except Exception:
+        pass
+
+    # 格式尽量和 DOCX 保持一致
+    lines = []
+    if monday_text:
+        lines.append(f"Week of {monday_text}")
+        lines.append("")
+
+    lines.append(f"Title: {row.get('title', '')}")
+    lines.append(f"Source: {row.get('publisher', '')}")
+
+    # Date Published 格式  MM.DD.YYYY
+    pub_str = ""
+    try:
+        if isinstance(pubdate, date):
+            pub_str = pubdate.strftime("%m.%d.%Y")
+        elif pubdate:
+            pub_str = pd.to_datetime(pubdate).strftime("%m.%d.%Y")
+    except Exception:
+        pub_str = str(pubdate or "")
+    lines.append(f"Date Published: {pub_str}")
+
+    link = row.get("url") or row.get("link") or ""
+    lines.append(f"Link: {link}")
+
+    lines.append(f"Urban Lab Author: {author}")
+    lines.append("")
+    lines.append("Article Summary:")
+    lines.append(row.get("summary", "") or "")
+    lines.append("")
+    lines.append(f"Initiative: {categories or ''}")
+
+    return "\n".join(lines)